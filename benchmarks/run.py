@@ -0,0 +1,148 @@
+"""
+Load benchmarks of the client against the local MailUp stand-in.
+
+Run them with ``make bench`` or ``python -m benchmarks.run --help`` from the repository root.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from mailupy import HTTPTransport
+from mailupy.testing import MailupStandIn
+
+
+class TimedTransport(HTTPTransport):
+    """
+    Transport recording how long each request takes.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def request(self, req_type, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().request(req_type, url, **kwargs)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def paginate(**options):
+    page_size = options.pop('page_size', None)
+
+    def scenario(client):
+        return sum(1 for _ in client.get_recipients_from_list(1, page_size=page_size))
+    return scenario, options
+
+
+def send_serial(count):
+    def scenario(client):
+        for i in range(count):
+            client.send_message(f'user{i}@example.com', 1, {'field1': 'x'})
+        return count
+    return scenario, {}
+
+
+def send_bulk(count, workers):
+    def scenario(client):
+        recipients = ((f'user{i}@example.com', {'field1': 'x'}) for i in range(count))
+        return sum(1 for result in client.send_message_bulk(recipients, 1, workers=workers) if result.ok)
+    return scenario, {'transport': TimedTransport(pool_maxsize=workers)}
+
+
+def import_recipients(count, chunk_size):
+    def scenario(client):
+        recipients = ((f'User {i}', f'user{i}@example.com', {'field1': 'x'}) for i in range(count))
+        progress = None
+        for progress in client.import_recipients(recipients, list_id=1, chunk_size=chunk_size, poll_interval=0.01):
+            pass
+        return progress.imported if progress else 0
+    return scenario, {}
+
+
+def scenarios(args):
+    return {
+        'pagination-default': paginate(),
+        'pagination-page-size': paginate(page_size=500),
+        'pagination-adaptive': paginate(page_size='auto'),
+        'pagination-parallel': paginate(page_size=500, page_workers=4),
+        'pagination-streamed': paginate(page_size=500, stream_pages=True),
+        'send-serial': send_serial(args.sends),
+        'send-bulk': send_bulk(args.sends, args.workers),
+        'import': import_recipients(args.recipients, 5000),
+    }
+
+
+def run(name, scenario, options, args):
+    with MailupStandIn(recipients=args.recipients, fields=args.fields, latency=args.latency,
+                       max_page_size=args.max_page_size) as server:
+        transport = options.pop('transport', None) or TimedTransport()
+        client = server.client(transport=transport, **options)
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        items = scenario(client)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+        tracemalloc.stop()
+        transport.close()
+        requests = len(transport.latencies)
+        return {
+            'scenario': name,
+            'requests': requests,
+            'items': items,
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(requests / elapsed, 1),
+            'items_per_second': round(items / elapsed, 1),
+            'p50_ms': round(percentile(transport.latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(transport.latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.mean(transport.latencies) * 1000, 2) if requests else 0,
+            'peak_memory_kb': round(peak / 1024),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, default=20000, help='recipients of the test list')
+    parser.add_argument('--fields', type=int, default=10, help='dynamic fields of each recipient')
+    parser.add_argument('--sends', type=int, default=500, help='messages sent by send scenarios')
+    parser.add_argument('--workers', type=int, default=8, help='threads used by bulk scenarios')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added to each response')
+    parser.add_argument('--max-page-size', type=int, default=1000, help='biggest page served')
+    parser.add_argument('--memory', action='store_true',
+                        help='trace peak memory, slows down every scenario and includes the stand-in allocations')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    parser.add_argument('names', nargs='*', help='scenarios to run, all by default')
+    args = parser.parse_args(argv)
+    available = scenarios(args)
+    names = args.names or list(available)
+    columns = ['scenario', 'requests', 'items', 'seconds', 'requests_per_second', 'items_per_second',
+               'p50_ms', 'p99_ms', 'peak_memory_kb']
+    if not args.json:
+        print(' '.join(f'{column:>20}' for column in columns))
+    for name in names:
+        scenario, options = available[name]
+        result = run(name, scenario, dict(options), args)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(' '.join(f'{result[column]:>20}' for column in columns))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,4 @@
 from .client import Mailupy # NOQA
 from .exceptions import MailupyException, MailupyRequestException # NOQA
+from .transport import HTTPTransport # NOQA
+from .aio import AsyncMailupy # NOQA
@@ -0,0 +1,490 @@
+import asyncio
+import time
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from .base import BaseMailupy
+from .coalesce import AsyncRequestCoalescer
+from .exceptions import MailupyException, MailupyRequestException
+
+
+class AsyncMailupy(BaseMailupy):
+    """
+    Asyncio client class for MailUp.
+
+    Exposes the same methods of :class:`~mailupy.Mailupy` as coroutines, while ``get_*`` methods
+    returning many items are async iterators. Requires ``httpx`` (``pip install mailupy[async]``).
+
+    Login happens on the first call, not when the client is created::
+
+     >>> async with AsyncMailupy('m00000', 'password', 'client-id', 'client-secret') as client:
+     ...     async for group in client.get_groups_from_list(1):
+     ...         print(group)
+    """
+
+    def __init__(self, username, password, client_id, client_secret, client=None, fields_ttl=300,
+                 max_connections=100, max_keepalive_connections=20, timeout=None,
+                 rate_limit=None, rate_burst=None, max_throttle_retries=5, retry_policy=None,
+                 coalesce_requests=True, json_codec=None):
+        """
+        :param username: MailUp username
+        :type username: str
+        :param password: MailUp password
+        :type password: str
+        :param client_id: Client ID of the MailUp application
+        :type client_id: str
+        :param client_secret: Client secret of the MailUp application
+        :type client_secret: str
+        :param client: HTTP client used for every call, if omitted the client creates (and owns) its own
+        :type client: httpx.AsyncClient
+        :param fields_ttl: Seconds the dynamic fields definitions are cached for
+        :type fields_ttl: float
+        :param max_connections: Maximum number of concurrent connections of the owned HTTP client
+        :type max_connections: int
+        :param max_keepalive_connections: Maximum number of idle connections kept open by the owned HTTP client
+        :type max_keepalive_connections: int
+        :param timeout: Timeout in seconds for the owned HTTP client, ``None`` to wait forever
+        :type timeout: float
+        :param rate_limit: Maximum requests per second, see :func:`~mailupy.Mailupy.__init__()`
+        :type rate_limit: float
+        :param rate_burst: Requests that can be sent back to back before ``rate_limit`` applies
+        :type rate_burst: int
+        :param max_throttle_retries: Times a request answered with 429 is sent again before raising
+        :type max_throttle_retries: int
+        :param retry_policy: Which failed requests are sent again and when, see :func:`~mailupy.Mailupy.__init__()`
+        :type retry_policy: mailupy.retry.RetryPolicy
+        :param coalesce_requests: Send a single request for identical GETs awaited at the same time,
+            see :func:`~mailupy.Mailupy.__init__()`
+        :type coalesce_requests: bool
+        :param json_codec: Codec encoding payloads and decoding responses, see :func:`~mailupy.Mailupy.__init__()`
+        :type json_codec: str, mailupy.codec.JSONCodec
+        """
+        if httpx is None:
+            raise MailupyException('AsyncMailupy requires httpx, install it with "pip install mailupy[async]"')
+        super().__init__(
+            username, password, client_id, client_secret, fields_ttl=fields_ttl,
+            rate_limit=rate_limit, rate_burst=rate_burst, max_throttle_retries=max_throttle_retries,
+            retry_policy=retry_policy, json_codec=json_codec
+        )
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            timeout=timeout
+        )
+        self._login_lock = asyncio.Lock()
+        self._refresh_lock = asyncio.Lock()
+        self._fields_lock = asyncio.Lock()
+        self._group_locks = {}
+        self._in_flight = AsyncRequestCoalescer(self.metrics) if coalesce_requests else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Close the HTTP client, if owned by this client.
+        """
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def _requests_wrapper(self, req_type, url, **kwargs):
+        if self._in_flight is not None and req_type == 'GET':
+            return await self._in_flight.run((req_type, url), lambda: self._send_with_retries(req_type, url, **kwargs))
+        return await self._send_with_retries(req_type, url, **kwargs)
+
+    async def _send_with_retries(self, req_type, url, retry=0, renewed=False, **kwargs):
+        throttled = failures = 0
+        started = time.monotonic()
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            event = self._start_request(req_type, url, retry + throttled + failures)
+            start = time.perf_counter()
+            try:
+                resp = await self._client.request(req_type, url, **kwargs)
+            except Exception as ex:
+                self._end_request(event, start, error=ex)
+                failures += 1
+                delay = self._retry_delay(req_type, url, failures, started, error=ex)
+                if delay is None:
+                    raise MailupyException(ex) from ex
+                await asyncio.sleep(delay)
+                continue
+            self._end_request(event, start, resp)
+            if resp.status_code == 429 and self._can_throttle(throttled, started):
+                throttled += 1
+                self._throttle(resp, throttled)
+                continue
+            if resp.status_code >= 500:
+                failures += 1
+                delay = self._retry_delay(req_type, url, failures, started, status=resp.status_code)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+            break
+        # Sent again once with a renewed token, a second 401 isn't about an expired token
+        if resp.status_code == 401 and url != self.AUTH_URL and not renewed:
+            await self._renew_token(self._stale_token(kwargs))
+            resp = await self._send_with_retries(
+                req_type, url, retry + throttled + failures + 1, True, **{**kwargs, 'headers': self._default_headers()}
+            )
+        if resp.status_code >= 400:
+            raise MailupyRequestException(resp, self.codec)
+        return resp
+
+    async def _headers(self):
+        if not self._token:
+            async with self._login_lock:
+                if not self._token:
+                    await self.login()
+        return self._default_headers()
+
+    async def _request(self, req_type, url, payload=None):
+        content = self.codec.dumps(payload) if payload is not None else None
+        return await self._requests_wrapper(req_type, url, headers=await self._headers(), content=content)
+
+    async def _renew_token(self, stale_token):
+        async with self._refresh_lock:
+            # Coroutines rejected with the same token wait for a single renewal
+            if self._token != stale_token:
+                return
+            await self._refresh_or_login()
+
+    async def _refresh_or_login(self):
+        if self._refresh_token:
+            try:
+                await self._refresh_my_token()
+                return
+            except MailupyRequestException:
+                # The refresh token has expired or was revoked, credentials are still good
+                pass
+        await self.login()
+
+    async def _refresh_my_token(self):
+        resp = await self._requests_wrapper('POST', self.AUTH_URL, data=self._refresh_payload())
+        self._set_tokens(self._decode(resp))
+        return True
+
+    async def _download_all_pages(self, url, page_size=None):
+        current = 0
+        total = 1
+        is_paginated = True
+        while total - current > 0 and is_paginated:
+            resp = await self._request('GET', self._page_url(url, current, page_size))
+            data = self._decode(resp)
+            total = self._count_pages(data)
+            is_paginated = data['IsPaginated']
+            for item in data['Items']:
+                yield item
+            current = current + 1
+
+    async def _build_mailup_fields(self, fields={}):
+        if not fields:
+            return list()
+        fields_id = self._fields_cache.get()
+        if fields_id is None:
+            async with self._fields_lock:
+                fields_id = self._fields_cache.get()
+                if fields_id is None:
+                    fields_id = self._fields_cache.set([elem async for elem in self.get_fields()])
+        return self._fields_from_index(fields_id, fields)
+
+    async def _get_first_recipient(self, url):
+        resp = await self._request('GET', url)
+        return self._first_item(self._decode(resp))
+
+    async def login(self):
+        """
+        Async version of :func:`~mailupy.Mailupy.login()`.
+
+        :rtype: bool
+        """
+        resp = await self._requests_wrapper('POST', self.AUTH_URL, data=self._login_payload())
+        self._set_tokens(self._decode(resp))
+        return True
+
+    def get_fields(self, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_fields()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._build_url('/Recipient/DynamicFields', query), page_size)
+
+    def get_groups_from_list(self, list_id, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_groups_from_list()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._build_url(f'/List/{list_id}/Groups', query), page_size)
+
+    def get_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_recipients_from_list()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._recipients_url('EmailOptins', list_id, query), page_size)
+
+    def get_subscribed_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_subscribed_recipients_from_list()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._recipients_url('Subscribed', list_id, query), page_size)
+
+    def get_unsubscribed_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_unsubscribed_recipients_from_list()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._recipients_url('Unsubscribed', list_id, query), page_size)
+
+    async def get_recipient_from_list(self, list_id, recipient_email):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_recipient_from_list()`.
+
+        :rtype: dict
+        """
+        query = self._recipient_query(recipient_email)
+        return await self._get_first_recipient(self._recipients_url('EmailOptins', list_id, query))
+
+    async def get_subscribed_recipient_from_list(self, list_id, recipient_email):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_subscribed_recipient_from_list()`.
+
+        :rtype: dict
+        """
+        query = self._recipient_query(recipient_email)
+        return await self._get_first_recipient(self._recipients_url('Subscribed', list_id, query))
+
+    async def get_unsubscribed_recipient_from_list(self, list_id, recipient_email):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_unsubscribed_recipient_from_list()`.
+
+        :rtype: dict
+        """
+        query = self._recipient_query(recipient_email)
+        return await self._get_first_recipient(self._recipients_url('Unsubscribed', list_id, query))
+
+    def get_recipients_from_group(self, group_id, page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_recipients_from_group()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._build_url(f'/Group/{group_id}/Recipients', query), page_size)
+
+    async def get_recipient_from_group(self, group_id, recipient_email):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_recipient_from_group()`.
+
+        :rtype: dict
+        """
+        query = self._recipient_query(recipient_email)
+        return await self._get_first_recipient(self._build_url(f'/Group/{group_id}/Recipients', query))
+
+    async def get_recipients_by_emails(self, emails, list_id=None, group_id=None, status=None, workers=4,
+                                       max_url_length=2000):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_recipients_by_emails()`.
+
+        :rtype: dict
+        """
+        url = self._recipients_by_emails_url(list_id, group_id, status)
+        emails = list(dict.fromkeys(emails))
+        semaphore = asyncio.Semaphore(workers)
+        found = {}
+
+        async def fetch(chunk):
+            query = self._parse_filter_ordering(filter_by=' || '.join(map(self._email_condition, chunk)))
+            async with semaphore:
+                async for recipient in self._download_all_pages(f'{url}?{query}', len(chunk)):
+                    found[recipient['Email'].lower()] = recipient
+
+        await asyncio.gather(*[fetch(chunk) for chunk in self._email_filters(emails, url, max_url_length)])
+        return {email: found.get(email.lower()) for email in emails}
+
+    def get_messages_from_list(self, list_id, tags=[], page_size=None, **filter_ordering):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_messages_from_list()`.
+
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :rtype: collections.AsyncIterable[dict]
+        """
+        filter_ordering['tags'] = ','.join(tags)
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._build_url(f'/List/{list_id}/Emails', query), page_size)
+
+    async def get_or_create_group(self, list_id, group_name):
+        """
+        Async version of :func:`~mailupy.Mailupy.get_or_create_group()`.
+
+        :rtype: (int, bool)
+        """
+        lock = self._group_locks.setdefault((str(list_id), group_name), asyncio.Lock())
+        async with lock:
+            group_id = self._group_index.get(list_id, group_name)
+            if group_id is None and not self._group_index.is_complete(list_id):
+                async for group in self.get_groups_from_list(list_id, filter_by=self._group_filter(group_name)):
+                    if group.get('Name', '') == group_name:
+                        group_id = group['idGroup']
+                        self._group_index.add(list_id, group_name, group_id)
+                        break
+            if group_id is not None:
+                return group_id, False
+            group = await self.create_group(list_id, group_name)
+        if 'idGroup' in group:
+            return group['idGroup'], True
+        return None, False
+
+    async def index_groups(self, list_id):
+        """
+        Async version of :func:`~mailupy.Mailupy.index_groups()`.
+
+        :rtype: int
+        """
+        groups = [group async for group in self.get_groups_from_list(list_id)]
+        self._group_index.fill(list_id, groups)
+        return len(groups)
+
+    async def send_message(self, email, message_id, fields={}):
+        """
+        Async version of :func:`~mailupy.Mailupy.send_message()`.
+
+        :rtype: bool
+        """
+        await self._request('POST', self._build_url('/Email/Send'), {
+            "Email": email,
+            "idMessage": message_id,
+            "Fields": await self._build_mailup_fields(fields)
+        })
+        return True
+
+    async def send_sms(self, prefix, number, message_id, fields={}):
+        """
+        Async version of :func:`~mailupy.Mailupy.send_sms()`.
+
+        :rtype: bool
+        """
+        await self._request('POST', self._build_url('/Sms/Send'), {
+            "Number": number,
+            "Prefix": prefix,
+            "idMessage": message_id,
+            "Fields": await self._build_mailup_fields(fields)
+        })
+        return True
+
+    async def create_group(self, list_id, group_name, notes=''):
+        """
+        Async version of :func:`~mailupy.Mailupy.create_group()`.
+
+        :rtype: dict
+        """
+        resp = await self._request('POST', self._build_url(f'/List/{list_id}/Group'), {
+            "Name": group_name,
+            "Notes": notes
+        })
+        return self._index_created_group(list_id, group_name, self._decode(resp))
+
+    async def update_customer_fields(self, recipient_name, recipient_email, fields={}):
+        """
+        Async version of :func:`~mailupy.Mailupy.update_customer_fields()`.
+
+        :rtype: dict
+        """
+        resp = await self._request('PUT', self._build_url('/Recipient/Detail'), {
+            "Name": recipient_name,
+            "Email": recipient_email,
+            "Fields": await self._build_mailup_fields(fields)
+        })
+        return self._decode(resp)
+
+    async def subscribe_to_list(self, list_id, recipient_name, recipient_email, pending=False, fields={}):
+        """
+        Async version of :func:`~mailupy.Mailupy.subscribe_to_list()`.
+
+        :rtype: int
+        """
+        query_parameters = "ConfirmEmail=True" if pending else ""
+        resp = await self._request('POST', self._build_url(f'/List/{list_id}/Recipient', query_parameters), {
+            "Name": recipient_name,
+            "Email": recipient_email,
+            "Fields": await self._build_mailup_fields(fields)
+        })
+        return self._decode(resp)
+
+    async def subscribe_to_group(self, group_id, recipient_name, recipient_email, fields={}):
+        """
+        Async version of :func:`~mailupy.Mailupy.subscribe_to_group()`.
+
+        :rtype: int
+        """
+        resp = await self._request('POST', self._build_url(f'/Group/{group_id}/Recipient'), {
+            "Name": recipient_name,
+            "Email": recipient_email,
+            "Fields": await self._build_mailup_fields(fields)
+        })
+        return self._decode(resp)
+
+    async def unsubscribe_from_list(self, list_id, recipient_mailup_id):
+        """
+        Async version of :func:`~mailupy.Mailupy.unsubscribe_from_list()`.
+
+        :rtype: bool
+        """
+        await self._request('DELETE', self._build_url(f'/List/{list_id}/Unsubscribe/{recipient_mailup_id}'))
+        return True
+
+    async def unsubscribe_from_group(self, group_id, recipient_mailup_id):
+        """
+        Async version of :func:`~mailupy.Mailupy.unsubscribe_from_group()`.
+
+        :rtype: bool
+        """
+        await self._request('DELETE', self._build_url(f'/Group/{group_id}/Unsubscribe/{recipient_mailup_id}'))
+        return True
+
+    async def remove_from_list(self, list_id, recipient_mailup_id):
+        """
+        Async version of :func:`~mailupy.Mailupy.remove_from_list()`.
+
+        :rtype: bool
+        """
+        if list_id == 'all':
+            await self._request('DELETE', self._build_url(f'/Recipients/{recipient_mailup_id}'))
+        else:
+            await self._request('DELETE', self._build_url(f'/List/{list_id}/Recipient/{recipient_mailup_id}'))
+        return True
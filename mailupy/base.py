@@ -0,0 +1,299 @@
+import time
+import urllib
+
+from .cache import FieldCache, GroupIndex
+from .codec import get_codec
+from .exceptions import MailupyException
+from .metrics import Metrics, RequestEvent, endpoint_template
+from .ratelimit import TokenBucket, parse_retry_after
+from .retry import RetryPolicy
+
+
+class BaseMailupy:
+    """
+    Behaviour shared by :class:`~mailupy.Mailupy` and :class:`~mailupy.AsyncMailupy`.
+
+    Holds credentials and tokens, builds URLs, queries and payloads. It never performs I/O.
+    """
+
+    AUTH_URL = "https://services.mailup.com/Authorization/OAuth/Token"
+    """MailUp URL for authentication"""
+
+    BASE_URL = "https://services.mailup.com/API/v1.1/Rest/ConsoleService.svc/Console"
+    """MailUP API URL"""
+
+    def __init__(self, username, password, client_id, client_secret, fields_ttl=300,
+                 rate_limit=None, rate_burst=None, max_throttle_retries=5, retry_policy=None, json_codec=None):
+        self.codec = get_codec(json_codec)
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._max_throttle_retries = max_throttle_retries
+        self._filters = {}
+        self._fields_cache = FieldCache(ttl=fields_ttl)
+        self._group_index = GroupIndex()
+        self.metrics = Metrics()
+        self._hooks = {'before_request': [], 'after_request': []}
+        self._token = None
+        self._refresh_token = None
+        self._token_expires_at = None
+        self._mailup_user = {
+            'username': username,
+            'password': password,
+            'client_id': client_id,
+            'client_secret': client_secret
+        }
+
+    def _default_headers(self):
+        headers = {'Content-type': 'application/json'}
+        if self._token:
+            headers['Authorization'] = f'Bearer {self._token}'
+        return headers
+
+    def _throttle(self, resp, attempt):
+        # Without Retry-After back off exponentially, pausing every caller of this client
+        pause = parse_retry_after(resp.headers.get('Retry-After'), 2 ** (attempt - 1))
+        self.rate_limiter.pause(pause)
+        self.metrics.incr('throttle_retries')
+        self.metrics.incr('throttle_wait_seconds', pause)
+
+    def _can_throttle(self, throttled, started):
+        return throttled < self._max_throttle_retries and self.retry_policy.within_deadline(
+            time.monotonic() - started
+        )
+
+    def _retries_exhausted(self, failures, started):
+        # The policy sent the request more than once or its deadline passed, callers shouldn't retry it again
+        return failures > 1 or not self.retry_policy.within_deadline(time.monotonic() - started)
+
+    def _retry_delay(self, req_type, url, attempt, started, status=None, error=None):
+        # Seconds to wait before sending a failed request again, None if it mustn't be retried
+        policy = self.retry_policy
+        if not policy.should_retry(req_type, endpoint_template(self._split_url(url)[0]), attempt, status, error):
+            return None
+        delay = policy.delay(attempt)
+        if not policy.within_deadline(time.monotonic() - started, delay):
+            self.metrics.incr('retry_deadline_exceeded')
+            return None
+        self.metrics.incr('retries')
+        self.metrics.incr('retry_wait_seconds', delay)
+        return delay
+
+    def _split_url(self, url):
+        # Path relative to the API URL (or the full path for other URLs) and query
+        parts = urllib.parse.urlsplit(url)
+        base_path = urllib.parse.urlsplit(self.BASE_URL).path
+        if parts.path.startswith(base_path):
+            return parts.path[len(base_path):], parts.query
+        return parts.path, parts.query
+
+    def _start_request(self, req_type, url, retry):
+        path, query = self._split_url(url)
+        page_number = urllib.parse.parse_qs(query).get('pageNumber')
+        event = RequestEvent(
+            req_type, url, endpoint_template(path), int(page_number[0]) if page_number else None, retry
+        )
+        for hook in self._hooks['before_request']:
+            hook(event)
+        return event
+
+    def _end_request(self, event, start, resp=None, error=None, streamed=False):
+        event.duration = time.perf_counter() - start
+        event.error = error
+        if resp is not None:
+            event.status = resp.status_code
+            length = resp.headers.get('Content-Length')
+            if length is not None:
+                event.bytes = int(length)
+            elif not streamed:
+                # Reading the body of a streamed response here would consume it
+                event.bytes = len(resp.content)
+        self.metrics.observe(event)
+        for hook in self._hooks['after_request']:
+            hook(event)
+
+    def _login_payload(self):
+        return {
+            'grant_type': 'password',
+            'client_id': self._mailup_user['client_id'],
+            'client_secret': self._mailup_user['client_secret'],
+            'username': self._mailup_user['username'],
+            'password': self._mailup_user['password']
+        }
+
+    def _refresh_payload(self):
+        return {
+            'grant_type': 'refresh_token',
+            'client_id': self._mailup_user['client_id'],
+            'client_secret': self._mailup_user['client_secret'],
+            'refresh_token': self._refresh_token,
+        }
+
+    def _set_tokens(self, data):
+        self._token = data['access_token']
+        self._refresh_token = data['refresh_token']
+        expires_in = data.get('expires_in')
+        self._token_expires_at = time.time() + expires_in if expires_in else None
+
+    def _token_record(self):
+        return {
+            'access_token': self._token,
+            'refresh_token': self._refresh_token,
+            'expires_at': self._token_expires_at
+        }
+
+    def _use_token_record(self, record):
+        self._token = record['access_token']
+        self._refresh_token = record['refresh_token']
+        self._token_expires_at = record.get('expires_at')
+
+    def _page_url(self, url, page_number, page_size=None):
+        spacer = '&' if '?' in url else '?'
+        if page_size:
+            return f'{url}{spacer}pageNumber={page_number}&pageSize={page_size}'
+        return f'{url}{spacer}pageNumber={page_number}'
+
+    def _count_pages(self, data):
+        if not (data['PageSize'] and data['TotalElementsCount']):
+            return 1
+        total = data['TotalElementsCount'] // data['PageSize']
+        if data['TotalElementsCount'] % data['PageSize']:
+            total += 1
+        return total
+
+    def _fields_from_index(self, fields_id, fields):
+        mailup_fields = list()
+        for key, value in fields.items():
+            if key in fields_id:
+                mailup_fields.append({
+                    "Description": key,
+                    "Id": fields_id[key],
+                    "Value": value
+                })
+        return mailup_fields
+
+    def _parse_filter_ordering(self, **filter_ordering):
+        if 'order_by' in filter_ordering:
+            filter_ordering['order_by'] = ';'.join([el for el in filter_ordering['order_by']])
+        query = '&'.join([
+            '{0}={1}'.format(k.replace('_', ''), urllib.parse.quote_plus(v)) for k, v in filter_ordering.items()
+        ])
+        return query
+
+    def _build_url(self, url, query_parameters=None):
+        if query_parameters:
+            return f'{self.BASE_URL}{url}?{query_parameters}'
+        return f'{self.BASE_URL}{url}'
+
+    def _recipients_url(self, list_type, list_id, query=None):
+        return self._build_url(f'/List/{list_id}/Recipients/{list_type}', query)
+
+    def _recipient_query(self, recipient_email):
+        return self._parse_filter_ordering(filter_by=f"Email=='{recipient_email}'")
+
+    def _recipients_by_emails_url(self, list_id, group_id, status):
+        if (list_id is None) == (group_id is None):
+            raise MailupyException('Either list_id or group_id is required')
+        if list_id is not None:
+            return self._recipients_url(status or 'EmailOptins', list_id)
+        if status is not None:
+            raise MailupyException('status can be used with lists only')
+        return self._build_url(f'/Group/{group_id}/Recipients')
+
+    def _email_condition(self, email):
+        escaped = email.replace("'", "''")
+        return f"Email=='{escaped}'"
+
+    def _email_filters(self, emails, url, max_url_length):
+        # Pack emails into OR-combined filters keeping each URL within max_url_length
+        prefix = len(url) + len('?filterby=') + len('&pageNumber=0&pageSize=0000')
+        separator = len(urllib.parse.quote_plus(' || '))
+        chunk, length = [], prefix
+        for email in emails:
+            condition = urllib.parse.quote_plus(self._email_condition(email))
+            if chunk and length + separator + len(condition) > max_url_length:
+                yield chunk
+                chunk, length = [], prefix
+            if not chunk and length + len(condition) > max_url_length:
+                raise MailupyException(f'Email {email!r} doesn\'t fit in a URL of {max_url_length} characters')
+            length += len(condition) + (separator if chunk else 0)
+            chunk.append(email)
+        if chunk:
+            yield chunk
+
+    def _group_filter(self, group_name):
+        escaped = group_name.replace("'", "''")
+        return f"Name=='{escaped}'"
+
+    def _index_created_group(self, list_id, group_name, group):
+        if 'idGroup' in group:
+            self._group_index.add(list_id, group_name, group['idGroup'])
+        return group
+
+    def _stale_token(self, kwargs):
+        return kwargs.get('headers', {}).get('Authorization', '')[len('Bearer '):] or None
+
+    def _decode(self, resp):
+        return self.codec.loads(resp.content)
+
+    def _first_item(self, data):
+        if data['Items']:
+            return data['Items'][0]
+        return None
+
+    @property
+    def rate_limit_wait(self):
+        """
+        Seconds a request issued now would wait for the rate limiter, including pauses requested
+        by MailUp with ``Retry-After``.
+
+        :rtype: float
+        """
+        return self.rate_limiter.wait_time
+
+    def add_hook(self, event, hook):
+        """
+        Call ``hook`` for every HTTP request sent by the client, including retries and token requests.
+
+        ``before_request`` hooks are called right before sending the request, ``after_request`` hooks once
+        the response status is known or sending failed. Both get a :class:`~mailupy.metrics.RequestEvent`
+        with the method, endpoint template, page number and retry count, ``after_request`` hooks also
+        with status, duration and size of the response. Hooks run in the thread sending the request.
+
+        :param event: ``'before_request'`` or ``'after_request'``
+        :type event: str
+        :param hook: Callable taking the :class:`~mailupy.metrics.RequestEvent`
+        :type hook: callable
+        :raise mailupy.exceptions.MailupyException: if ``event`` is unknown
+        """
+        if event not in self._hooks:
+            raise MailupyException(f'Unknown hook event {event!r}, expected one of {sorted(self._hooks)}')
+        self._hooks[event].append(hook)
+
+    def remove_hook(self, event, hook):
+        """
+        Stop calling a hook added with :func:`~mailupy.Mailupy.add_hook()`.
+
+        :param event: ``'before_request'`` or ``'after_request'``
+        :type event: str
+        :param hook: The hook
+        :type hook: callable
+        """
+        self._hooks[event].remove(hook)
+
+    def invalidate_fields(self):
+        """
+        Forget the cached dynamic fields definitions.
+
+        Fields definitions used to send messages and update recipients are cached for ``fields_ttl`` seconds,
+        call this after adding or renaming fields on MailUp to pick up the changes immediately.
+        """
+        self._fields_cache.invalidate()
+
+    def invalidate_groups(self, list_id=None):
+        """
+        Forget the group names indexed for a list, or for every list if ``list_id`` is omitted.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        """
+        self._group_index.invalidate(list_id)
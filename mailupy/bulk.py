@@ -0,0 +1,103 @@
+import itertools
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .exceptions import MailupyException
+
+
+ImportProgress = namedtuple('ImportProgress', ['chunk', 'size', 'import_id', 'status', 'imported'])
+ImportProgress.__doc__ = """
+Progress of :func:`~mailupy.Mailupy.import_recipients()` after a chunk has been imported.
+
+``chunk`` is the index of the chunk, ``size`` the number of recipients in it, ``import_id`` the MailUp
+import ID, ``status`` the final import status returned by MailUp and ``imported`` the number of recipients
+sent so far.
+"""
+
+BulkResult = namedtuple('BulkResult', ['recipient', 'ok', 'result', 'error', 'key'])
+BulkResult.__new__.__defaults__ = (None,)
+BulkResult.__doc__ = """
+Outcome of a single call of a bulk operation.
+
+``recipient`` is the item taken from the input, ``ok`` tells whether the call succeeded,
+``result`` holds what the single call returned and ``error`` the
+:class:`~mailupy.exceptions.MailupyException` raised otherwise. ``key`` is the key given
+with the item by a ``keyed`` input, ``None`` otherwise.
+"""
+
+Source = namedtuple('Source', ['kind', 'id', 'status'])
+Source.__doc__ = """
+A list or group read by :func:`~mailupy.Mailupy.get_recipients_from_sources()`.
+
+``kind`` is ``'List'`` or ``'Group'``, ``id`` the list or group ID and ``status`` the recipients read
+from a list (``'EmailOptins'``, ``'Subscribed'``, ``'Unsubscribed'`` or ``'Pending'``), ``None`` for groups.
+"""
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    Split ``iterable`` in lists of at most ``chunk_size`` items, reading it lazily.
+
+    :rtype: collections.Iterable[list]
+    """
+    items = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_unordered(func, iterable, workers, max_pending=None):
+    """
+    Call ``func`` on every item of ``iterable`` from a pool of threads, yielding as calls complete.
+
+    At most ``max_pending`` items (twice ``workers`` by default) are taken from ``iterable`` ahead of
+    the consumer, so arbitrarily long iterables can be processed with bounded memory.
+    Pending calls are cancelled when the consumer stops iterating.
+
+    :return: Iterator of ``(item, future)`` tuples, futures are already done
+    :rtype: collections.Iterable[tuple]
+    """
+    items = iter(iterable)
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in itertools.islice(items, max_pending or 2 * workers):
+            pending[executor.submit(func, item)] = item
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in itertools.islice(items, 1):
+                    pending[executor.submit(func, next_item)] = next_item
+                yield item, future
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def run_bulk(func, iterable, workers, keyed=False, on_result=None):
+    """
+    Like :func:`~mailupy.bulk.imap_unordered()` but yields a :class:`~mailupy.bulk.BulkResult` for each item,
+    collecting MailUp errors instead of raising them.
+
+    With ``keyed`` the iterable yields ``(key, item)`` pairs, ``func`` is called with the item and the key is
+    carried by the result. ``on_result`` is called with each result in the worker thread, as soon as its call
+    completes, e.g. to checkpoint it before the consumer gets to it.
+
+    :rtype: collections.Iterable[mailupy.bulk.BulkResult]
+    """
+    def call(pair):
+        key, item = pair
+        try:
+            result = BulkResult(item, True, func(item), None, key)
+        except MailupyException as ex:
+            result = BulkResult(item, False, None, ex, key)
+        if on_result is not None:
+            on_result(result)
+        return result
+    pairs = iterable if keyed else ((None, item) for item in iterable)
+    for pair, future in imap_unordered(call, pairs, workers):
+        yield future.result()
@@ -0,0 +1,319 @@
+import collections
+import threading
+import time
+
+from .metrics import endpoint_template
+
+
+class FieldCache:
+    """
+    Thread-safe cache of the recipients' dynamic fields definitions.
+
+    Keeps the definitions returned by :func:`~mailupy.Mailupy.get_fields()` together with
+    a ``Description`` → ``Id`` index, and reloads them once they are older than ``ttl`` seconds.
+
+    :param ttl: Seconds before definitions are considered stale, ``None`` to never expire them
+    :type ttl: float
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def _fresh_entry(self):
+        entry = self._entry
+        if entry is None:
+            return None
+        if self.ttl is not None and time.monotonic() - entry[2] >= self.ttl:
+            return None
+        return entry
+
+    def get(self):
+        """
+        Get the ``Description`` → ``Id`` index if still fresh.
+
+        :return: ``dict`` mapping descriptions to ids or ``None`` if missing or expired
+        :rtype: dict
+        """
+        entry = self._fresh_entry()
+        return entry[1] if entry else None
+
+    def set(self, definitions):
+        """
+        Replace cached definitions.
+
+        :param definitions: Fields definitions as returned by MailUp
+        :type definitions: collections.Iterable[dict]
+        :return: The new ``Description`` → ``Id`` index
+        :rtype: dict
+        """
+        definitions = list(definitions)
+        index = {elem['Description']: elem['Id'] for elem in definitions}
+        self._entry = (definitions, index, time.monotonic())
+        return index
+
+    def _load_entry(self, loader):
+        entry = self._fresh_entry()
+        if entry is None:
+            with self._lock:
+                entry = self._fresh_entry()
+                if entry is None:
+                    self.set(loader())
+                    entry = self._entry
+        return entry
+
+    def load(self, loader):
+        """
+        Get the index, calling ``loader`` to fetch definitions when missing or expired.
+
+        Concurrent callers wait for a single ``loader`` call instead of fetching the definitions again.
+
+        :param loader: Callable returning fields definitions
+        :type loader: callable
+        :rtype: dict
+        """
+        return self._load_entry(loader)[1]
+
+    def definitions(self, loader):
+        """
+        Get cached definitions, loading them as in :func:`~mailupy.cache.FieldCache.load()`.
+
+        :param loader: Callable returning fields definitions
+        :type loader: callable
+        :rtype: list of dict
+        """
+        return self._load_entry(loader)[0]
+
+    def invalidate(self):
+        """
+        Drop cached definitions, next lookup will fetch them again.
+        """
+        self._entry = None
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of the pages returned by read-mostly endpoints.
+
+    Pages are kept as raw bytes keyed by method, path and query, so every hit decodes a fresh copy that callers
+    can modify. An endpoint is cached only if its template (see :func:`~mailupy.metrics.endpoint_template()`)
+    has a TTL in ``ttls``. The least recently used pages are evicted once there are more than ``max_entries``
+    pages or they take more than ``max_bytes``.
+
+    Example::
+
+     >>> cache = ResponseCache(ttls={**ResponseCache.DEFAULT_TTLS, '/List/{list_id}/Groups': 30})
+     >>> client = Mailupy('m00000', 'password', 'client-id', 'client-secret', response_cache=cache)
+
+    :param ttls: Seconds each endpoint template is cached for, :attr:`DEFAULT_TTLS` if omitted
+    :type ttls: dict
+    :param max_entries: Maximum number of cached pages
+    :type max_entries: int
+    :param max_bytes: Maximum size of the cached pages, bigger pages are never cached
+    :type max_bytes: int
+    """
+
+    DEFAULT_TTLS = {
+        '/Recipient/DynamicFields': 3600,
+        '/List/{list_id}/Groups': 300,
+        '/List/{list_id}/Emails': 300,
+    }
+    """TTLs of the endpoints cached by default: fields, groups and messages of lists"""
+
+    def __init__(self, ttls=None, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.ttls = dict(self.DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def ttl(self, path):
+        """
+        Get the TTL of a path.
+
+        :param path: URL path relative to the API URL, e.g. ``/List/1/Groups``
+        :type path: str
+        :return: Seconds, ``None`` if the path isn't cached
+        :rtype: float
+        """
+        return self.ttls.get(endpoint_template(path))
+
+    def get(self, method, path, query):
+        """
+        Get a cached page.
+
+        :param method: HTTP verb
+        :type method: str
+        :param path: URL path relative to the API URL
+        :type path: str
+        :param query: URL query
+        :type query: str
+        :return: Body of the response, ``None`` if missing or expired
+        :rtype: bytes
+        """
+        key = (method, path, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() >= entry[1]:
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, method, path, query, content):
+        """
+        Cache a page, if its endpoint has a TTL and it fits in ``max_bytes``.
+
+        :param method: HTTP verb
+        :type method: str
+        :param path: URL path relative to the API URL
+        :type path: str
+        :param query: URL query
+        :type query: str
+        :param content: Body of the response
+        :type content: bytes
+        """
+        ttl = self.ttl(path)
+        if ttl is None or len(content) > self.max_bytes:
+            return
+        key = (method, path, query)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (content, time.monotonic() + ttl)
+            self._bytes += len(content)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def invalidate(self, prefix='', contains=None):
+        """
+        Drop cached pages whose path starts with ``prefix`` (and contains ``contains``, if given).
+
+        Without arguments the whole cache is cleared.
+
+        :param prefix: Start of the paths to drop, e.g. ``/List/1/``
+        :type prefix: str
+        :param contains: Part of the paths to drop, e.g. ``/Recipients``
+        :type contains: str
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[1].startswith(prefix) and (
+                    contains is None or contains in key[1])]:
+                self._discard(key)
+                self._stats['invalidations'] += 1
+
+    @property
+    def stats(self):
+        """
+        ``hits``, ``misses``, ``evictions`` and ``invalidations`` counters with the current ``entries``
+        and ``bytes``.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class GroupIndex:
+    """
+    Thread-safe index of group names to ids, for each list.
+
+    A list's index is complete once filled from a full listing of its groups, otherwise it only holds the
+    groups found by name or created by the client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._complete = set()
+        self._name_locks = {}
+
+    def get(self, list_id, name):
+        """
+        Get the id of a group.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        :param name: Group name
+        :type name: str
+        :return: Group id, ``None`` if not indexed
+        :rtype: int
+        """
+        with self._lock:
+            return self._groups.get(str(list_id), {}).get(name)
+
+    def is_complete(self, list_id):
+        """
+        Check whether every group of a list is indexed.
+
+        :rtype: bool
+        """
+        with self._lock:
+            return str(list_id) in self._complete
+
+    def add(self, list_id, name, group_id):
+        """
+        Index a group.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        :param name: Group name
+        :type name: str
+        :param group_id: Group ID
+        :type group_id: int
+        """
+        with self._lock:
+            self._groups.setdefault(str(list_id), {})[name] = group_id
+
+    def fill(self, list_id, groups):
+        """
+        Replace the index of a list with all of its groups.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        :param groups: Groups as returned by MailUp
+        :type groups: collections.Iterable[dict]
+        """
+        index = {}
+        for group in groups:
+            # Keep the first of groups sharing a name, as a linear scan would
+            index.setdefault(group['Name'], group['idGroup'])
+        with self._lock:
+            self._groups[str(list_id)] = index
+            self._complete.add(str(list_id))
+
+    def invalidate(self, list_id=None):
+        """
+        Drop the index of a list, or of every list if ``list_id`` is omitted.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        """
+        with self._lock:
+            if list_id is None:
+                self._groups.clear()
+                self._complete.clear()
+            else:
+                self._groups.pop(str(list_id), None)
+                self._complete.discard(str(list_id))
+
+    def lock(self, list_id, name):
+        """
+        Get the lock serializing lookups and creations of a group name in a list.
+
+        :rtype: threading.Lock
+        """
+        with self._lock:
+            return self._name_locks.setdefault((str(list_id), name), threading.Lock())
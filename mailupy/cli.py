@@ -0,0 +1,424 @@
+"""
+Command line interface, installed as the ``mailupy`` command.
+
+Credentials are read from the ``MAILUP_USERNAME``, ``MAILUP_PASSWORD``, ``MAILUP_CLIENT_ID`` and
+``MAILUP_CLIENT_SECRET`` environment variables, or from the matching options::
+
+    mailupy export --list 1 --status Subscribed --output subscribed/ --workers 4 --checkpoint export.ckpt
+    mailupy import recipients.csv --list 1 --chunk-size 5000 --checkpoint import.ckpt
+    mailupy send recipients.csv --message 12 --workers 8 --checkpoint send.ckpt
+    mailupy sync list-1.sqlite --list 1
+
+Every job is split into shards (ranges of pages, chunks of the input file, single recipients) run by
+``--workers`` threads. Completed shards are appended to the ``--checkpoint`` file, so running the same
+command again after an interruption skips them.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+from .bulk import Source, iter_chunks, run_bulk
+from .client import Mailupy
+from .exceptions import MailupyException
+from .export import EXPORTERS
+from .sync import RecipientSync
+
+
+class Progress:
+    """
+    Thread-safe counter printing throughput and ETA of a job at most every ``interval`` seconds.
+
+    :param total: Units of work of the job, ``None`` if unknown
+    :type total: int
+    :param unit: Name of the units, e.g. ``'recipients'``
+    :type unit: str
+    :param metrics: Client metrics, to show the requests sent so far
+    :type metrics: mailupy.metrics.Metrics
+    :param stream: Where progress is printed, ``None`` to print nothing
+    :type stream: io.TextIOBase
+    :param interval: Minimum seconds between two updates
+    :type interval: float
+    """
+
+    def __init__(self, total=None, unit='items', metrics=None, stream=sys.stderr, interval=1):
+        self.total = total
+        self.unit = unit
+        self.metrics = metrics
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self._started = time.monotonic()
+        self._printed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """
+        Units completed per second.
+
+        :rtype: float
+        """
+        return self.done / max(time.monotonic() - self._started, 1e-9)
+
+    def advance(self, count=1):
+        """
+        Record completed units, printing progress if ``interval`` has passed.
+        """
+        with self._lock:
+            self.done += count
+            if time.monotonic() - self._printed >= self.interval:
+                self._printed = time.monotonic()
+                self._print()
+
+    def counting(self, items):
+        """
+        Wrap an iterable, advancing by one for each item.
+
+        :rtype: collections.Iterable
+        """
+        for item in items:
+            yield item
+            self.advance()
+
+    def render(self):
+        """
+        Describe the progress in a line.
+
+        :rtype: str
+        """
+        rate = self.rate
+        line = f'{self.done}'
+        if self.total is not None:
+            line += f'/{self.total}'
+        line += f' {self.unit}, {rate:.1f}/s'
+        if self.total is not None and rate > 0:
+            line += f', ETA {max(self.total - self.done, 0) / rate:.0f}s'
+        if self.metrics is not None:
+            line += f", {self.metrics.snapshot()['counters'].get('requests', 0)} requests"
+        return line
+
+    def _print(self):
+        if self.stream is None:
+            return
+        if self.stream.isatty():
+            self.stream.write(f'\r{self.render()}\x1b[K')
+        else:
+            self.stream.write(f'{self.render()}\n')
+        self.stream.flush()
+
+    def close(self):
+        """
+        Print the final progress.
+        """
+        with self._lock:
+            self._print()
+            if self.stream is not None and self.stream.isatty():
+                self.stream.write('\n')
+
+
+class Checkpoint:
+    """
+    Journal of the completed shards of a job, one JSON line each.
+
+    The first line describes the job, so a checkpoint isn't resumed by a different one.
+    Without a ``path`` nothing is saved.
+
+    :param path: Path of the journal, created if missing
+    :type path: str
+    :param job: Description of the job
+    :type job: dict
+    :raise mailupy.exceptions.MailupyException: if the journal belongs to another job
+    """
+
+    def __init__(self, path, job):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path is None:
+            return
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                content = file.read()
+            # Drop a line torn by an interruption, so the next one starts on its own line
+            content = content[:content.rfind('\n') + 1]
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            lines = [json.loads(line) for line in content.splitlines()]
+            if lines and lines[0].get('job') != job:
+                raise MailupyException(f'{path} is the checkpoint of another job: {lines[0].get("job")}')
+            self.done = {line['shard'] for line in lines[1:]}
+            self._file = open(path, 'a', encoding='utf-8')
+            if not lines:
+                self._write({'job': job})
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write({'job': job})
+
+    def _write(self, line):
+        self._file.write(json.dumps(line) + '\n')
+        self._file.flush()
+
+    def mark(self, shard):
+        """
+        Record a completed shard.
+
+        :param shard: Key of the shard, JSON serializable and hashable
+        """
+        with self._lock:
+            self.done.add(shard)
+            if self._file is not None:
+                self._write({'shard': shard})
+
+    def close(self):
+        """
+        Close the journal.
+        """
+        if self._file is not None:
+            self._file.close()
+
+
+def _read_rows(path):
+    # Rows of a CSV file as (email, name, fields), other columns being dynamic fields by description
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            email = row.pop('email', None) or row.pop('Email', None)
+            if not email:
+                raise MailupyException(f'{path} has a row without email')
+            name = row.pop('name', None) or row.pop('Name', None) or ''
+            yield email, name, {key: value for key, value in row.items() if value not in (None, '')}
+
+
+def _count_rows(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return sum(1 for row in csv.DictReader(file))
+
+
+def _source(args):
+    if (args.list is None) == (args.group is None):
+        raise MailupyException('Either --list or --group is required')
+    if args.list is not None:
+        return Source('List', args.list, getattr(args, 'status', None) or 'EmailOptins')
+    return Source('Group', args.group, None)
+
+
+def _target(source):
+    return {'list_id': source.id} if source.kind == 'List' else {'group_id': source.id}
+
+
+def _pending(shards, checkpoint, progress, size):
+    # Skip shards completed by a previous run, counting them as done
+    for key, shard in shards:
+        if key in checkpoint.done:
+            progress.advance(size(shard))
+        else:
+            yield key, shard
+
+
+def _run(func, shards, checkpoint, progress, workers, describe):
+    # Run (key, shard) pairs from a pool of threads, marking each one as soon as it completes
+    def done(result):
+        if result.ok:
+            checkpoint.mark(result.key)
+    return _report(run_bulk(func, shards, workers, keyed=True, on_result=done), checkpoint, progress, describe)
+
+
+def _report(results, checkpoint, progress, describe):
+    failures = 0
+    try:
+        for result in results:
+            if not result.ok:
+                failures += 1
+                print(f'mailupy: {describe(result.key, result.recipient)} failed: {result.error}', file=sys.stderr)
+    finally:
+        checkpoint.close()
+        progress.close()
+    return 1 if failures else 0
+
+
+def export(client, args, progress):
+    """
+    Export the recipients of a list or a group, a file of ``--shard-pages`` pages for each shard.
+    """
+    filter_ordering = {'filter_by': args.filter} if args.filter else {}
+    items = client.get_recipients_from_source(_source(args), page_size=args.page_size, **filter_ordering)
+    shards = client.shard_pages(items, args.shard_pages)
+    progress.total = sum(shard.size for shard in shards)
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'export', 'url': items.cursor.full_url,
+                                              'page_size': args.page_size, 'shard_pages': args.shard_pages})
+    os.makedirs(args.output, exist_ok=True)
+
+    def export_shard(shard):
+        items = client.resume_pages(shard.cursor)
+        try:
+            path = os.path.join(args.output, f'part-{shard.cursor.page:06d}.{args.format}')
+            return client.export(progress.counting(itertools.islice(items, shard.size)), path, args.format)
+        finally:
+            items.close()
+    shards = ((shard.cursor.page, shard) for shard in shards)
+    return _run(export_shard, _pending(shards, checkpoint, progress, lambda shard: shard.size), checkpoint, progress,
+                args.workers, lambda key, shard: f'pages {key}-{key + shard.pages - 1}')
+
+
+def import_(client, args, progress):
+    """
+    Import the recipients of a CSV file in chunks of ``--chunk-size``, one MailUp import for each chunk.
+    """
+    source = _source(args)
+    progress.total = _count_rows(args.file)
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'import', 'file': os.path.abspath(args.file),
+                                              'source': list(source), 'chunk_size': args.chunk_size})
+
+    def import_chunk(chunk):
+        recipients = [(name, email, fields) for email, name, fields in chunk]
+        for imported in client.import_recipients(recipients, chunk_size=len(recipients), pending=args.pending,
+                                                 **_target(source)):
+            progress.advance(imported.size)
+    chunks = enumerate(iter_chunks(_read_rows(args.file), args.chunk_size))
+    return _run(import_chunk, _pending(chunks, checkpoint, progress, len), checkpoint, progress, args.workers,
+                lambda key, chunk: f'chunk {key}')
+
+
+def send(client, args, progress):
+    """
+    Send a message to every recipient of a CSV file, other columns filling dynamic fields.
+
+    Each recipient is a shard, marked as soon as its message is sent.
+    """
+    progress.total = _count_rows(args.file)
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'send', 'file': os.path.abspath(args.file),
+                                              'message': args.message})
+
+    def sent(result):
+        if result.ok:
+            checkpoint.mark(result.key)
+            progress.advance()
+    rows = ((key, (email, fields)) for key, (email, name, fields) in enumerate(_read_rows(args.file)))
+    results = client.send_message_bulk(_pending(rows, checkpoint, progress, lambda row: 1), args.message,
+                                       args.workers, keyed=True, on_result=sent)
+    return _report(results, checkpoint, progress, lambda key, row: row[0])
+
+
+def sync(client, args, progress):
+    """
+    Mirror the recipients of a list or a group into SQLite, see :class:`~mailupy.sync.RecipientSync`.
+
+    Pages are prefetched by ``--workers`` threads of a client built by :func:`main`, progress is resumed
+    by the database itself.
+    """
+    source = _source(args)
+    progress.unit = 'pages'
+
+    def page_done(event):
+        if event.page_number is not None:
+            progress.advance()
+    client.add_hook('after_request', page_done)
+    try:
+        with RecipientSync(client, args.database, page_size=args.page_size, **_target(source)) as mirror:
+            report = mirror.run(full=args.full or None)
+    finally:
+        client.remove_hook('after_request', page_done)
+        progress.close()
+    print(f'{"full" if report.full else "incremental"} sync: {report.inserted} inserted, {report.updated} updated, '
+          f'{report.removed} removed, {report.unchanged} unchanged')
+    return 0
+
+
+COMMANDS = {'export': export, 'import': import_, 'send': send, 'sync': sync}
+"""Subcommands by name"""
+
+
+def build_parser():
+    """
+    Build the parser of the ``mailupy`` command.
+
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog='mailupy', description='Run bulk jobs against MailUp.')
+    parser.add_argument('--username', default=os.environ.get('MAILUP_USERNAME'))
+    parser.add_argument('--password', default=os.environ.get('MAILUP_PASSWORD'))
+    parser.add_argument('--client-id', default=os.environ.get('MAILUP_CLIENT_ID'))
+    parser.add_argument('--client-secret', default=os.environ.get('MAILUP_CLIENT_SECRET'))
+    parser.add_argument('--rate-limit', type=float, help='maximum requests per second')
+    parser.add_argument('--quiet', action='store_true', help="don't print progress")
+    commands = parser.add_subparsers(dest='command')
+
+    def command(name, help):
+        subparser = commands.add_parser(name, help=help)
+        subparser.add_argument('--workers', type=int, default=4, help='shards run at the same time')
+        if name != 'sync':
+            subparser.add_argument('--checkpoint', help='file recording completed shards, to resume the job')
+        return subparser
+
+    def source(subparser):
+        subparser.add_argument('--list', type=int, help='list ID')
+        subparser.add_argument('--group', type=int, help='group ID')
+
+    subparser = command('export', 'export the recipients of a list or a group')
+    source(subparser)
+    subparser.add_argument('--status', default='EmailOptins',
+                           choices=['EmailOptins', 'Subscribed', 'Unsubscribed', 'Pending'])
+    subparser.add_argument('--filter', help="MailUp filter, e.g. \"Email.Contains('example.com')\"")
+    subparser.add_argument('--output', required=True, help='directory of the exported files, one for each shard')
+    subparser.add_argument('--format', default='csv', choices=sorted(EXPORTERS))
+    subparser.add_argument('--page-size', type=int, default=500)
+    subparser.add_argument('--shard-pages', type=int, default=20, help='pages of each shard')
+
+    subparser = command('import', 'import the recipients of a CSV file with an email column')
+    subparser.add_argument('file')
+    source(subparser)
+    subparser.add_argument('--chunk-size', type=int, default=1000, help='recipients of each import')
+    subparser.add_argument('--pending', action='store_true', help='ask recipients to confirm their subscription')
+
+    subparser = command('send', 'send a message to the recipients of a CSV file with an email column')
+    subparser.add_argument('file')
+    subparser.add_argument('--message', type=int, required=True, help='message ID')
+
+    subparser = command('sync', 'mirror the recipients of a list or a group into SQLite')
+    subparser.add_argument('database')
+    source(subparser)
+    subparser.add_argument('--page-size', type=int, default=500)
+    subparser.add_argument('--full', action='store_true', help='read every recipient, removing missing ones')
+    return parser
+
+
+def main(argv=None, client=None):
+    """
+    Run the ``mailupy`` command.
+
+    :param argv: Arguments, ``sys.argv[1:]`` if omitted
+    :type argv: list of str
+    :param client: Client running the job, built from credentials if omitted
+    :type client: mailupy.Mailupy
+    :return: Exit status
+    :rtype: int
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('a command is required')
+    created = client is None
+    try:
+        if created:
+            credentials = (args.username, args.password, args.client_id, args.client_secret)
+            if not all(credentials):
+                raise MailupyException('MailUp credentials are required, see mailupy --help')
+            page_workers = args.workers if args.command == 'sync' else 1
+            client = Mailupy(*credentials, page_workers=page_workers, rate_limit=args.rate_limit)
+        progress = Progress(unit='recipients', metrics=client.metrics, stream=None if args.quiet else sys.stderr)
+        return COMMANDS[args.command](client, args, progress)
+    except MailupyException as ex:
+        print(f'mailupy: {ex}', file=sys.stderr)
+        return 1
+    finally:
+        if created and client is not None:
+            client.close()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -1,170 +1,572 @@
-import json
-import urllib
-
+import collections
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .base import BaseMailupy
+from .bulk import ImportProgress, Source, imap_unordered, iter_chunks, run_bulk
+from .coalesce import RequestCoalescer
 from .exceptions import MailupyException, MailupyRequestException
-from .utils import type_to_request_function
+from .export import EXPORTERS
+from .pagination import AdaptivePageSize, PageCursor, PageIterator, PageShard
+from .records import FieldSchema, Group, Message, Recipient
+from .streaming import iter_page_items
+from .tokens import MemoryTokenStore, TokenStore
+from .transport import HTTPTransport
 
 
-class Mailupy:
+class Mailupy(BaseMailupy):
     """
     Client class for MailUp.
     """
 
-    AUTH_URL = "https://services.mailup.com/Authorization/OAuth/Token"
-    """MailUp URL for authentication"""
-
-    BASE_URL = "https://services.mailup.com/API/v1.1/Rest/ConsoleService.svc/Console"
-    """MailUP API URL"""
-
-    def __init__(self, username, password, client_id, client_secret):
-        self._filters = {}
-        self._token = None
-        self._mailup_user = {
-            'username': username,
-            'password': password,
-            'client_id': client_id,
-            'client_secret': client_secret
-        }
-        self.login()
+    STREAM_CHUNK_SIZE = 64 * 1024
+    """Bytes read at once from the response when pages are streamed"""
+
+    def __init__(self, username, password, client_id, client_secret, transport=None, fields_ttl=300,
+                 page_workers=1, page_read_ahead=None, rate_limit=None, rate_burst=None, max_throttle_retries=5,
+                 stream_pages=False, token_store=None, refresh_margin=60, response_cache=None, page_retries=2,
+                 page_retry_delay=1, records=False, retry_policy=None, coalesce_requests=True, json_codec=None):
+        """
+        :param username: MailUp username
+        :type username: str
+        :param password: MailUp password
+        :type password: str
+        :param client_id: Client ID of the MailUp application
+        :type client_id: str
+        :param client_secret: Client secret of the MailUp application
+        :type client_secret: str
+        :param transport: Transport used for every HTTP call, if omitted the client creates (and owns) its own
+            :class:`~mailupy.transport.HTTPTransport`
+        :type transport: mailupy.transport.HTTPTransport
+        :param fields_ttl: Seconds the dynamic fields definitions are cached for, ``None`` to cache them until
+            :func:`~mailupy.Mailupy.invalidate_fields()` is called
+        :type fields_ttl: float
+        :param page_workers: Number of threads fetching pages of paginated results, with more than one thread
+            the remaining pages are downloaded in parallel once the first page tells how many there are
+        :type page_workers: int
+        :param page_read_ahead: Maximum number of pages fetched ahead of the consumer when ``page_workers``
+            is greater than one, defaults to twice ``page_workers``
+        :type page_read_ahead: int
+        :param rate_limit: Maximum requests per second sent by this client from every thread, ``None`` for no limit
+        :type rate_limit: float
+        :param rate_burst: Requests that can be sent back to back before ``rate_limit`` applies
+        :type rate_burst: int
+        :param max_throttle_retries: Times a request answered with 429 is sent again before raising
+            :class:`~mailupy.exceptions.MailupyRequestException`
+        :type max_throttle_retries: int
+        :param stream_pages: Decode pages while they're downloaded, yielding each item as soon as it's complete
+            instead of holding whole pages in memory. Applies to sequential reads with a fixed page size
+        :type stream_pages: bool
+        :param token_store: Where tokens are kept, share a :class:`~mailupy.tokens.FileTokenStore` or a
+            :class:`~mailupy.tokens.SharedTokenStore` to let many processes use the same access token
+        :type token_store: mailupy.tokens.TokenStore
+        :param refresh_margin: Seconds before its expiry the access token is refreshed
+        :type refresh_margin: float
+        :param response_cache: Cache of the pages of read-mostly endpoints such as fields and groups,
+            ``None`` to always download them. Pages are invalidated when the client changes the list
+            or group they belong to. Applies to pages read with a fixed page size
+        :type response_cache: mailupy.cache.ResponseCache
+        :param page_retries: Times a page failing with a network error or a status code >= 500 is requested
+            again, iterators of paginated results then continue from the item that would have come next.
+            Requests already retried by ``retry_policy`` aren't requested again
+        :type page_retries: int
+        :param page_retry_delay: Seconds before requesting a failed page again, doubled after each retry
+        :type page_retry_delay: float
+        :param records: Yield compact :class:`~mailupy.records.Recipient`, :class:`~mailupy.records.Group`
+            and :class:`~mailupy.records.Message` records instead of ``dict`` from paginated ``get_*`` methods
+        :type records: bool
+        :param retry_policy: Which failed requests are sent again and when, a default
+            :class:`~mailupy.retry.RetryPolicy` if omitted, :data:`~mailupy.retry.NO_RETRY` to never retry them
+        :type retry_policy: mailupy.retry.RetryPolicy
+        :param coalesce_requests: Send a single request for identical GETs made at the same time by many threads,
+            sharing its response. Saved requests are counted by the ``coalesced_requests`` metric
+        :type coalesce_requests: bool
+        :param json_codec: Codec encoding payloads and decoding responses, or its name (``'orjson'``, ``'ujson'``
+            or ``'json'``). The fastest installed library is used if omitted, see :func:`~mailupy.codec.get_codec()`
+        :type json_codec: str, mailupy.codec.JSONCodec
+        """
+        super().__init__(
+            username, password, client_id, client_secret, fields_ttl=fields_ttl,
+            rate_limit=rate_limit, rate_burst=rate_burst, max_throttle_retries=max_throttle_retries,
+            retry_policy=retry_policy, json_codec=json_codec
+        )
+        self._owns_transport = transport is None
+        self._transport = transport or HTTPTransport()
+        self._page_workers = page_workers
+        self._page_read_ahead = page_read_ahead or 2 * page_workers
+        self._stream_pages = stream_pages
+        self.token_store = token_store or MemoryTokenStore()
+        self._refresh_margin = refresh_margin
+        self._refresh_lock = threading.Lock()
+        self._token_stats = {'logins': 0, 'refreshes': 0, 'coalesced': 0, 'wait_time': 0.0, 'max_wait_time': 0.0}
+        self.response_cache = response_cache
+        self._page_retries = page_retries
+        self._page_retry_delay = page_retry_delay
+        self._records = records
+        self._field_schema = None
+        self._in_flight = RequestCoalescer(self.metrics) if coalesce_requests else None
 
     def _requests_wrapper(self, req_type, url, *args, **kwargs):
-        try:
-            resp = type_to_request_function[req_type](url, **kwargs)
-        except Exception as ex:
-            raise MailupyException(ex)
-        if resp.status_code == 429:
-            resp = self._requests_wrapper(req_type, url, *args, **kwargs)
-        if resp.status_code == 401:
-            self._refresh_my_token()
-            resp = self._requests_wrapper(
-                req_type, url, *args, **{**kwargs, 'headers': self._default_headers()}
+        if self._in_flight is not None and req_type == 'GET' and not kwargs.get('stream'):
+            # Streamed bodies can be read only once, so they can't be shared
+            return self._in_flight.run((req_type, url), lambda: self._send_with_retries(req_type, url, kwargs))
+        resp = self._send_with_retries(req_type, url, kwargs)
+        if self.response_cache is not None and req_type != 'GET' and url.startswith(self.BASE_URL):
+            self._invalidate_responses(url)
+        return resp
+
+    def _invalidate_responses(self, url):
+        segments = self._split_url(url)[0].split('/')
+        if segments[1] in ('Email', 'Sms'):
+            return
+        if segments[1] in ('List', 'Group') and len(segments) > 2 and segments[2].isdigit():
+            self.response_cache.invalidate(f'/{segments[1]}/{segments[2]}/')
+        else:
+            # Recipients changed without knowing their lists
+            self.response_cache.invalidate(contains='/Recipients')
+
+    def _send_with_retries(self, req_type, url, kwargs, retry=0, renewed=False):
+        throttled = failures = 0
+        started = time.monotonic()
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                resp = self._send_request(req_type, url, kwargs, retry + throttled + failures)
+            except MailupyException as ex:
+                failures += 1
+                delay = self._retry_delay(req_type, url, failures, started, error=ex.__cause__)
+                if delay is None:
+                    ex.retried = self._retries_exhausted(failures, started)
+                    raise
+                time.sleep(delay)
+                continue
+            if resp.status_code == 429 and self._can_throttle(throttled, started):
+                throttled += 1
+                self._throttle(resp, throttled)
+                resp.close()
+                continue
+            if resp.status_code >= 500:
+                failures += 1
+                delay = self._retry_delay(req_type, url, failures, started, status=resp.status_code)
+                if delay is not None:
+                    resp.close()
+                    time.sleep(delay)
+                    continue
+            break
+        # Sent again once with a renewed token, a second 401 isn't about an expired token
+        if resp.status_code == 401 and url != self.AUTH_URL and not renewed:
+            resp.close()
+            self._renew_token(self._stale_token(kwargs))
+            resp = self._send_with_retries(
+                req_type, url, {**kwargs, 'headers': self._default_headers()}, retry + throttled + failures + 1, True
             )
         if resp.status_code >= 400:
-            raise MailupyRequestException(resp)
+            ex = MailupyRequestException(resp, self.codec)
+            ex.retried = resp.status_code >= 500 and self._retries_exhausted(failures, started)
+            raise ex
         return resp
 
-    def _download_all_pages(self, url):
-        total = 1
-        current = 0
-        spacer = '&' if '?' in url else '?'
-        is_paginated = True
-        while total - current and is_paginated:
-            data = self._requests_wrapper(
-                'GET',
-                f'{url}{spacer}pageNumber={current}',
-                headers=self._default_headers()
-            ).json()
-            if data['PageSize'] and data['Items']:
-                total = data['TotalElementsCount'] // data['PageSize']
-                if data['TotalElementsCount'] % data['PageSize']:
-                    total += 1
-            is_paginated = data['IsPaginated']
-            for item in data['Items']:
-                yield item
+    def _send_request(self, req_type, url, kwargs, retry):
+        event = self._start_request(req_type, url, retry)
+        start = time.perf_counter()
+        try:
+            resp = self._transport.request(req_type, url, **kwargs)
+        except Exception as ex:
+            self._end_request(event, start, error=ex)
+            raise MailupyException(ex) from ex
+        self._end_request(event, start, resp, streamed=kwargs.get('stream', False))
+        return resp
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Release the pooled connections, if the transport is owned by the client.
+
+        A transport passed to :func:`~mailupy.Mailupy.__init__()` is left open, as it may be shared.
+        """
+        if self._owns_transport:
+            self._transport.close()
+
+    def _fetch_page(self, url, page_number, page_size=None, **kwargs):
+        return self._requests_wrapper(
+            'GET',
+            self._page_url(url, page_number, page_size),
+            headers=self._default_headers(),
+            **kwargs
+        )
+
+    def _get_page(self, url, page_number, page_size=None):
+        if not self._is_cached(url):
+            return self._decode(self._fetch_page(url, page_number, page_size))
+        path, query = self._split_url(self._page_url(url, page_number, page_size))
+        content = self.response_cache.get('GET', path, query)
+        if content is None:
+            content = self._fetch_page(url, page_number, page_size).content
+            self.response_cache.set('GET', path, query, content)
+        return self.codec.loads(content)
+
+    def _is_cached(self, url):
+        return self.response_cache is not None and self.response_cache.ttl(self._split_url(url)[0]) is not None
+
+    def _iter_page(self, url, page_number, page_size, page, cursor):
+        skip = cursor.skip if page_number == cursor.page else 0
+        if not self._stream_pages or self._is_cached(url):
+            page.update(self._get_page(url, page_number, page_size))
+            yield from cursor.track(page['Items'], page_number, skip)
+            return
+        resp = self._fetch_page(url, page_number, page_size, stream=True)
+        try:
+            yield from cursor.track(iter_page_items(resp.iter_content(self.STREAM_CHUNK_SIZE), page), page_number, skip)
+        finally:
+            resp.close()
+
+    def _download_all_pages(self, url, page_size=None, raw=False):
+        adaptive = page_size if isinstance(page_size, AdaptivePageSize) else None
+        return self._page_iterator(PageCursor.from_url(url, page_size), adaptive, raw)
+
+    def _page_iterator(self, cursor, adaptive=None, raw=False):
+        convert = None if raw else self._record_converter(cursor.url)
+        return PageIterator(self, cursor, adaptive, self._page_retries, self._page_retry_delay, convert)
+
+    def _record_converter(self, url):
+        if not self._records:
+            return None
+        if url.endswith('/Groups'):
+            return Group.from_item
+        if url.endswith('/Emails'):
+            return Message.from_item
+        if '/Recipients' in url:
+            schema = self.field_schema()
+            return lambda item: Recipient.from_item(item, schema)
+        return None
+
+    def field_schema(self):
+        """
+        Get the dynamic fields definitions as a schema shared by recipient records.
+
+        The schema is built from the cached definitions, see ``fields_ttl`` in :func:`~mailupy.Mailupy.__init__()`.
+
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :rtype: mailupy.records.FieldSchema
+        """
+        definitions = self._fields_cache.definitions(self.get_fields)
+        schema = self._field_schema
+        if schema is None or schema[0] is not definitions:
+            schema = self._field_schema = (definitions, FieldSchema(definitions))
+        return schema[1]
+
+    def _iter_cursor(self, cursor, adaptive=None):
+        url, page_size = cursor.full_url, cursor.page_size
+        if cursor.adaptive:
+            yield from self._download_adaptive_pages(url, adaptive, cursor)
+            return
+        page = {}
+        current = cursor.page
+        yield from self._iter_page(url, current, page_size, page, cursor)
+        total = self._count_pages(page)
+        current += 1
+        if self._page_workers > 1 and page['IsPaginated'] and total - current > 1:
+            yield from self._prefetch_pages(url, range(current, total), page_size, cursor)
+            return
+        while total - current > 0 and page['IsPaginated']:
+            page = {}
+            yield from self._iter_page(url, current, page_size, page, cursor)
+            total = self._count_pages(page)
             current = current + 1
 
+    def _download_adaptive_pages(self, url, adaptive, cursor):
+        offset = cursor.offset
+        while True:
+            page_size = adaptive.size
+            # A new page size may not be aligned with what's been read so far, skip items already yielded
+            page_number, skip = divmod(offset, page_size)
+            start = time.monotonic()
+            resp = self._fetch_page(url, page_number, page_size)
+            data = self._decode(resp)
+            served = data['PageSize']
+            adaptive.update(time.monotonic() - start, len(resp.content), served)
+            if served and served < page_size:
+                # MailUp capped the page size, so pages start elsewhere: unless the served page holds the
+                # next item at the same position, request it again at the served size
+                if divmod(offset, served) != (page_number, skip):
+                    continue
+                page_size = served
+            items = data['Items'][skip:]
+            for item in items:
+                offset += 1
+                cursor.page_size, (cursor.page, cursor.skip) = page_size, divmod(offset, page_size)
+                yield item
+            if not (data['IsPaginated'] and items) or offset >= data['TotalElementsCount']:
+                return
+
+    def _prefetch_pages(self, url, page_numbers, page_size, cursor):
+        page_numbers = iter(page_numbers)
+        pending = collections.deque()
+        executor = ThreadPoolExecutor(max_workers=self._page_workers)
+        try:
+            for page_number in itertools.islice(page_numbers, self._page_read_ahead):
+                pending.append((page_number, executor.submit(self._get_page, url, page_number, page_size)))
+            while pending:
+                current, future = pending.popleft()
+                data = future.result()
+                for page_number in itertools.islice(page_numbers, 1):
+                    pending.append((page_number, executor.submit(self._get_page, url, page_number, page_size)))
+                yield from cursor.track(data['Items'], current)
+        finally:
+            for page_number, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def export(self, items, file, output_format=None, batch_size=10000):
+        """
+        Stream the items of a paginated ``get_*`` method to a CSV, NDJSON or Parquet file.
+
+        Recipients are flattened with a column for each dynamic field, using the cached fields definitions
+        (see :func:`~mailupy.Mailupy.field_schema()`). Items are written in batches of ``batch_size`` as they're
+        downloaded, so memory doesn't grow with the size of the list::
+
+         >>> m.export(m.get_subscribed_recipients_from_list(1, page_size=1000), 'subscribed.csv')
+
+        :param items: Iterator returned by a paginated ``get_*`` method, or recipients
+        :type items: mailupy.pagination.PageIterator, collections.Iterable
+        :param file: Path or file object
+        :type file: str, os.PathLike, io.IOBase
+        :param output_format: ``'csv'``, ``'ndjson'`` or ``'parquet'``, guessed from the extension of ``file``
+            (or of its ``name``) if omitted
+        :type output_format: str
+        :param batch_size: Rows written at once
+        :type batch_size: int
+        :raise mailupy.exceptions.MailupyException: if the format is unknown or can't be guessed
+        :return: Number of exported items
+        :rtype: int
+        """
+        if output_format is None:
+            name = getattr(file, 'name', file)
+            extension = os.path.splitext(name)[1] if isinstance(name, (str, os.PathLike)) else ''
+            if not extension:
+                raise MailupyException(f"Can't guess the export format of {file!r}, pass output_format")
+            output_format = extension[1:].lower()
+        if output_format not in EXPORTERS:
+            raise MailupyException(
+                f'Unknown export format {output_format!r}, expected one of {sorted(EXPORTERS)}'
+            )
+        items = iter(items)
+        first = next(items, None)
+        schema = None
+        if isinstance(first, Recipient) or (isinstance(first, dict) and 'idRecipient' in first):
+            schema = self.field_schema()
+        if first is not None:
+            items = itertools.chain([first], items)
+        return EXPORTERS[output_format](items, file, schema=schema, batch_size=batch_size)
+
+    def resume_pages(self, cursor):
+        """
+        Continue iterating paginated results from a cursor.
+
+        The cursor of an iterator returned by a ``get_*`` method is available as its ``cursor`` attribute,
+        it can be saved as JSON and used to resume the iteration after a crash or from another process::
+
+         >>> recipients = m.get_recipients_from_list(1, page_size=500)
+         >>> for recipient in recipients:
+         ...     process(recipient)
+         ...     checkpoint(recipients.cursor.to_json())
+         >>> for recipient in m.resume_pages(load_checkpoint()):
+         ...     process(recipient)
+
+        :param cursor: Cursor, or its JSON serialization
+        :type cursor: mailupy.pagination.PageCursor, str, dict
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: Iterator of ``dict`` yielding the item the cursor points to and the following ones
+        :rtype: mailupy.pagination.PageIterator
+        """
+        if not isinstance(cursor, PageCursor):
+            cursor = PageCursor.from_json(cursor)
+        return self._page_iterator(cursor)
+
+    def shard_pages(self, items, pages_per_shard):
+        """
+        Split the pages of paginated results in ranges that can be read independently, e.g. by many threads.
+
+        Only the first page is requested, to know the number of items::
+
+         >>> for shard in m.shard_pages(m.get_recipients_from_list(1, page_size=500), 20):
+         ...     export(itertools.islice(m.resume_pages(shard.cursor), shard.size))
+
+        :param items: Iterator returned by a ``get_*`` method, with a fixed ``page_size``
+        :type items: mailupy.pagination.PageIterator
+        :param pages_per_shard: Pages of each range
+        :type pages_per_shard: int
+        :raise mailupy.exceptions.MailupyException: if the page size isn't fixed
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: Ranges covering every page from the first one
+        :rtype: list of mailupy.pagination.PageShard
+        """
+        cursor = items.cursor
+        if cursor.adaptive or not cursor.page_size:
+            raise MailupyException('Pages can only be sharded with a fixed page_size')
+        page_size = cursor.page_size
+        first = self._get_page(cursor.full_url, 0, page_size)
+        pages = self._count_pages(first) if first['IsPaginated'] else 1
+        total = first['TotalElementsCount'] or len(first['Items'])
+        return [
+            PageShard(
+                PageCursor(cursor.url, cursor.query, page_size, start),
+                min(pages_per_shard, pages - start),
+                min((start + pages_per_shard) * page_size, total) - start * page_size
+            )
+            for start in range(0, pages, pages_per_shard)
+        ]
+
+    @property
+    def token_stats(self):
+        """
+        Counters about authentication.
+
+        ``logins`` and ``refreshes`` count the token requests sent to MailUp, ``coalesced`` the callers
+        that found the token already renewed by another thread, ``wait_time`` and ``max_wait_time`` the
+        seconds callers were blocked waiting for a login or refresh in progress.
+
+        :rtype: dict
+        """
+        return dict(self._token_stats)
+
     def _default_headers(self):
-        headers = {'Content-type': 'application/json'}
-        if self._token:
-            headers['Authorization'] = f'Bearer {self._token}'
-        return headers
+        self._ensure_token()
+        return super()._default_headers()
+
+    def _set_tokens(self, data):
+        super()._set_tokens(data)
+        self.token_store.save(self._token_record())
+
+    def _token_is_fresh(self):
+        return self._token is not None and (
+            self._token_expires_at is None or time.time() < self._token_expires_at - self._refresh_margin
+        )
+
+    @contextmanager
+    def _token_lock(self):
+        start = time.monotonic()
+        with self._refresh_lock:
+            waited = time.monotonic() - start
+            self._token_stats['wait_time'] += waited
+            self._token_stats['max_wait_time'] = max(self._token_stats['max_wait_time'], waited)
+            with self.token_store.lock():
+                yield
+
+    def _ensure_token(self):
+        if self._token_is_fresh():
+            return
+        with self._token_lock():
+            # Another thread may have logged in or refreshed the token while waiting
+            if self._token_is_fresh():
+                self._token_stats['coalesced'] += 1
+                return
+            record = self.token_store.load()
+            if TokenStore.is_fresh(record, self._refresh_margin):
+                self._use_token_record(record)
+                return
+            if record and record.get('refresh_token'):
+                self._use_token_record(record)
+            self._refresh_or_login()
+
+    def _renew_token(self, stale_token):
+        with self._token_lock():
+            if self._token != stale_token:
+                self._token_stats['coalesced'] += 1
+                return
+            record = self.token_store.load()
+            # Another client sharing the store may have refreshed the token already
+            if record and record['access_token'] != stale_token and TokenStore.is_fresh(record):
+                self._use_token_record(record)
+            else:
+                self._refresh_or_login()
+
+    def _refresh_or_login(self):
+        if self._refresh_token:
+            try:
+                self._refresh_my_token()
+                self._token_stats['refreshes'] += 1
+                return
+            except MailupyRequestException:
+                # The refresh token has expired or was revoked, credentials are still good
+                pass
+        self.login()
+        self._token_stats['logins'] += 1
 
     def _refresh_my_token(self):
-        payload = {
-            'grant_type': 'refresh_token',
-            'client_id': self._mailup_user['client_id'],
-            'client_secret': self._mailup_user['client_secret'],
-            'refresh_token': self._refresh_token,
-        }
         resp = self._requests_wrapper(
             'POST',
             f'{self.AUTH_URL}',
-            data=payload,
+            data=self._refresh_payload(),
         )
         if resp.status_code == 200:
-            self._token = resp.json()['access_token']
-            self._refresh_token = resp.json()['refresh_token']
+            self._set_tokens(self._decode(resp))
             return True
-        raise MailupyRequestException(resp)
+        raise MailupyRequestException(resp, self.codec)
+
+    def _fields_index(self):
+        fields_id = self._fields_cache.get()
+        if fields_id is not None:
+            self.metrics.incr('fields_cache_hits')
+            return fields_id
+        self.metrics.incr('fields_cache_misses')
+        return self._fields_cache.load(self.get_fields)
 
     def _build_mailup_fields(self, fields={}):
-        mailup_fields = list()
-        fields_id = dict()
-        for elem in self.get_fields():
-            fields_id[elem['Description']] = elem['Id']
-        for key, value in fields.items():
-            if key in fields_id.keys():
-                mailup_fields.append({
-                    "Description": key,
-                    "Id": fields_id[key],
-                    "Value": value
-                })
-        return mailup_fields
-
-    def _parse_filter_ordering(self, **filter_ordering):
-        if 'order_by' in filter_ordering:
-            filter_ordering['order_by'] = ';'.join([el for el in filter_ordering['order_by']])
-        query = '&'.join([
-            '{0}={1}'.format(k.replace('_', ''), urllib.parse.quote_plus(v)) for k, v in filter_ordering.items()
-        ])
-        return query
-
-    def _build_url(self, url, query_parameters=None):
-        if query_parameters:
-            return f'{self.BASE_URL}{url}?{query_parameters}'
-        return f'{self.BASE_URL}{url}'
-
-    def _get_recipients_from_generic_list(self, list_type, list_id, **filter_ordering):
+        if not fields:
+            return list()
+        fields_id = self._fields_index()
+        return self._fields_from_index(fields_id, fields)
+
+    def _get_recipients_from_generic_list(self, list_type, list_id, page_size=None, **filter_ordering):
         query = self._parse_filter_ordering(**filter_ordering)
-        return self._download_all_pages(
-            self._build_url(f'/List/{list_id}/Recipients/{list_type}', query)
-        )
+        return self._download_all_pages(self._recipients_url(list_type, list_id, query), page_size)
 
     def _get_recipient_from_generic_list(self, list_type, list_id, recipient_email):
-        query = self._parse_filter_ordering(filter_by=f"Email=='{recipient_email}'")
         resp = self._requests_wrapper(
             'GET',
-            self._build_url(f'/List/{list_id}/Recipients/{list_type}', query),
+            self._recipients_url(list_type, list_id, self._recipient_query(recipient_email)),
             headers=self._default_headers()
         )
-        if resp.json()['Items']:
-            return resp.json()['Items'][0]
-        else:
-            return None
+        return self._first_item(self._decode(resp))
 
     def login(self):
         """
         Logins to MailUp using credentials provided in :func:`~mailupy.Mailupy.__init__()`.
 
-        This is automatically called with :func:`~mailupy.Mailupy.__init__()`.
+        This is automatically called before the first request, unless a valid token is found in the token store.
 
         :rtype: bool
         """
-        payload = {
-            'grant_type': 'password',
-            'client_id': self._mailup_user['client_id'],
-            'client_secret': self._mailup_user['client_secret'],
-            'username': self._mailup_user['username'],
-            'password': self._mailup_user['password']
-        }
         resp = self._requests_wrapper(
             'POST',
             f'{self.AUTH_URL}',
-            data=payload,
+            data=self._login_payload(),
         )
         if resp.status_code == 200:
-            self._token = resp.json()['access_token']
-            self._refresh_token = resp.json()['refresh_token']
+            self._set_tokens(self._decode(resp))
             return True
         return False
 
-    def get_fields(self, **filter_ordering):
+    def get_fields(self, page_size=None, **filter_ordering):
         """
         Get recipients' dynamic fields definitions.
 
         `Link to MailUp Docs
         <http://help.mailup.com/display/mailupapi/Recipients#Recipients-Readpersonaldatafieldsconfiguration>`__
 
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -176,10 +578,10 @@ class Mailupy:
 
         query = self._parse_filter_ordering(**filter_ordering)
         return self._download_all_pages(
-            self._build_url(f'/Recipient/DynamicFields', query)
+            self._build_url(f'/Recipient/DynamicFields', query), page_size
         )
 
-    def get_groups_from_list(self, list_id, **filter_ordering):
+    def get_groups_from_list(self, list_id, page_size=None, **filter_ordering):
         """
         Get groups' data by list.
 
@@ -188,6 +590,9 @@ class Mailupy:
 
         :param list_id: List ID
         :type list_id: int, str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -199,10 +604,10 @@ class Mailupy:
 
         query = self._parse_filter_ordering(**filter_ordering)
         return self._download_all_pages(
-            self._build_url(f'/List/{list_id}/Groups', query)
+            self._build_url(f'/List/{list_id}/Groups', query), page_size
         )
 
-    def get_recipients_from_list(self, list_id, **filter_ordering):
+    def get_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
         """
         Get recipients' data both subscribed and unsubscribed to a list.
 
@@ -211,6 +616,9 @@ class Mailupy:
 
         :param list_id: List ID
         :type list_id: int, str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -219,9 +627,9 @@ class Mailupy:
         :return: Iterator of ``dict`` containing data about recipients
         :rtype: collections.Iterable[dict]
         """
-        return self._get_recipients_from_generic_list('EmailOptins', list_id, **filter_ordering)
+        return self._get_recipients_from_generic_list('EmailOptins', list_id, page_size, **filter_ordering)
 
-    def get_subscribed_recipients_from_list(self, list_id, **filter_ordering):
+    def get_subscribed_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
         """
         Get recipients' data subscribed to a list.
 
@@ -230,6 +638,9 @@ class Mailupy:
 
         :param list_id: List ID
         :type list_id: int, str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -238,9 +649,9 @@ class Mailupy:
         :return: Iterator of ``dict`` containing data about recipients
         :rtype: collections.Iterable[dict]
         """
-        return self._get_recipients_from_generic_list('Subscribed', list_id, **filter_ordering)
+        return self._get_recipients_from_generic_list('Subscribed', list_id, page_size, **filter_ordering)
 
-    def get_unsubscribed_recipients_from_list(self, list_id, **filter_ordering):
+    def get_unsubscribed_recipients_from_list(self, list_id, page_size=None, **filter_ordering):
         """
         Get recipients' data unsubscribed to a list.
 
@@ -249,6 +660,9 @@ class Mailupy:
 
         :param list_id: List ID
         :type list_id: int, str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -257,7 +671,7 @@ class Mailupy:
         :return: Iterator of ``dict``s containing data about recipients
         :rtype: collections.Iterable[dict]
         """
-        return self._get_recipients_from_generic_list('Unsubscribed', list_id, **filter_ordering)
+        return self._get_recipients_from_generic_list('Unsubscribed', list_id, page_size, **filter_ordering)
 
     def get_recipient_from_list(self, list_id, recipient_email):
         """
@@ -307,7 +721,7 @@ class Mailupy:
         """
         return self._get_recipient_from_generic_list('Unsubscribed', list_id, recipient_email)
 
-    def get_recipients_from_group(self, group_id, **filter_ordering):
+    def get_recipients_from_group(self, group_id, page_size=None, **filter_ordering):
         """
         Get recipients' data that belongs to a group.
 
@@ -316,6 +730,9 @@ class Mailupy:
 
         :param group_id: List ID
         :type group_id: int, str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'`` or sorting data with
             ``order_by=['field1', ...]`` as described `here
             <http://help.mailup.com/display/mailupapi/Paging+and+filtering>`__
@@ -326,7 +743,7 @@ class Mailupy:
         """
         query = self._parse_filter_ordering(**filter_ordering)
         return self._download_all_pages(
-            self._build_url(f'/Group/{group_id}/Recipients', query)
+            self._build_url(f'/Group/{group_id}/Recipients', query), page_size
         )
 
     def get_recipient_from_group(self, group_id, recipient_email):
@@ -343,18 +760,186 @@ class Mailupy:
         :return: ``dict`` containing data about recipient or ``None`` if not found
         :rtype: dict
         """
-        query = self._parse_filter_ordering(filter_by=f"Email=='{recipient_email}'")
         resp = self._requests_wrapper(
             'GET',
-            self._build_url(f'/Group/{group_id}/Recipients', query),
+            self._build_url(f'/Group/{group_id}/Recipients', self._recipient_query(recipient_email)),
             headers=self._default_headers()
         )
-        if resp.json()['Items']:
-            return resp.json()['Items'][0]
-        else:
-            return None
+        return self._first_item(self._decode(resp))
 
-    def get_messages_from_list(self, list_id, tags=[], **filter_ordering):
+    def get_recipients_by_emails(self, emails, list_id=None, group_id=None, status=None, workers=4,
+                                 max_url_length=2000):
+        """
+        Get many recipients of a list or a group by email with few requests.
+
+        Emails are packed into ``filter_by`` expressions like ``Email=='a' || Email=='b'`` as long as the URL
+        fits in ``max_url_length``, and the resulting chunks are fetched concurrently. Emails are matched
+        regardless of their case.
+
+        Example::
+
+         >>> found = m.get_recipients_by_emails(['a@example.com', 'b@example.com'], list_id=1, status='Subscribed')
+         >>> missing = [email for email, recipient in found.items() if recipient is None]
+
+        :param emails: Emails of the recipients
+        :type emails: collections.Iterable[str]
+        :param list_id: List ID, either this or ``group_id`` is required
+        :type list_id: int, str
+        :param group_id: Group ID
+        :type group_id: int, str
+        :param status: ``'Subscribed'``, ``'Unsubscribed'`` or ``'Pending'`` to get only recipients of the list
+            with that subscription status, ``None`` for any status. Lists only
+        :type status: str
+        :param workers: Number of chunks fetched concurrently
+        :type workers: int
+        :param max_url_length: Maximum length of the URL of each request
+        :type max_url_length: int
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: ``dict`` mapping each email to the ``dict`` containing data about the recipient,
+            or ``None`` if not found
+        :rtype: dict
+        """
+        url = self._recipients_by_emails_url(list_id, group_id, status)
+        emails = list(dict.fromkeys(emails))
+        found = {}
+
+        def fetch(chunk):
+            query = self._parse_filter_ordering(filter_by=' || '.join(map(self._email_condition, chunk)))
+            return list(self._download_all_pages(f'{url}?{query}', len(chunk), raw=True))
+
+        chunks = self._email_filters(emails, url, max_url_length)
+        convert = self._record_converter(url) or (lambda recipient: recipient)
+        for chunk, future in imap_unordered(fetch, chunks, workers):
+            for recipient in future.result():
+                found[recipient['Email'].lower()] = convert(recipient)
+        return {email: found.get(email.lower()) for email in emails}
+
+    def get_recipients_from_sources(self, list_ids=(), group_ids=(), statuses=('EmailOptins',), page_size=None,
+                                    workers=4, dedupe='id', provenance=False, **filter_ordering):
+        """
+        Read the recipients of many lists and groups concurrently as a single stream.
+
+        Every list is read once for each of ``statuses``. Pages of all sources share a pool of ``workers``
+        threads, first pages are requested before the others so the size of every source is known early.
+        Recipients are yielded as their pages arrive, so there's no ordering across sources.
+
+        Recipients are de-duplicated by ``idRecipient`` or, with ``dedupe='email'``, by case-insensitive email
+        (by ID for recipients without one). With ``provenance`` each recipient is yielded together with a tuple
+        of every :class:`~mailupy.bulk.Source` it was found in, which requires every source to be read first::
+
+         >>> for recipient, sources in m.get_recipients_from_sources([1, 2], group_ids=[6], provenance=True):
+         ...     print(recipient['Email'], [source.id for source in sources])
+
+        :param list_ids: List IDs
+        :type list_ids: collections.Iterable[int]
+        :param group_ids: Group IDs
+        :type group_ids: collections.Iterable[int]
+        :param statuses: Recipients read from each list, ``'EmailOptins'`` (all of them), ``'Subscribed'``,
+            ``'Unsubscribed'`` or ``'Pending'``
+        :type statuses: tuple of str
+        :param page_size: Items requested with each page
+        :type page_size: int
+        :param workers: Pages requested at the same time across all sources
+        :type workers: int
+        :param dedupe: ``'id'``, ``'email'`` or ``None`` to yield every recipient of every source
+        :type dedupe: str
+        :param provenance: Yield ``(recipient, sources)`` tuples
+        :type provenance: bool
+        :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'``, applied to every
+            source, see :func:`~mailupy.Mailupy.get_recipients_from_list()`
+        :type filter_ordering: str, list of str
+        :raise mailupy.exceptions.MailupyException: if ``dedupe`` is not valid
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: Iterator of recipients, or of ``(recipient, sources)`` tuples with ``provenance``
+        :rtype: collections.Iterable
+        """
+        if dedupe not in ('id', 'email', None):
+            raise MailupyException("dedupe must be 'id', 'email' or None")
+        sources = [Source('List', list_id, status) for list_id in list_ids for status in statuses]
+        sources += [Source('Group', group_id, None) for group_id in group_ids]
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._merge_sources(sources, query, page_size, workers, dedupe, provenance)
+
+    def get_recipients_from_source(self, source, page_size=None, **filter_ordering):
+        """
+        Get the recipients of a single list or group.
+
+        :param source: List or group, e.g. ``Source('List', 1, 'Pending')``
+        :type source: mailupy.bulk.Source
+        :param page_size: Items requested with each page
+        :type page_size: int, str, mailupy.pagination.AdaptivePageSize
+        :param filter_ordering: Keyword arguments for filtering data with ``filter_by='...'``,
+            see :func:`~mailupy.Mailupy.get_recipients_from_list()`
+        :type filter_ordering: str, list of str
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: Iterator of ``dict`` representing the recipients
+        :rtype: mailupy.pagination.PageIterator
+        """
+        query = self._parse_filter_ordering(**filter_ordering)
+        return self._download_all_pages(self._source_url(source, query), page_size)
+
+    def _source_url(self, source, query):
+        if source.kind == 'List':
+            return self._recipients_url(source.status, source.id, query)
+        return self._build_url(f'/Group/{source.id}/Recipients', query)
+
+    def _merge_sources(self, sources, query, page_size, workers, dedupe, provenance):
+        urls = [self._source_url(source, query) for source in sources]
+        convert = (self._record_converter(urls[0]) if urls else None) or (lambda recipient: recipient)
+        if dedupe == 'email':
+            def key(recipient):
+                email = recipient.get('Email')
+                return email.lower() if email else recipient['idRecipient']
+        elif dedupe == 'id':
+            def key(recipient):
+                return recipient['idRecipient']
+        seen = {}
+        for index, items in self._fan_out_pages(urls, page_size, workers):
+            for recipient in items:
+                if dedupe is None:
+                    yield (convert(recipient), (sources[index],)) if provenance else convert(recipient)
+                    continue
+                found = seen.get(key(recipient))
+                if found is not None:
+                    if provenance and sources[index] not in found[1]:
+                        found[1].append(sources[index])
+                    continue
+                if provenance:
+                    seen[key(recipient)] = (recipient, [sources[index]])
+                else:
+                    seen[key(recipient)] = ()
+                    yield convert(recipient)
+        if provenance:
+            for recipient, found in seen.values():
+                yield convert(recipient), tuple(found)
+
+    def _fan_out_pages(self, urls, page_size, workers):
+        # Yield (index of the url, items) as pages complete, the remaining pages of a url are queued after its first
+        queue = collections.deque((index, 0) for index in range(len(urls)))
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        def submit():
+            while queue and len(pending) < workers:
+                index, page_number = queue.popleft()
+                pending[executor.submit(self._get_page, urls[index], page_number, page_size)] = (index, page_number)
+        try:
+            submit()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, page_number = pending.pop(future)
+                    data = future.result()
+                    if page_number == 0 and data['IsPaginated']:
+                        queue.extend((index, number) for number in range(1, self._count_pages(data)))
+                    submit()
+                    yield index, data['Items']
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def get_messages_from_list(self, list_id, tags=[], page_size=None, **filter_ordering):
         """
         Get messages from a list.
 
@@ -365,6 +950,9 @@ class Mailupy:
         :type list_id: int, str
         :param tags: Tags to filter
         :type tags: list of str
+        :param page_size: Items requested with each page, ``'auto'`` (or an
+            :class:`~mailupy.pagination.AdaptivePageSize`) to adapt it to the measured latency and size of pages
+        :type page_size: int, str
         :param filter_ordering: keyword arguments for filtering data or sorting data with ``order_by`` as list of the keys to order
         :type filter_ordering: str, list of str
         :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
@@ -374,15 +962,18 @@ class Mailupy:
         filter_ordering['tags'] = ','.join(tags)
         query = self._parse_filter_ordering(**filter_ordering)
         return self._download_all_pages(
-            self._build_url(f'/List/{list_id}/Emails', query)
+            self._build_url(f'/List/{list_id}/Emails', query), page_size
         )
 
     def get_or_create_group(self, list_id, group_name):
         """
         Get or create a new group specifing its name.
 
-        Uses :func:`~mailupy.Mailupy.get_groups_from_list()` to find a group with the provided name,
-        if not found it's created with :func:`~mailupy.Mailupy.create_group()`.
+        Looks the name up in the client's group index, then with a ``filter_by`` on ``Name`` (a single
+        request), if not found the group is created with :func:`~mailupy.Mailupy.create_group()`. Once a list
+        has been indexed with :func:`~mailupy.Mailupy.index_groups()` names missing from the index are created
+        without asking MailUp. Concurrent calls for the same name from threads of this client create
+        the group only once.
 
         :param list_id: List ID
         :type list_id: int, string
@@ -392,14 +983,44 @@ class Mailupy:
         :return: ``tuple`` with the group id and a ``bool`` to indicate whether the group was created or not
         :rtype: (int, bool)
         """
-        for group in self.get_groups_from_list(list_id):
-            if group.get('Name', '') == group_name:
-                return group.get('idGroup', None), False
-        group = self.create_group(list_id, group_name)
+        with self._group_index.lock(list_id, group_name):
+            group_id = self._group_index.get(list_id, group_name)
+            if group_id is None and not self._group_index.is_complete(list_id):
+                group_id = self._find_group(list_id, group_name)
+            if group_id is not None:
+                return group_id, False
+            group = self.create_group(list_id, group_name)
         if 'idGroup' in group:
             return group['idGroup'], True
         return None, False
 
+    def _find_group(self, list_id, group_name):
+        query = self._parse_filter_ordering(filter_by=self._group_filter(group_name))
+        for group in self._download_all_pages(self._build_url(f'/List/{list_id}/Groups', query), raw=True):
+            # The filter may not be case sensitive
+            if group.get('Name', '') == group_name:
+                self._group_index.add(list_id, group_name, group['idGroup'])
+                return group['idGroup']
+        return None
+
+    def index_groups(self, list_id):
+        """
+        Index every group of a list by name, so :func:`~mailupy.Mailupy.get_or_create_group()` resolves
+        names without requests.
+
+        Groups created by other clients after this call aren't seen until the list is indexed again
+        or :func:`~mailupy.Mailupy.invalidate_groups()` is called.
+
+        :param list_id: List ID
+        :type list_id: int, str
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: Number of indexed groups
+        :rtype: int
+        """
+        groups = list(self._download_all_pages(self._build_url(f'/List/{list_id}/Groups'), raw=True))
+        self._group_index.fill(list_id, groups)
+        return len(groups)
+
     def send_message(self, email, message_id, fields={}):
         """
         Send a message to single recipient with its email.
@@ -415,10 +1036,13 @@ class Mailupy:
         :return: ``True`` if creation was successful
         :rtype: bool
         """
-        payload = json.dumps({
+        return self._send_message(email, message_id, self._build_mailup_fields(fields))
+
+    def _send_message(self, email, message_id, mailup_fields):
+        payload = self.codec.dumps({
             "Email": email,
             "idMessage": message_id,
-            "Fields": self._build_mailup_fields(fields)
+            "Fields": mailup_fields
         })
         self._requests_wrapper(
             'POST',
@@ -443,11 +1067,14 @@ class Mailupy:
         :return: ``True`` if creation was successful
         :rtype: bool
         """
-        payload = json.dumps({
+        return self._send_sms(prefix, number, message_id, self._build_mailup_fields(fields))
+
+    def _send_sms(self, prefix, number, message_id, mailup_fields):
+        payload = self.codec.dumps({
             "Number": number,
             "Prefix": prefix,
             "idMessage": message_id,
-            "Fields": self._build_mailup_fields(fields)
+            "Fields": mailup_fields
         })
         self._requests_wrapper(
             'POST',
@@ -457,6 +1084,67 @@ class Mailupy:
         )
         return True
 
+    def send_message_bulk(self, recipients, message_id, workers=8, keyed=False, on_result=None):
+        """
+        Send a message to many recipients, each one with its own fields.
+
+        Fields definitions are resolved once for the whole batch and messages are sent by ``workers``
+        threads. Failures don't stop the other sends, they're reported in the results instead.
+
+        Example::
+
+         >>> for result in m.send_message_bulk([('a@email.email', {'nome': 'A'}), 'b@email.email'], 12):
+         ...     if not result.ok:
+         ...         print(result.recipient, result.error)
+
+        :param recipients: Recipients emails, or ``(email, fields)`` tuples to fill dynamic fields
+        :type recipients: collections.Iterable[str or tuple]
+        :param message_id: Message ID
+        :type message_id: int, str
+        :param workers: Maximum number of messages sent at the same time
+        :type workers: int
+        :param keyed: Whether ``recipients`` yields ``(key, recipient)`` pairs, the key being set on each result
+        :type keyed: bool
+        :param on_result: Callable taking each :class:`~mailupy.bulk.BulkResult` from the sending thread as soon
+            as the message is sent or fails, e.g. to checkpoint it
+        :type on_result: callable
+        :return: Iterator of :class:`~mailupy.bulk.BulkResult`, in completion order
+        :rtype: collections.Iterable[mailupy.bulk.BulkResult]
+        """
+        fields_id = self._fields_index()
+
+        def send(recipient):
+            email, fields = recipient if isinstance(recipient, tuple) else (recipient, {})
+            return self._send_message(email, message_id, self._fields_from_index(fields_id, fields))
+        return run_bulk(send, recipients, workers, keyed, on_result)
+
+    def send_sms_bulk(self, recipients, message_id, workers=8, keyed=False, on_result=None):
+        """
+        Send a text message to many recipients, each one with its own fields.
+
+        Works like :func:`~mailupy.Mailupy.send_message_bulk()`.
+
+        :param recipients: ``(prefix, number)`` or ``(prefix, number, fields)`` tuples
+        :type recipients: collections.Iterable[tuple]
+        :param message_id: Message ID
+        :type message_id: int, str
+        :param workers: Maximum number of messages sent at the same time
+        :type workers: int
+        :param keyed: Whether ``recipients`` yields ``(key, recipient)`` pairs, the key being set on each result
+        :type keyed: bool
+        :param on_result: Callable taking each :class:`~mailupy.bulk.BulkResult` from the sending thread as soon
+            as the message is sent or fails, e.g. to checkpoint it
+        :type on_result: callable
+        :return: Iterator of :class:`~mailupy.bulk.BulkResult`, in completion order
+        :rtype: collections.Iterable[mailupy.bulk.BulkResult]
+        """
+        fields_id = self._fields_index()
+
+        def send(recipient):
+            prefix, number, fields = recipient if len(recipient) == 3 else (*recipient, {})
+            return self._send_sms(prefix, number, message_id, self._fields_from_index(fields_id, fields))
+        return run_bulk(send, recipients, workers, keyed, on_result)
+
     def create_group(self, list_id, group_name, notes=''):
         """
         Create a new group to a list with a given name.
@@ -478,9 +1166,9 @@ class Mailupy:
             'POST',
             self._build_url(f'/List/{list_id}/Group'),
             headers=self._default_headers(),
-            data=json.dumps({"Name": group_name, "Notes": notes})
+            data=self.codec.dumps({"Name": group_name, "Notes": notes})
         )
-        return resp.json()
+        return self._index_created_group(list_id, group_name, self._decode(resp))
 
     def update_customer_fields(self, recipient_name, recipient_email, fields={}):
         """
@@ -515,7 +1203,7 @@ class Mailupy:
         :return: Fields about a recipient filled with its data
         :rtype: dict
         """
-        payload = json.dumps({
+        payload = self.codec.dumps({
             "Name": recipient_name,
             "Email": recipient_email,
             "Fields": self._build_mailup_fields(fields)
@@ -526,7 +1214,7 @@ class Mailupy:
             headers=self._default_headers(),
             data=payload
         )
-        return resp.json()
+        return self._decode(resp)
 
     def subscribe_to_list(self, list_id, recipient_name, recipient_email, pending=False, fields={}):
         """
@@ -548,7 +1236,7 @@ class Mailupy:
         :rtype: int
         """
         query_parameters = ""
-        payload = json.dumps({
+        payload = self.codec.dumps({
             "Name": recipient_name,
             "Email": recipient_email,
             "Fields": self._build_mailup_fields(fields)
@@ -562,7 +1250,7 @@ class Mailupy:
             headers=self._default_headers(),
             data=payload
         )
-        return resp.json()
+        return self._decode(resp)
 
     def subscribe_to_group(self, group_id, recipient_name, recipient_email, fields={}):
         """
@@ -583,7 +1271,7 @@ class Mailupy:
         :return: Recipient ID
         :rtype: int
         """
-        payload = json.dumps({
+        payload = self.codec.dumps({
             "Name": recipient_name,
             "Email": recipient_email,
             "Fields": self._build_mailup_fields(fields)
@@ -594,7 +1282,111 @@ class Mailupy:
             headers=self._default_headers(),
             data=payload
         )
-        return resp.json()
+        return self._decode(resp)
+
+    def _import_payload(self, recipient, fields_id):
+        if isinstance(recipient, tuple):
+            name, email, fields = recipient if len(recipient) == 3 else (*recipient, {})
+            recipient = {"Name": name, "Email": email, "Fields": fields}
+        if isinstance(recipient.get('Fields'), dict):
+            recipient = {**recipient, "Fields": self._fields_from_index(fields_id, recipient['Fields'])}
+        return recipient
+
+    def _wait_import(self, import_id, poll_interval, max_poll_interval, timeout):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            status = self.get_import_status(import_id)
+            if status.get('Completed'):
+                return status
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise MailupyException(f'Import {import_id} not completed after {timeout} seconds')
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+
+    def get_import_status(self, import_id):
+        """
+        Get the status of an asynchronous import.
+
+        `Link to MailUp Docs
+        <http://help.mailup.com/display/mailupapi/Recipients#Recipients-Checkimportstatus>`__
+
+        :param import_id: Import ID
+        :type import_id: int, str
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :return: ``dict`` containing the status of the import, ``Completed`` is ``True`` once done
+        :rtype: dict
+        """
+        resp = self._requests_wrapper(
+            'GET',
+            self._build_url(f'/Import/{import_id}'),
+            headers=self._default_headers()
+        )
+        return self._decode(resp)
+
+    def import_recipients(self, recipients, list_id=None, group_id=None, chunk_size=1000, pending=False,
+                          poll_interval=1, max_poll_interval=30, timeout=None):
+        """
+        Import many recipients to a list or a group with MailUp asynchronous imports.
+
+        Recipients are read lazily and sent in chunks of ``chunk_size``, waiting for each import
+        to complete (polling its status with an exponential backoff) before sending the next one,
+        so a generator of any length can be imported with bounded memory.
+
+        Example::
+
+         >>> recipients = ((row['name'], row['email'], {'compleanno': row['birthday']}) for row in reader)
+         >>> for progress in m.import_recipients(recipients, list_id=1, chunk_size=5000):
+         ...     print(progress.imported, progress.status)
+
+        `Link to MailUp Docs
+        <http://help.mailup.com/display/mailupapi/Recipients#Recipients-Addmultiplerecipients/subscribers-asynchronousimport>`__
+
+        :param recipients: ``(name, email)``, ``(name, email, fields)`` tuples or ``dict`` in MailUp format,
+            where ``Fields`` can be a ``dict`` like in :func:`~mailupy.Mailupy.update_customer_fields()`
+        :type recipients: collections.Iterable[tuple or dict]
+        :param list_id: List ID, either this or ``group_id`` is required
+        :type list_id: int, str
+        :param group_id: Group ID
+        :type group_id: int, str
+        :param chunk_size: Recipients sent with each import
+        :type chunk_size: int
+        :param pending: ``True`` to ask recipients to confirm their subscription, lists only
+        :type pending: bool
+        :param poll_interval: Seconds before checking the import status the first time
+        :type poll_interval: float
+        :param max_poll_interval: Maximum seconds between two status checks
+        :type max_poll_interval: float
+        :param timeout: Maximum seconds to wait for a single chunk, ``None`` to wait forever
+        :type timeout: float
+        :raise mailupy.exceptions.MailupyRequestException: if response returns a status code >= 400
+        :raise mailupy.exceptions.MailupyException: if an import doesn't complete within ``timeout``
+        :return: Iterator of :class:`~mailupy.bulk.ImportProgress`, one for each chunk
+        :rtype: collections.Iterable[mailupy.bulk.ImportProgress]
+        """
+        if (list_id is None) == (group_id is None):
+            raise MailupyException('Either list_id or group_id is required')
+        if list_id is not None:
+            url = self._build_url(f'/List/{list_id}/Recipients', "ConfirmEmail=True" if pending else "")
+        else:
+            url = self._build_url(f'/Group/{group_id}/Recipients')
+        fields_id = self._fields_index()
+        return self._import_chunks(
+            url, iter_chunks(recipients, chunk_size), fields_id, poll_interval, max_poll_interval, timeout
+        )
+
+    def _import_chunks(self, url, chunks, fields_id, poll_interval, max_poll_interval, timeout):
+        imported = 0
+        for index, chunk in enumerate(chunks):
+            payload = self.codec.dumps([self._import_payload(recipient, fields_id) for recipient in chunk])
+            import_id = self._decode(self._requests_wrapper(
+                'POST',
+                url,
+                headers=self._default_headers(),
+                data=payload
+            ))
+            status = self._wait_import(import_id, poll_interval, max_poll_interval, timeout)
+            imported += len(chunk)
+            yield ImportProgress(index, len(chunk), import_id, status, imported)
 
     def unsubscribe_from_list(self, list_id, recipient_mailup_id):
         """
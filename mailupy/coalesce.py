@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+
+class _Call:
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    Share the outcome of identical calls running at the same time across threads.
+
+    The first caller of a key runs the call, callers arriving before it ends wait and get its result
+    (or its exception) instead of running it again. Only idempotent calls should be coalesced.
+
+    :param metrics: Metrics counting shared calls as ``coalesced_requests``
+    :type metrics: mailupy.metrics.Metrics
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def _shared(self):
+        if self.metrics is not None:
+            self.metrics.incr('coalesced_requests')
+
+    def run(self, key, func):
+        """
+        Run ``func``, unless a call with the same key is in flight, then wait for its outcome.
+
+        :param key: Hashable identity of the call
+        :param func: Callable without arguments
+        :return: The value returned by ``func``
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._shared()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncRequestCoalescer(RequestCoalescer):
+    """
+    Share the outcome of identical coroutines running at the same time on the event loop,
+    see :class:`~mailupy.coalesce.RequestCoalescer`.
+    """
+
+    async def run(self, key, func):
+        """
+        Await ``func()``, unless a call with the same key is in flight, then wait for its outcome.
+
+        :param key: Hashable identity of the call
+        :param func: Coroutine function without arguments
+        :return: The value returned by ``func()``
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._shared()
+        else:
+            # The shared call runs as its own task, so cancelling any caller (even the first) leaves it to the others
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda done: self._calls.pop(key, None))
+        return await asyncio.shield(task)
@@ -0,0 +1,101 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+from .exceptions import MailupyException
+
+
+class JSONCodec:
+    """
+    Encode request payloads and decode response bodies with the standard library.
+
+    Subclass it and override :func:`dumps` and :func:`loads` to plug in another JSON library.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj):
+        """
+        Encode a payload.
+
+        :rtype: str, bytes
+        """
+        return json.dumps(obj)
+
+    def loads(self, data):
+        """
+        Decode a response body.
+
+        :param data: JSON document
+        :type data: bytes, str
+        :raise ValueError: if ``data`` isn't valid JSON
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec using `orjson <https://github.com/ijl/orjson>`__, payloads are encoded to ``bytes``.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise MailupyException('orjson is not installed, install it with "pip install orjson"')
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """
+    Codec using `ujson <https://github.com/ultrajson/ultrajson>`__, payloads are encoded to UTF-8 ``bytes``.
+    """
+
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise MailupyException('ujson is not installed, install it with "pip install ujson"')
+
+    def dumps(self, obj):
+        # Unescaped str bodies would be sent as latin-1 by http.client, with a Content-Length counting characters
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+CODECS = {'orjson': OrjsonCodec, 'ujson': UjsonCodec, 'json': JSONCodec}
+"""Codecs by name, in order of preference"""
+
+
+def get_codec(codec=None):
+    """
+    Get a JSON codec.
+
+    :param codec: Codec, or name of one of :data:`CODECS`. If omitted the fastest installed library is used,
+        falling back to the standard library
+    :type codec: str, mailupy.codec.JSONCodec
+    :raise mailupy.exceptions.MailupyException: if the codec is unknown or its library isn't installed
+    :rtype: mailupy.codec.JSONCodec
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec is None:
+        codec = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+    if codec not in CODECS:
+        raise MailupyException(f'Unknown JSON codec {codec}, choose one of {", ".join(CODECS)}')
+    return CODECS[codec]()
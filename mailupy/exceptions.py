@@ -4,7 +4,9 @@ class MailupyException(Exception):
 
     It's raised whenever the library encounters an error while preparing the request.
     """
-    pass
+
+    retried = False
+    """Whether the request was already retried by the client retry policy, or ran out of its deadline"""
 
 
 class MailupyRequestException(MailupyException):
@@ -13,11 +15,13 @@ class MailupyRequestException(MailupyException):
 
     It's raised whenever the library receive a response with a status code greater than or equal to 400.
     """
-    def __init__(self, response):
-        try: 
-            err = response.json()['ErrorDescription']
-        except KeyError: 
-            err = response.json()['error_description']
+    def __init__(self, response, codec=None):
+        self.status_code = response.status_code
+        try:
+            data = codec.loads(response.content) if codec is not None else response.json()
+        except ValueError:
+            data = {}
+        err = data.get('ErrorDescription') or data.get('error_description') or response.text
         super(MailupyException, self).__init__(
             f"Error {response.status_code} - {err}"
         )
@@ -0,0 +1,184 @@
+import csv
+import itertools
+import json
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+from .bulk import iter_chunks
+from .exceptions import MailupyException
+from .records import Recipient, _Record
+
+
+RECIPIENT_COLUMNS = ('idRecipient', 'Email', 'Name', 'MobilePrefix', 'MobileNumber')
+"""Columns of every recipient export, followed by one column for each dynamic field"""
+
+
+def _rows(items, schema=None, columns=None):
+    # Flatten items into (columns, rows), where rows is an iterator of tuples
+    items = iter(items)
+    if schema is not None:
+        def row(item):
+            if not isinstance(item, Recipient):
+                item = Recipient.from_item(item, schema)
+            return (item.id, item.email, item.name, item.mobile_prefix, item.mobile_number) + item.values
+        return RECIPIENT_COLUMNS + schema.descriptions, map(row, items)
+    first = next(items, None)
+    if first is None:
+        return tuple(columns or ()), iter(())
+    items = itertools.chain([first], items)
+    if columns is None:
+        columns = tuple((first.to_dict() if isinstance(first, _Record) else first).keys())
+
+    def generic_row(item):
+        if isinstance(item, _Record):
+            item = item.to_dict()
+        return tuple(item.get(column) for column in columns)
+    return tuple(columns), map(generic_row, items)
+
+
+def _open(file, mode, **kwargs):
+    if isinstance(file, str):
+        return open(file, mode, **kwargs), True
+    return file, False
+
+
+def export_csv(items, file, schema=None, columns=None, batch_size=10000):
+    """
+    Stream items of a ``get_*`` method to CSV, with a header row.
+
+    With a ``schema``, items are recipients (``dict`` or :class:`~mailupy.records.Recipient`) written as
+    :data:`RECIPIENT_COLUMNS` followed by a column for each dynamic field. Otherwise columns are ``columns``,
+    or the keys of the first item. Rows are written in batches of ``batch_size``, so memory doesn't grow
+    with the number of items.
+
+    :param items: Items to export
+    :type items: collections.Iterable
+    :param file: Path or text file
+    :type file: str, io.TextIOBase
+    :param schema: Fields schema of the account, see :func:`~mailupy.Mailupy.field_schema()`
+    :type schema: mailupy.records.FieldSchema
+    :param columns: Keys of the items to export, when there's no ``schema``
+    :type columns: list of str
+    :param batch_size: Rows written at once
+    :type batch_size: int
+    :return: Number of exported items
+    :rtype: int
+    """
+    columns, rows = _rows(items, schema, columns)
+    stream, owned = _open(file, 'w', newline='', encoding='utf-8')
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        count = 0
+        for batch in iter_chunks(rows, batch_size):
+            writer.writerows(batch)
+            count += len(batch)
+        return count
+    finally:
+        if owned:
+            stream.close()
+
+
+def export_ndjson(items, file, schema=None, columns=None, batch_size=10000):
+    """
+    Stream items of a ``get_*`` method to newline-delimited JSON, one flat object per line.
+
+    Columns are chosen as in :func:`~mailupy.export.export_csv()`.
+
+    :param items: Items to export
+    :type items: collections.Iterable
+    :param file: Path or text file
+    :type file: str, io.TextIOBase
+    :param schema: Fields schema of the account
+    :type schema: mailupy.records.FieldSchema
+    :param columns: Keys of the items to export, when there's no ``schema``
+    :type columns: list of str
+    :param batch_size: Rows written at once
+    :type batch_size: int
+    :return: Number of exported items
+    :rtype: int
+    """
+    columns, rows = _rows(items, schema, columns)
+    stream, owned = _open(file, 'w', encoding='utf-8')
+    try:
+        count = 0
+        for batch in iter_chunks(rows, batch_size):
+            stream.write(''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in batch))
+            count += len(batch)
+        return count
+    finally:
+        if owned:
+            stream.close()
+
+
+def export_parquet(items, file, schema=None, columns=None, batch_size=10000):
+    """
+    Stream items of a ``get_*`` method to a Parquet file, a row group for each batch.
+
+    Columns are chosen as in :func:`~mailupy.export.export_csv()`. Recipient ids are integers and dynamic fields
+    strings, other column types are inferred from the first batch. Requires ``pyarrow``
+    (``pip install mailupy[parquet]``).
+
+    :param items: Items to export
+    :type items: collections.Iterable
+    :param file: Path or binary file
+    :type file: str, io.BufferedIOBase
+    :param schema: Fields schema of the account
+    :type schema: mailupy.records.FieldSchema
+    :param columns: Keys of the items to export, when there's no ``schema``
+    :type columns: list of str
+    :param batch_size: Rows written with each row group
+    :type batch_size: int
+    :raise mailupy.exceptions.MailupyException: if ``pyarrow`` isn't installed
+    :return: Number of exported items
+    :rtype: int
+    """
+    if pyarrow is None:
+        raise MailupyException('Parquet export requires pyarrow, install it with "pip install mailupy[parquet]"')
+    columns, rows = _rows(items, schema, columns)
+    arrow_schema = None
+    if schema is not None:
+        arrow_schema = pyarrow.schema(
+            [('idRecipient', pyarrow.int64())] + [(column, pyarrow.string()) for column in columns[1:]]
+        )
+    writer = None
+    count = 0
+    try:
+        # An empty batch when there are no items, so the file still has its columns
+        for batch in itertools.chain(iter_chunks(rows, batch_size), [[]]):
+            if writer is not None and not batch:
+                break
+            table = _arrow_table(columns, batch, arrow_schema)
+            if writer is None:
+                arrow_schema = table.schema
+                writer = pyarrow.parquet.ParquetWriter(file, arrow_schema)
+            writer.write_table(table)
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def _arrow_table(columns, batch, arrow_schema=None):
+    data = {column: list(values) for column, values in zip(columns, zip(*batch))} if batch else {
+        column: [] for column in columns
+    }
+    if arrow_schema is None:
+        # Columns empty in the first batch would be typed as null, keep them as strings
+        arrow_schema = pyarrow.schema([
+            (field.name, pyarrow.string() if pyarrow.types.is_null(field.type) else field.type)
+            for field in pyarrow.Table.from_pydict(data).schema
+        ])
+    for field in arrow_schema:
+        if pyarrow.types.is_string(field.type):
+            data[field.name] = [None if value is None else str(value) for value in data[field.name]]
+    return pyarrow.Table.from_pydict(data, schema=arrow_schema)
+
+
+EXPORTERS = {'csv': export_csv, 'ndjson': export_ndjson, 'jsonl': export_ndjson, 'parquet': export_parquet}
+"""Exporters by format name"""
@@ -0,0 +1,209 @@
+import bisect
+import re
+import threading
+from collections import Counter
+
+
+_PLACEHOLDERS = {
+    'List': '{list_id}',
+    'Group': '{group_id}',
+    'Import': '{import_id}',
+    'Recipient': '{recipient_id}',
+    'Recipients': '{recipient_id}',
+    'Unsubscribe': '{recipient_id}',
+    'Subscribe': '{recipient_id}',
+}
+_ID = re.compile(r'\d+|all')
+
+
+def endpoint_template(path):
+    """
+    Replace IDs in an API path with placeholders, e.g. ``/List/1/Recipients/Subscribed`` becomes
+    ``/List/{list_id}/Recipients/Subscribed``.
+
+    :param path: URL path, without the query
+    :type path: str
+    :rtype: str
+    """
+    segments = path.split('/')
+    for position in range(1, len(segments)):
+        if _ID.fullmatch(segments[position]):
+            segments[position] = _PLACEHOLDERS.get(segments[position - 1], '{id}')
+    return '/'.join(segments)
+
+
+class RequestEvent:
+    """
+    A single HTTP request sent by the client, passed to instrumentation hooks.
+
+    ``status``, ``duration``, ``bytes`` and ``error`` are ``None`` in ``before_request`` hooks.
+
+    :ivar method: HTTP verb
+    :ivar url: Full URL
+    :ivar endpoint: URL path with placeholders instead of IDs, see :func:`~mailupy.metrics.endpoint_template()`
+    :ivar page_number: Page requested, ``None`` for requests that aren't paginated
+    :ivar retry: ``0`` for the first attempt, then the number of times the request was sent again
+    :ivar status: Response status code
+    :ivar duration: Seconds taken by the request
+    :ivar bytes: Size of the response body, if known
+    :ivar error: Exception raised while sending the request
+    """
+
+    __slots__ = ('method', 'url', 'endpoint', 'page_number', 'retry', 'status', 'duration', 'bytes', 'error')
+
+    def __init__(self, method, url, endpoint, page_number=None, retry=0):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.page_number = page_number
+        self.retry = retry
+        self.status = None
+        self.duration = None
+        self.bytes = None
+        self.error = None
+
+    def __repr__(self):
+        return f'<RequestEvent {self.method} {self.endpoint} {self.status} {self.duration}>'
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets (in seconds).
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        """
+        Upper bound of the bucket holding the given percentile, ``inf`` if above the last bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip([str(bound) for bound in self.BUCKETS] + ['+Inf'], self.counts)),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms collected by :class:`~mailupy.Mailupy`.
+
+    Requests are grouped by method and endpoint template, e.g. ``GET /List/{list_id}/Recipients/Subscribed``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear every counter and histogram.
+        """
+        with self._lock:
+            self._counters = Counter()
+            self._endpoints = {}
+
+    def incr(self, name, value=1):
+        """
+        Increment a counter.
+
+        :param name: Counter name
+        :type name: str
+        :param value: Increment
+        :type value: int
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, event):
+        """
+        Record a completed request.
+
+        :param event: The request
+        :type event: mailupy.metrics.RequestEvent
+        """
+        key = f'{event.method} {event.endpoint}'
+        with self._lock:
+            endpoint = self._endpoints.get(key)
+            if endpoint is None:
+                endpoint = self._endpoints[key] = {'counters': Counter(), 'latency': Histogram()}
+            counters = endpoint['counters']
+            counters['requests'] += 1
+            if event.retry:
+                counters['retries'] += 1
+            if event.error is not None:
+                counters['errors'] += 1
+            elif event.status >= 400:
+                counters['errors'] += 1
+                counters[f'status_{event.status}'] += 1
+            if event.bytes:
+                counters['bytes'] += event.bytes
+            endpoint['latency'].observe(event.duration)
+            self._counters['requests'] += 1
+
+    def snapshot(self):
+        """
+        Get a copy of every metric.
+
+        :return: ``dict`` with global ``counters`` and, for each endpoint, its counters and latency statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'endpoints': {
+                    key: {**endpoint['counters'], 'latency': endpoint['latency'].snapshot()}
+                    for key, endpoint in self._endpoints.items()
+                }
+            }
+
+    def export_prometheus(self, prefix='mailupy'):
+        """
+        Export metrics in the Prometheus text format.
+
+        :param prefix: Prefix of every metric name
+        :type prefix: str
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_{name.replace(".", "_")}_total {value}')
+        for key, endpoint in sorted(snapshot['endpoints'].items()):
+            method, path = key.split(' ', 1)
+            labels = f'method="{method}",endpoint="{path}"'
+            for name, value in sorted(endpoint.items()):
+                if name != 'latency':
+                    lines.append(f'{prefix}_endpoint_{name}_total{{{labels}}} {value}')
+            latency = endpoint['latency']
+            cumulative = 0
+            for bound, count in latency['buckets'].items():
+                cumulative += count
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_request_duration_seconds_sum{{{labels}}} {latency["sum"]}')
+            lines.append(f'{prefix}_request_duration_seconds_count{{{labels}}} {latency["count"]}')
+        return '\n'.join(lines) + '\n'
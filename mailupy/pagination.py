@@ -0,0 +1,240 @@
+import json
+import time
+from collections import namedtuple
+
+from .exceptions import MailupyException
+
+
+class AdaptivePageSize:
+    """
+    Page size that follows the measured cost of each page.
+
+    Doubles the page size while pages come back fast and small, halves it when a page
+    is slower than ``target_latency`` or bigger than ``max_bytes``.
+
+    :param size: Initial page size
+    :type size: int
+    :param min_size: Smallest page size requested
+    :type min_size: int
+    :param max_size: Biggest page size requested, MailUp doesn't serve bigger pages
+    :type max_size: int
+    :param target_latency: Seconds a page is expected to take
+    :type target_latency: float
+    :param max_bytes: Maximum size of a page body in bytes
+    :type max_bytes: int
+    """
+
+    def __init__(self, size=100, min_size=10, max_size=1000, target_latency=1.0, max_bytes=4 * 1024 * 1024):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(size, max_size))
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+
+    def update(self, latency, size_in_bytes, served_size=None):
+        """
+        Record the cost of the last page and pick the size of the next one.
+
+        :param latency: Seconds taken by the last page
+        :type latency: float
+        :param size_in_bytes: Size of the last page body
+        :type size_in_bytes: int
+        :param served_size: Page size reported by MailUp, caps the next requests if smaller than requested
+        :type served_size: int
+        :return: Next page size
+        :rtype: int
+        """
+        if served_size and served_size < self.size:
+            self.max_size = self.size = max(1, served_size)
+            self.min_size = min(self.min_size, self.size)
+            return self.size
+        if latency > self.target_latency or size_in_bytes > self.max_bytes:
+            self.size = max(self.min_size, self.size // 2)
+        elif latency < self.target_latency / 2 and size_in_bytes < self.max_bytes / 2:
+            self.size = min(self.max_size, self.size * 2)
+        return self.size
+
+
+class PageCursor:
+    """
+    Position reached by an iterator over the pages of a ``get_*`` method.
+
+    Points to the next item to yield: ``skip`` items of page ``page`` have already been yielded.
+    Cursors can be saved with :func:`~mailupy.pagination.PageCursor.to_json()` and passed to
+    :func:`~mailupy.Mailupy.resume_pages()` to continue from the same item, even from another process.
+
+    :param url: URL of the paginated endpoint, without query
+    :type url: str
+    :param query: Query with filters and ordering, without paging parameters
+    :type query: str
+    :param page_size: Items requested with each page, ``None`` for the MailUp default
+    :type page_size: int
+    :param page: Page of the next item
+    :type page: int
+    :param skip: Items of ``page`` already yielded
+    :type skip: int
+    :param adaptive: Whether the page size adapts to the cost of pages,
+        see :class:`~mailupy.pagination.AdaptivePageSize`
+    :type adaptive: bool
+    """
+
+    def __init__(self, url, query='', page_size=None, page=0, skip=0, adaptive=False):
+        self.url = url
+        self.query = query
+        self.page_size = page_size
+        self.page = page
+        self.skip = skip
+        self.adaptive = adaptive
+
+    @classmethod
+    def from_url(cls, url, page_size=None):
+        """
+        Create a cursor pointing to the first item of a paginated URL.
+
+        :param url: URL of the paginated endpoint, with its query
+        :type url: str
+        :param page_size: Page size as accepted by ``get_*`` methods
+        :type page_size: int, str, mailupy.pagination.AdaptivePageSize
+        :rtype: mailupy.pagination.PageCursor
+        """
+        url, _, query = url.partition('?')
+        if page_size == 'auto':
+            page_size = AdaptivePageSize()
+        if isinstance(page_size, AdaptivePageSize):
+            return cls(url, query, page_size.size, adaptive=True)
+        return cls(url, query, page_size)
+
+    @property
+    def full_url(self):
+        return f'{self.url}?{self.query}' if self.query else self.url
+
+    @property
+    def offset(self):
+        """
+        Number of items yielded before this position, ``None`` if the page size isn't known.
+
+        :rtype: int
+        """
+        if not self.page_size:
+            return None if self.page else self.skip
+        return self.page * self.page_size + self.skip
+
+    def track(self, items, page, skip=0):
+        """
+        Yield items of a page after the first ``skip``, moving the cursor past each of them.
+        """
+        for index, item in enumerate(items):
+            if index < skip:
+                continue
+            self.page, self.skip = page, index + 1
+            yield item
+        self.page, self.skip = page + 1, 0
+
+    def to_dict(self):
+        return {
+            'url': self.url, 'query': self.query, 'page_size': self.page_size,
+            'page': self.page, 'skip': self.skip, 'adaptive': self.adaptive
+        }
+
+    def to_json(self):
+        """
+        Serialize the cursor.
+
+        :rtype: str
+        """
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Load a cursor serialized with :func:`~mailupy.pagination.PageCursor.to_json()`.
+
+        :param data: JSON string or the ``dict`` returned by ``to_dict()``
+        :type data: str, dict
+        :rtype: mailupy.pagination.PageCursor
+        """
+        if isinstance(data, str):
+            data = json.loads(data)
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, PageCursor) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'<PageCursor {self.full_url} page={self.page} skip={self.skip}>'
+
+
+PageShard = namedtuple('PageShard', ['cursor', 'pages', 'size'])
+PageShard.__doc__ = """
+A range of pages returned by :func:`~mailupy.Mailupy.shard_pages()`.
+
+``cursor`` points to the first item of the range, ``pages`` is the number of pages in it and ``size``
+the number of items, the ones to take from :func:`~mailupy.Mailupy.resume_pages()`.
+"""
+
+
+class PageIterator:
+    """
+    Iterator over the items of paginated results, returned by every ``get_*`` method of
+    :class:`~mailupy.Mailupy` listing many items.
+
+    Its :attr:`cursor` always points to the next item. When a page fails because of a network error
+    or a MailUp error with status code >= 500, it's requested again up to ``retries`` times, waiting
+    ``retry_delay`` seconds (doubled after each attempt), and iteration continues with the item
+    that would have come next: items already yielded are never repeated. Requests already retried by the
+    client :class:`~mailupy.retry.RetryPolicy` aren't retried again, so its ``max_attempts`` and ``deadline``
+    stay the limits; page retries cover what the policy doesn't, like a connection dropped while streaming a page.
+
+    :param client: Client fetching pages
+    :type client: mailupy.Mailupy
+    :param cursor: Position of the first item
+    :type cursor: mailupy.pagination.PageCursor
+    :param adaptive: Page size used when ``cursor.adaptive`` is set, a new one is created if omitted
+    :type adaptive: mailupy.pagination.AdaptivePageSize
+    :param retries: Times a failed page is requested again
+    :type retries: int
+    :param retry_delay: Seconds before the first retry
+    :type retry_delay: float
+    :param convert: Callable applied to each item before yielding it, e.g. to build records
+    :type convert: callable
+    """
+
+    def __init__(self, client, cursor, adaptive=None, retries=0, retry_delay=1, convert=None):
+        self.cursor = cursor
+        self.convert = convert
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._client = client
+        self._adaptive = adaptive
+        if cursor.adaptive and adaptive is None:
+            self._adaptive = AdaptivePageSize(size=cursor.page_size)
+        self._items = None
+        self._failures = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            if self._items is None:
+                self._items = self._client._iter_cursor(self.cursor, self._adaptive)
+            try:
+                item = next(self._items)
+            except MailupyException as ex:
+                self._items = None
+                status = getattr(ex, 'status_code', None)
+                if self._failures >= self.retries or ex.retried or (status is not None and status < 500):
+                    raise
+                self._failures += 1
+                time.sleep(self.retry_delay * 2 ** (self._failures - 1))
+                continue
+            self._failures = 0
+            return self.convert(item) if self.convert else item
+
+    def close(self):
+        """
+        Stop fetching pages, e.g. when the consumer doesn't need more items.
+        """
+        if self._items is not None:
+            self._items.close()
+            self._items = None
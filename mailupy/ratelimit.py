@@ -0,0 +1,110 @@
+import email.utils
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the rate of requests sent to MailUp.
+
+    Every request takes a token, tokens are refilled at ``rate`` per second up to ``burst``.
+    When MailUp answers with 429 the whole bucket can be paused, so every caller waits together.
+
+    :param rate: Requests per second, ``None`` to send requests as fast as possible (pauses still apply)
+    :type rate: float
+    :param burst: Maximum number of requests sent back to back, defaults to ``rate`` (at least one)
+    :type burst: int
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait(self, now, tokens):
+        wait = max(0, self._paused_until - now)
+        if self.rate and tokens < 0:
+            wait = max(wait, -tokens / self.rate)
+        return wait
+
+    def reserve(self):
+        """
+        Take a token without blocking.
+
+        :return: Seconds the caller must wait before sending its request
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.rate:
+                self._tokens -= 1
+            return self._wait(now, self._tokens)
+
+    def acquire(self):
+        """
+        Take a token, sleeping until the request is allowed.
+
+        :return: Seconds spent waiting
+        :rtype: float
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """
+        Stop every caller for ``seconds``, e.g. after receiving a ``Retry-After`` header.
+
+        :param seconds: Seconds to wait before the next request
+        :type seconds: float
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def wait_time(self):
+        """
+        Seconds a request issued now would have to wait.
+
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait(now, self._tokens - 1 if self.rate else 0)
+
+
+def parse_retry_after(value, default):
+    """
+    Convert a ``Retry-After`` header value to seconds.
+
+    :param value: Header value, either a number of seconds or an HTTP date
+    :type value: str
+    :param default: Seconds returned when the header is missing or invalid
+    :type default: float
+    :rtype: float
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,274 @@
+import array
+
+from .exceptions import MailupyException
+
+
+class FieldSchema:
+    """
+    Dynamic fields definitions of an account, shared by every :class:`~mailupy.records.Recipient`.
+
+    Recipients keep only a tuple of field values, ordered as :attr:`descriptions`.
+
+    :param definitions: Fields definitions as returned by :func:`~mailupy.Mailupy.get_fields()`
+    :type definitions: collections.Iterable[dict]
+    """
+
+    __slots__ = ('ids', 'descriptions', '_positions')
+
+    def __init__(self, definitions):
+        definitions = list(definitions)
+        self.ids = tuple(definition['Id'] for definition in definitions)
+        self.descriptions = tuple(definition['Description'] for definition in definitions)
+        self._positions = {field_id: position for position, field_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def values(self, fields):
+        """
+        Get the values of MailUp ``Fields`` ordered as the schema, ``None`` for missing ones.
+
+        Fields not in the schema are ignored.
+
+        :param fields: ``Fields`` of a recipient
+        :type fields: list of dict
+        :rtype: tuple
+        """
+        values = [None] * len(self.ids)
+        for field in fields or ():
+            position = self._positions.get(field['Id'])
+            if position is not None:
+                values[position] = field.get('Value')
+        return tuple(values)
+
+    def position(self, description):
+        """
+        Get the position of a field in value tuples.
+
+        :raise ValueError: if the field isn't in the schema
+        :rtype: int
+        """
+        return self.descriptions.index(description)
+
+
+class _Record:
+
+    __slots__ = ('extra',)
+
+    # Attribute name and MailUp key of each slot filled from items
+    _KEYS = ()
+
+    def __init__(self, *values, extra=None):
+        for (attribute, key), value in zip(self._KEYS, values):
+            setattr(self, attribute, value)
+        self.extra = extra
+
+    @classmethod
+    def _from_item(cls, item, *values):
+        known = {key for attribute, key in cls._KEYS}
+        extra = {key: value for key, value in item.items() if key not in known} or None
+        return cls(*[item.get(key) for attribute, key in cls._KEYS], *values, extra=extra)
+
+    def to_dict(self):
+        """
+        Get the record in MailUp format, as returned by ``get_*`` methods.
+
+        :rtype: dict
+        """
+        data = {key: getattr(self, attribute) for attribute, key in self._KEYS}
+        data.update(self.extra or {})
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.id}>'
+
+
+class Recipient(_Record):
+    """
+    Compact recipient, dynamic fields are stored as a tuple of values ordered as :attr:`schema`.
+
+    Keys of the MailUp item without an attribute (e.g. subscription dates) are kept in :attr:`extra`.
+    """
+
+    __slots__ = ('id', 'email', 'name', 'mobile_prefix', 'mobile_number', 'values', 'schema')
+
+    _KEYS = (('id', 'idRecipient'), ('email', 'Email'), ('name', 'Name'),
+             ('mobile_prefix', 'MobilePrefix'), ('mobile_number', 'MobileNumber'))
+
+    def __init__(self, id, email, name, mobile_prefix, mobile_number, values, schema, extra=None):
+        super().__init__(id, email, name, mobile_prefix, mobile_number, extra=extra)
+        self.values = values
+        self.schema = schema
+
+    @classmethod
+    def from_item(cls, item, schema):
+        """
+        Create a recipient from a MailUp item.
+
+        :param item: Recipient as returned by MailUp
+        :type item: dict
+        :param schema: Fields schema of the account
+        :type schema: mailupy.records.FieldSchema
+        :rtype: mailupy.records.Recipient
+        """
+        item = dict(item)
+        return cls._from_item(item, schema.values(item.pop('Fields', None)), schema)
+
+    @property
+    def fields(self):
+        """
+        Dynamic fields as a ``dict`` of descriptions to values.
+
+        :rtype: dict
+        """
+        return dict(zip(self.schema.descriptions, self.values))
+
+    def field(self, description):
+        """
+        Get the value of a dynamic field.
+
+        :raise ValueError: if the field isn't in the schema
+        """
+        return self.values[self.schema.position(description)]
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['Fields'] = [
+            {'Description': description, 'Id': field_id, 'Value': value}
+            for field_id, description, value in zip(self.schema.ids, self.schema.descriptions, self.values)
+        ]
+        return data
+
+
+class Group(_Record):
+    """
+    Compact group of a list.
+    """
+
+    __slots__ = ('id', 'list_id', 'name', 'notes', 'count', 'deletable')
+
+    _KEYS = (('id', 'idGroup'), ('list_id', 'idList'), ('name', 'Name'), ('notes', 'Notes'),
+             ('count', 'Count'), ('deletable', 'Deletable'))
+
+    @classmethod
+    def from_item(cls, item):
+        """
+        Create a group from a MailUp item.
+
+        :rtype: mailupy.records.Group
+        """
+        return cls._from_item(item)
+
+
+class Message(_Record):
+    """
+    Compact email message of a list.
+    """
+
+    __slots__ = ('id', 'list_id', 'subject', 'notes', 'creation_date')
+
+    _KEYS = (('id', 'idMessage'), ('list_id', 'idList'), ('subject', 'Subject'), ('notes', 'Notes'),
+             ('creation_date', 'CreationDate'))
+
+    @classmethod
+    def from_item(cls, item):
+        """
+        Create a message from a MailUp item.
+
+        :rtype: mailupy.records.Message
+        """
+        return cls._from_item(item)
+
+
+class RecipientBatch:
+    """
+    Column-oriented batch of recipients, for bulk analysis.
+
+    Ids are kept in an :class:`array.array`, other attributes and each dynamic field in a list.
+    Dynamic fields are keyed by ``Id``, since descriptions aren't unique: with ``city`` being field 3,
+    ``batch.fields[3]`` holds the city of every recipient of the batch.
+
+    :param schema: Fields schema of the account
+    :type schema: mailupy.records.FieldSchema
+    """
+
+    __slots__ = ('schema', 'ids', 'emails', 'names', 'mobile_prefixes', 'mobile_numbers', 'fields')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.ids = array.array('q')
+        self.emails = []
+        self.names = []
+        self.mobile_prefixes = []
+        self.mobile_numbers = []
+        self.fields = {field_id: [] for field_id in schema.ids}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, recipient):
+        """
+        Add a recipient to the batch.
+
+        :param recipient: Recipient record, or item as returned by MailUp
+        :type recipient: mailupy.records.Recipient, dict
+        """
+        if not isinstance(recipient, Recipient):
+            recipient = Recipient.from_item(recipient, self.schema)
+        self.ids.append(recipient.id)
+        self.emails.append(recipient.email)
+        self.names.append(recipient.name)
+        self.mobile_prefixes.append(recipient.mobile_prefix)
+        self.mobile_numbers.append(recipient.mobile_number)
+        for column, value in zip(self.fields.values(), recipient.values):
+            column.append(value)
+
+    def columns(self):
+        """
+        Get every column by name, dynamic fields by their description.
+
+        :raise mailupy.exceptions.MailupyException: if two dynamic fields have the same description,
+            use :attr:`fields` instead
+        :rtype: dict
+        """
+        descriptions = self.schema.descriptions
+        if len(set(descriptions)) < len(descriptions):
+            raise MailupyException('Dynamic fields descriptions are not unique, read columns by Id from fields')
+        return {
+            'idRecipient': self.ids, 'Email': self.emails, 'Name': self.names,
+            'MobilePrefix': self.mobile_prefixes, 'MobileNumber': self.mobile_numbers,
+            **dict(zip(descriptions, self.fields.values()))
+        }
+
+    def records(self):
+        """
+        Iterate the recipients of the batch as records.
+
+        :rtype: collections.Iterable[mailupy.records.Recipient]
+        """
+        for position, values in enumerate(zip(*self.fields.values()) if self.fields else ((),) * len(self)):
+            yield Recipient(self.ids[position], self.emails[position], self.names[position],
+                            self.mobile_prefixes[position], self.mobile_numbers[position], tuple(values), self.schema)
+
+
+def iter_batches(recipients, schema, batch_size=10000):
+    """
+    Group recipients in :class:`~mailupy.records.RecipientBatch` of at most ``batch_size`` recipients.
+
+    :param recipients: Recipient records or items as returned by MailUp
+    :type recipients: collections.Iterable
+    :param schema: Fields schema of the account
+    :type schema: mailupy.records.FieldSchema
+    :rtype: collections.Iterable[mailupy.records.RecipientBatch]
+    """
+    batch = RecipientBatch(schema)
+    for recipient in recipients:
+        batch.append(recipient)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = RecipientBatch(schema)
+    if len(batch):
+        yield batch
@@ -0,0 +1,137 @@
+import random
+
+
+_CONNECT_ERRORS = {'ConnectTimeout', 'ConnectError', 'NewConnectionError', 'ConnectionRefusedError'}
+
+
+def is_connect_error(error):
+    """
+    Check whether an error prevented the request from reaching MailUp, e.g. a refused connection
+    or a timeout while connecting, following the errors wrapped by ``requests`` and ``urllib3``.
+
+    :param error: Error raised while sending a request
+    :type error: Exception
+    :rtype: bool
+    """
+    seen = set()
+    while isinstance(error, BaseException) and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in _CONNECT_ERRORS:
+            return True
+        error = getattr(error, 'reason', None) or (error.args[0] if error.args else None) or error.__cause__
+    return False
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are sent again and how long to wait before each attempt.
+
+    A request is retried when it couldn't reach MailUp (the connection failed), or when it's idempotent
+    and failed with a network error or one of ``retry_statuses``. ``GET``, ``PUT`` and ``DELETE`` requests
+    are idempotent, as are writes listed in ``idempotent_writes``: subscriptions and imports, which MailUp
+    applies as upserts, and token requests. Other writes, like sending a message or creating a group,
+    are never sent again once they may have reached MailUp, so a timeout can't send an email twice.
+
+    Waits grow exponentially from ``backoff`` up to ``max_backoff`` seconds, with full jitter
+    (a random wait between zero and the exponential value) so clients don't retry in lockstep.
+    Throttled requests (429) are handled separately, see ``max_throttle_retries`` in
+    :func:`~mailupy.Mailupy.__init__()`, but share the same ``deadline``.
+
+    :param max_attempts: Maximum attempts of a request, including the first one
+    :type max_attempts: int
+    :param backoff: Seconds before the first retry
+    :type backoff: float
+    :param max_backoff: Maximum seconds between two attempts
+    :type max_backoff: float
+    :param jitter: Randomize waits
+    :type jitter: bool
+    :param deadline: Seconds after the first attempt past which a request is no longer retried,
+        ``None`` for no limit
+    :type deadline: float
+    :param retry_statuses: Status codes retried for idempotent requests
+    :type retry_statuses: collections.Iterable[int]
+    :param idempotent_writes: ``(method, endpoint template)`` pairs of writes safe to repeat,
+        :attr:`IDEMPOTENT_WRITES` if omitted
+    :type idempotent_writes: collections.Iterable[tuple]
+    """
+
+    IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+    """HTTP verbs whose requests can always be repeated"""
+
+    IDEMPOTENT_WRITES = frozenset({
+        ('POST', '/Authorization/OAuth/Token'),
+        ('POST', '/List/{list_id}/Recipient'),
+        ('POST', '/Group/{group_id}/Recipient'),
+        ('POST', '/List/{list_id}/Recipients'),
+        ('POST', '/Group/{group_id}/Recipients'),
+    })
+    """Writes MailUp applies as upserts, so repeating them doesn't change the outcome"""
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30, jitter=True, deadline=None,
+                 retry_statuses=(500, 502, 503, 504), idempotent_writes=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_writes = frozenset(self.IDEMPOTENT_WRITES if idempotent_writes is None else idempotent_writes)
+
+    def is_idempotent(self, method, endpoint):
+        """
+        Check whether a request can be repeated without changing its outcome.
+
+        :param method: HTTP verb
+        :type method: str
+        :param endpoint: Endpoint template, see :func:`~mailupy.metrics.endpoint_template()`
+        :type endpoint: str
+        :rtype: bool
+        """
+        return method in self.IDEMPOTENT_METHODS or (method, endpoint) in self.idempotent_writes
+
+    def should_retry(self, method, endpoint, attempt, status=None, error=None):
+        """
+        Check whether a failed attempt should be followed by another one.
+
+        :param method: HTTP verb
+        :type method: str
+        :param endpoint: Endpoint template
+        :type endpoint: str
+        :param attempt: Attempts made so far, starting from 1
+        :type attempt: int
+        :param status: Status code of the response, if any
+        :type status: int
+        :param error: Error raised while sending the request, if any
+        :type error: Exception
+        :rtype: bool
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None:
+            return is_connect_error(error) or self.is_idempotent(method, endpoint)
+        return status in self.retry_statuses and self.is_idempotent(method, endpoint)
+
+    def delay(self, attempt):
+        """
+        Seconds to wait after a failed attempt.
+
+        :param attempt: Attempts made so far, starting from 1
+        :type attempt: int
+        :rtype: float
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def within_deadline(self, elapsed, delay=0):
+        """
+        Check whether another attempt, after waiting ``delay`` seconds, would start within the deadline.
+
+        :param elapsed: Seconds since the first attempt
+        :type elapsed: float
+        :rtype: bool
+        """
+        return self.deadline is None or elapsed + delay < self.deadline
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+"""Policy never retrying requests"""
@@ -0,0 +1,101 @@
+import codecs
+import json
+
+from .exceptions import MailupyException
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _Buffer:
+    """
+    Text buffer fed by an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        if self.eof:
+            raise MailupyException('Unexpected end of the response while decoding JSON')
+        # Drop what's been parsed already, so the buffer never holds more than a few items
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.text += self._decoder.decode(chunk)
+                return
+        self.text += self._decoder.decode(b'', final=True)
+        self.eof = True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            self.read_more()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise MailupyException(f'Invalid JSON: expected {char!r} at {self.text[self.pos:self.pos + 20]!r}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                self.read_more()
+                continue
+            # A number at the end of the buffer might continue in the next chunk
+            if end == len(self.text) and not self.eof:
+                self.read_more()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_page_items(chunks, page):
+    """
+    Decode a MailUp page incrementally, yielding each element of ``Items`` as soon as it's complete.
+
+    Other keys of the page (``IsPaginated``, ``PageSize``, ``TotalElementsCount``...) are stored in ``page``
+    as they're read: since MailUp sends them around ``Items``, they're all available once the iterator is exhausted.
+
+    :param chunks: Iterator of ``bytes`` of the response body, e.g. ``response.iter_content(65536)``
+    :type chunks: collections.Iterable[bytes]
+    :param page: ``dict`` receiving the page keys other than ``Items``
+    :type page: dict
+    :raise mailupy.exceptions.MailupyException: if the body isn't a valid page
+    :rtype: collections.Iterable[dict]
+    """
+    buffer = _Buffer(chunks)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+    while True:
+        key = buffer.value()
+        buffer.expect(':')
+        if key == 'Items':
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                buffer.pos += 1
+            else:
+                while True:
+                    yield buffer.value()
+                    if buffer.peek() == ']':
+                        buffer.pos += 1
+                        break
+                    buffer.expect(',')
+        else:
+            page[key] = buffer.value()
+        if buffer.peek() == '}':
+            return
+        buffer.expect(',')
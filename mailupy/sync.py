@@ -0,0 +1,205 @@
+import hashlib
+import json
+import sqlite3
+from collections import namedtuple
+
+from .bulk import iter_chunks
+from .exceptions import MailupyException
+
+
+SyncReport = namedtuple('SyncReport', ['full', 'inserted', 'updated', 'removed', 'unchanged'])
+SyncReport.__doc__ = """
+Outcome of :func:`~mailupy.sync.RecipientSync.run()`.
+
+``full`` tells whether every recipient was read (and missing ones removed) or only those added since
+the previous run, ``inserted``, ``updated``, ``removed`` and ``unchanged`` count the local rows.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipients (
+    id INTEGER PRIMARY KEY,
+    email TEXT,
+    name TEXT,
+    mobile_prefix TEXT,
+    mobile_number TEXT,
+    status TEXT,
+    fields TEXT,
+    digest TEXT,
+    seen INTEGER
+);
+CREATE INDEX IF NOT EXISTS recipients_email ON recipients (email);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class RecipientSync:
+    """
+    Mirror the recipients of a list or a group into a SQLite database.
+
+    Recipients are stored in the ``recipients`` table with their subscription status and their dynamic
+    fields as a JSON object of descriptions to values. Each database mirrors a single list or group.
+
+    MailUp doesn't tell when a recipient was last changed, so two kinds of runs are available:
+
+    * full runs read every recipient, inserting, updating and removing local rows;
+    * incremental runs read only recipients with an ``idRecipient`` above the highest one already
+      synced for each status, with few requests.
+
+    ``idRecipient`` is assigned when a recipient is created in the account, not when it joins a list or
+    a group, so incremental runs only catch recipients created after the previous run. Existing recipients
+    subscribing to the list or added to the group, changes of status or fields and removals are only seen
+    by full runs, which should still be scheduled regularly.
+
+    Recipients are read ordered by ``idRecipient`` and written in transactions of ``batch_size`` rows
+    together with the position reached, so a run interrupted by a crash resumes where it stopped.
+
+    Example::
+
+     >>> with RecipientSync(client, 'list-1.sqlite', list_id=1) as sync:
+     ...     report = sync.run()
+
+    :param client: Client reading recipients
+    :type client: mailupy.Mailupy
+    :param path: Path of the SQLite database, created if missing
+    :type path: str
+    :param list_id: List ID, either this or ``group_id`` is required
+    :type list_id: int, str
+    :param group_id: Group ID
+    :type group_id: int, str
+    :param statuses: Subscription statuses synced for lists
+    :type statuses: tuple of str
+    :param page_size: Recipients requested with each page
+    :type page_size: int
+    :param batch_size: Rows written with each transaction
+    :type batch_size: int
+    """
+
+    MAX_VARIABLES = 500
+    """Ids looked up by a single query, older SQLite builds allow 999 variables at most"""
+
+    def __init__(self, client, path, list_id=None, group_id=None, statuses=('Subscribed', 'Unsubscribed', 'Pending'),
+                 page_size=500, batch_size=500):
+        if (list_id is None) == (group_id is None):
+            raise MailupyException('Either list_id or group_id is required')
+        self.client = client
+        self.source = f'List/{list_id}' if list_id is not None else f'Group/{group_id}'
+        self._list_id = list_id
+        self._group_id = group_id
+        self.statuses = tuple(statuses) if list_id is not None else (None,)
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+        source = self._get_state('source')
+        if source is None:
+            self._set_state(source=self.source)
+            self.connection.commit()
+        elif source != self.source:
+            raise MailupyException(f'{path} mirrors {source}, not {self.source}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.connection.close()
+
+    def _get_state(self, key, default=None):
+        row = self.connection.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_state(self, **values):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+            [(key, json.dumps(value)) for key, value in values.items()]
+        )
+
+    def _read(self, status, after):
+        query = {'filter_by': f'idRecipient>{after}', 'order_by': ['idRecipient asc']}
+        if self._group_id is not None:
+            return self.client.get_recipients_from_group(self._group_id, self.page_size, **query)
+        return self.client._get_recipients_from_generic_list(status, self._list_id, self.page_size, **query)
+
+    def _row(self, recipient, status, run):
+        if not isinstance(recipient, dict):
+            recipient = recipient.to_dict()
+        fields = json.dumps(
+            {field['Description']: field['Value'] for field in recipient.get('Fields') or []}, sort_keys=True
+        )
+        values = (recipient.get('Email'), recipient.get('Name'), recipient.get('MobilePrefix'),
+                  recipient.get('MobileNumber'), status, fields)
+        digest = hashlib.sha1(json.dumps(values).encode()).hexdigest()
+        return (recipient['idRecipient'],) + values + (digest, run)
+
+    def _write(self, rows, counts):
+        digests = {}
+        for ids in iter_chunks((row[0] for row in rows), self.MAX_VARIABLES):
+            placeholders = ','.join('?' * len(ids))
+            digests.update(self.connection.execute(
+                f'SELECT id, digest FROM recipients WHERE id IN ({placeholders})', ids
+            ))
+        changed = [row for row in rows if digests.get(row[0]) != row[7]]
+        self.connection.executemany('INSERT OR REPLACE INTO recipients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', changed)
+        self.connection.executemany(
+            'UPDATE recipients SET seen = ? WHERE id = ?',
+            [(row[8], row[0]) for row in rows if digests.get(row[0]) == row[7]]
+        )
+        inserted = sum(1 for row in changed if row[0] not in digests)
+        counts['inserted'] += inserted
+        counts['updated'] += len(changed) - inserted
+        counts['unchanged'] += len(rows) - len(changed)
+
+    def run(self, full=None):
+        """
+        Sync the local database with MailUp.
+
+        :param full: ``True`` for a full run, ``False`` for an incremental one, catching only recipients created
+            since the previous run. By default runs are incremental once a full run has completed, and an
+            interrupted full run is always resumed first
+        :type full: bool
+        :raise mailupy.exceptions.MailupyRequestException: if a response returns a status code >= 400
+        :rtype: mailupy.sync.SyncReport
+        """
+        progress = self._get_state('full_progress')
+        if full is None:
+            full = progress is not None or self._get_state('last_full_run') is None
+        counts = {'inserted': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        marks = self._get_state('high_water_marks', {})
+        if full:
+            if progress is None:
+                progress = {'run': self._get_state('last_full_run', 0) + 1, 'status': 0, 'after': 0, 'marks': {}}
+            run = progress['run']
+            for index in range(progress['status'], len(self.statuses)):
+                status = self.statuses[index]
+                if index != progress['status']:
+                    progress.update(status=index, after=0)
+                for rows in iter_chunks(self._read(status, progress['after']), self.batch_size):
+                    rows = [self._row(recipient, status, run) for recipient in rows]
+                    progress['after'] = rows[-1][0]
+                    progress['marks'][str(status)] = max(progress['marks'].get(str(status), 0), rows[-1][0])
+                    with self.connection:
+                        self._write(rows, counts)
+                        self._set_state(full_progress=progress)
+            with self.connection:
+                counts['removed'] = self.connection.execute('DELETE FROM recipients WHERE seen < ?', (run,)).rowcount
+                self.connection.execute('DELETE FROM sync_state WHERE key = ?', ('full_progress',))
+                self._set_state(last_full_run=run, high_water_marks=progress['marks'])
+        else:
+            run = self._get_state('last_full_run', 0)
+            for status in self.statuses:
+                for rows in iter_chunks(self._read(status, marks.get(str(status), 0)), self.batch_size):
+                    rows = [self._row(recipient, status, run) for recipient in rows]
+                    marks[str(status)] = rows[-1][0]
+                    with self.connection:
+                        self._write(rows, counts)
+                        self._set_state(high_water_marks=marks)
+        return SyncReport(full, **counts)
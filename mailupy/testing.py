@@ -0,0 +1,407 @@
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+from .client import Mailupy
+
+
+API_PATH = '/API/v1.1/Rest/ConsoleService.svc/Console'
+AUTH_PATH = '/Authorization/OAuth/Token'
+
+
+class MailupStandIn:
+    """
+    In-process HTTP server answering like MailUp, for end-to-end tests and benchmarks.
+
+    Serves the endpoints used by :class:`~mailupy.Mailupy` over a generated dataset:
+    recipients are built on the fly from their position, so large lists cost no memory.
+    One recipient every ten (starting from the first) is unsubscribed, none is pending.
+    Recipients can be filtered by ``Email=='...'`` (also combined with ``||``) and ``idRecipient>N``.
+
+    Example::
+
+     >>> with MailupStandIn(recipients=100000, latency=0.02) as server:
+     ...     client = server.client(page_workers=4)
+     ...     count = sum(1 for r in client.get_recipients_from_list(1, page_size=500))
+
+    :param recipients: Number of recipients of every list and group
+    :type recipients: int
+    :param fields: Number of dynamic fields
+    :type fields: int
+    :param groups: Number of groups of every list
+    :type groups: int
+    :param page_size: Page size used when the client doesn't send ``pageSize``
+    :type page_size: int
+    :param max_page_size: Biggest page served, bigger ``pageSize`` values are capped
+    :type max_page_size: int
+    :param latency: Seconds waited before answering each request
+    :type latency: float
+    :param throttle_every: Answer 429 to one request every ``throttle_every``, ``None`` to never throttle
+    :type throttle_every: int
+    :param retry_after: ``Retry-After`` header sent with 429 responses
+    :type retry_after: str
+    :param expire_token_every: Invalidate the current access token every ``expire_token_every`` API requests,
+        so the client gets a 401 and must refresh it
+    :type expire_token_every: int
+    :param import_polls: Status checks answered as not completed before an import completes
+    :type import_polls: int
+    """
+
+    def __init__(self, recipients=1000, fields=10, groups=5, page_size=20, max_page_size=1000, latency=0,
+                 throttle_every=None, retry_after='0', expire_token_every=None, import_polls=1):
+        self.recipients = recipients
+        self.fields = fields
+        self.groups = groups
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.expire_token_every = expire_token_every
+        self.import_polls = import_polls
+        self.stats = {'requests': 0, 'throttled': 0, 'unauthorized': 0, 'logins': 0, 'refreshes': 0,
+                      'sent': 0, 'imported': 0}
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._token_counter = itertools.count(1)
+        self._imports = {}
+        self._import_counter = itertools.count(1)
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Start serving from a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server and close its socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def client(self, client_class=Mailupy, **kwargs):
+        """
+        Create a client talking to this server.
+
+        :param client_class: Client class, e.g. :class:`~mailupy.Mailupy` or :class:`~mailupy.AsyncMailupy`
+        :type client_class: type
+        :param kwargs: Keyword arguments for the client
+        :rtype: mailupy.Mailupy
+        """
+        client = client_class('username', 'password', 'client-id', 'client-secret', **kwargs)
+        client.AUTH_URL = f'{self.url}{AUTH_PATH}'
+        client.BASE_URL = f'{self.url}{API_PATH}'
+        return client
+
+    def field_definitions(self):
+        return [{'Description': f'field{i}', 'Id': i} for i in range(1, self.fields + 1)]
+
+    def recipient(self, index):
+        return {
+            'idRecipient': index + 1,
+            'Email': f'user{index}@example.com',
+            'Name': f'User {index}',
+            'MobileNumber': None,
+            'MobilePrefix': None,
+            'Fields': [
+                {'Description': f'field{i}', 'Id': i, 'Value': f'value {index}-{i}'} for i in range(1, self.fields + 1)
+            ]
+        }
+
+    def _issue_token(self, grant):
+        with self._lock:
+            number = next(self._token_counter)
+            self.stats['logins' if grant == 'password' else 'refreshes'] += 1
+            self._tokens[f'token-{number}'] = 0
+        return {
+            'access_token': f'token-{number}',
+            'refresh_token': f'refresh-{number}',
+            'expires_in': 3600
+        }
+
+    def _check_request(self, token):
+        # Count an API request, returning the status code to answer instead of serving it, if any
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.throttle_every and self.stats['requests'] % self.throttle_every == 0:
+                self.stats['throttled'] += 1
+                return 429
+            if token not in self._tokens:
+                self.stats['unauthorized'] += 1
+                return 401
+            self._tokens[token] += 1
+            if self.expire_token_every and self._tokens[token] >= self.expire_token_every:
+                del self._tokens[token]
+        return None
+
+    def _import(self, recipients):
+        with self._lock:
+            import_id = next(self._import_counter)
+            self._imports[import_id] = [len(recipients), self.import_polls]
+            self.stats['imported'] += len(recipients)
+        return import_id
+
+    def _import_status(self, import_id):
+        with self._lock:
+            size, polls = self._imports[import_id]
+            self._imports[import_id][1] = polls - 1
+        return {
+            'Completed': polls <= 0,
+            'CreatedRecipients': size if polls <= 0 else 0,
+            'ImportedRecipients': size if polls <= 0 else 0,
+            'NotValidRecipients': 0,
+            'UpdatedRecipients': 0,
+            'ValidRecipients': size,
+            'idImport': import_id
+        }
+
+
+_EMAIL_FILTER = re.compile(r"Email=='([^']*)'")
+_AFTER_FILTER = re.compile(r'idRecipient>(\d+)')
+_EMAIL_INDEX = re.compile(r'user(\d+)@example\.com', re.IGNORECASE)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer needs Python 3.7
+
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def standin(self):
+        return self.server.standin
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode() if length else ''
+
+    def _send(self, status, data=None, headers=None):
+        body = json.dumps(data).encode() if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, description):
+        headers = {'Retry-After': self.standin.retry_after} if status == 429 else None
+        self._send(status, {'ErrorDescription': description}, headers)
+
+    def _handle(self, method):
+        body = self._body()
+        if self.standin.latency:
+            time.sleep(self.standin.latency)
+        url = urlparse(self.path)
+        if url.path == AUTH_PATH:
+            grant = parse_qs(body).get('grant_type', [''])[0]
+            return self._send(200, self.standin._issue_token(grant))
+        if not url.path.startswith(API_PATH):
+            return self._error(404, 'Not found')
+        token = self.headers.get('Authorization', '')[len('Bearer '):]
+        status = self.standin._check_request(token)
+        if status:
+            return self._error(status, 'Too many requests' if status == 429 else 'Invalid token')
+        path = url.path[len(API_PATH):]
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, route_method, handler in _ROUTES:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                status, data = handler(self.standin, query, body, *match.groups())
+                return self._send(status, data)
+        return self._error(404, 'Not found')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def _page(standin, query, total, item):
+    page_size = min(int(query.get('pageSize') or standin.page_size), standin.max_page_size)
+    page_number = int(query.get('pageNumber') or 0)
+    first = page_number * page_size
+    return 200, {
+        'IsPaginated': True,
+        'Items': [item(index) for index in range(first, min(first + page_size, total))],
+        'PageNumber': page_number,
+        'PageSize': page_size,
+        'Skipped': first,
+        'TotalElementsCount': total
+    }
+
+
+class _Selection:
+    """
+    Positions of the recipients with a subscription status, computed without listing them.
+    """
+
+    def __init__(self, total, list_type):
+        self.total = total
+        self.list_type = list_type
+        unsubscribed = (total + 9) // 10
+        self.length = {
+            'EmailOptins': total, 'Subscribed': total - unsubscribed, 'Unsubscribed': unsubscribed, 'Pending': 0
+        }[list_type]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if self.list_type == 'Subscribed':
+            tens, units = divmod(position, 9)
+            return tens * 10 + units + 1
+        if self.list_type == 'Unsubscribed':
+            return position * 10
+        return position
+
+    def __contains__(self, index):
+        if not 0 <= index < self.total:
+            return False
+        if self.list_type == 'Subscribed':
+            return index % 10 != 0
+        if self.list_type == 'Unsubscribed':
+            return index % 10 == 0
+        return self.list_type != 'Pending'
+
+
+class _Tail:
+    """
+    Positions of a selection from ``start`` on.
+    """
+
+    def __init__(self, selection, start):
+        self.selection = selection
+        self.start = start
+
+    def __len__(self):
+        return len(self.selection) - self.start
+
+    def __getitem__(self, position):
+        return self.selection[self.start + position]
+
+    def __contains__(self, index):
+        return len(self) > 0 and index in self.selection and index >= self.selection[self.start]
+
+
+def _recipients(standin, query, body, list_id, list_type):
+    if list_type not in ('EmailOptins', 'Subscribed', 'Unsubscribed', 'Pending'):
+        return 404, {'ErrorDescription': 'Not found'}
+    return _filtered_page(standin, query, _Selection(standin.recipients, list_type))
+
+
+def _group_recipients(standin, query, body, group_id):
+    return _filtered_page(standin, query, _Selection(standin.recipients, 'EmailOptins'))
+
+
+def _filtered_page(standin, query, selection):
+    after = _AFTER_FILTER.search(query.get('filterby', ''))
+    if after:
+        # Selections are sorted by idRecipient, find the first one above the filter
+        low, high = 0, len(selection)
+        while low < high:
+            middle = (low + high) // 2
+            if selection[middle] + 1 > int(after.group(1)):
+                high = middle
+            else:
+                low = middle + 1
+        selection = _Tail(selection, low)
+    emails = _EMAIL_FILTER.findall(query.get('filterby', ''))
+    if emails:
+        matches = (_EMAIL_INDEX.fullmatch(email) for email in emails)
+        selection = sorted({int(match.group(1)) for match in matches if match and int(match.group(1)) in selection})
+    return _page(standin, query, len(selection), lambda position: standin.recipient(selection[position]))
+
+
+def _fields(standin, query, body):
+    definitions = standin.field_definitions()
+    return _page(standin, query, len(definitions), lambda index: definitions[index])
+
+
+def _groups(standin, query, body, list_id):
+    return _page(standin, query, standin.groups, lambda index: {
+        'Count': None, 'Deletable': True, 'Name': f'Group {index}', 'Notes': '',
+        'idGroup': index + 1, 'idList': int(list_id)
+    })
+
+
+def _send(standin, query, body):
+    with standin._lock:
+        standin.stats['sent'] += 1
+    return 200, None
+
+
+def _import(standin, query, body, list_id):
+    return 200, standin._import(json.loads(body))
+
+
+def _import_status(standin, query, body, import_id):
+    return 200, standin._import_status(int(import_id))
+
+
+def _subscribe(standin, query, body, list_id):
+    return 200, standin.recipients + 1
+
+
+def _create_group(standin, query, body, list_id):
+    data = json.loads(body)
+    return 200, {'Count': 0, 'Deletable': True, 'Name': data['Name'], 'Notes': data.get('Notes', ''),
+                 'idGroup': standin.groups + 1, 'idList': int(list_id)}
+
+
+def _ok(standin, query, body, *args):
+    return 200, True
+
+
+_ROUTES = [(re.compile(pattern), method, handler) for pattern, method, handler in [
+    (r'/List/(\d+)/Recipients/(\w+)', 'GET', _recipients),
+    (r'/List/(\d+)/Recipients', 'POST', _import),
+    (r'/Group/(\d+)/Recipients', 'GET', _group_recipients),
+    (r'/Group/(\d+)/Recipients', 'POST', _import),
+    (r'/Import/(\d+)', 'GET', _import_status),
+    (r'/Recipient/DynamicFields', 'GET', _fields),
+    (r'/List/(\d+)/Groups', 'GET', _groups),
+    (r'/List/(\d+)/Group', 'POST', _create_group),
+    (r'/(?:List|Group)/(\d+)/Recipient', 'POST', _subscribe),
+    (r'/(?:Email|Sms)/Send', 'POST', _send),
+    (r'/(?:List|Group)/(\d+)/Unsubscribe/(\d+)', 'DELETE', _ok),
+    (r'/List/(\d+)/Recipient/(\d+)', 'DELETE', _ok),
+]]
@@ -0,0 +1,162 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class TokenStore:
+    """
+    Base class for the stores keeping MailUp tokens.
+
+    A token is a ``dict`` with ``access_token``, ``refresh_token`` and ``expires_at`` (a UNIX timestamp,
+    or ``None`` when unknown). Stores shared by many clients let them reuse the same access token.
+    """
+
+    def load(self):
+        """
+        Get the stored token.
+
+        :return: Token ``dict`` or ``None`` if nothing is stored
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def save(self, token):
+        """
+        Store a token.
+
+        :param token: Token ``dict``
+        :type token: dict
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self):
+        """
+        Context manager held while a client logs in or refreshes the token, so only one does it at a time.
+        """
+        yield
+
+    @staticmethod
+    def is_fresh(token, margin=0):
+        """
+        Check whether a token is usable for at least ``margin`` more seconds.
+
+        :rtype: bool
+        """
+        if not token or token.get('access_token') is None:
+            return False
+        expires_at = token.get('expires_at')
+        return expires_at is None or time.time() < expires_at - margin
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Keeps the token in memory, can be shared by clients of the same process.
+    """
+
+    def __init__(self):
+        self._token = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        return self._token
+
+    def save(self, token):
+        self._token = dict(token)
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            yield
+
+
+class FileTokenStore(TokenStore):
+    """
+    Keeps the token in a JSON file, can be shared by processes on the same machine.
+
+    Writes are atomic and, where ``fcntl`` is available, logins and refreshes are serialized
+    with an exclusive lock on ``<path>.lock``.
+
+    :param path: Path of the JSON file
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, token):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.mailupy-token-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(token, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f'{self.path}.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SharedTokenStore(TokenStore):
+    """
+    Keeps the token in a :mod:`multiprocessing` manager, can be passed to worker processes.
+
+    Example::
+
+     >>> store = SharedTokenStore()
+     >>> with multiprocessing.Pool(8, initializer=init_worker, initargs=(store,)) as pool:
+     ...     pool.map(export_list, lists)
+
+    :param manager: Manager holding the token, a new one is started if omitted
+    :type manager: multiprocessing.managers.SyncManager
+    """
+
+    def __init__(self, manager=None):
+        # Keep a reference to the manager, or its server process is stopped when it's garbage collected
+        self._manager = manager or multiprocessing.Manager()
+        self._data = self._manager.dict()
+        self._lock = self._manager.RLock()
+
+    def __getstate__(self):
+        return {'_manager': None, '_data': self._data, '_lock': self._lock}
+
+    def load(self):
+        return self._data.get('token')
+
+    def save(self, token):
+        self._data['token'] = dict(token)
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            yield
@@ -0,0 +1,64 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HTTPTransport:
+    """
+    Pooled, keep-alive HTTP transport used by :class:`~mailupy.Mailupy`.
+
+    Connections to MailUp are kept open and reused between requests, so paginated downloads
+    and bursts of calls don't pay a new TLS handshake every time.
+    A single transport can be shared by many threads and by many clients.
+
+    Example::
+
+     >>> with HTTPTransport(pool_maxsize=20) as transport:
+     ...     client = Mailupy('m00000', 'password', 'client-id', 'client-secret', transport=transport)
+
+    :param pool_connections: Number of hosts to keep a connection pool for
+    :type pool_connections: int
+    :param pool_maxsize: Maximum number of connections kept open for each host
+    :type pool_maxsize: int
+    :param pool_block: If ``True`` requests wait for a free connection instead of opening more than
+        ``pool_maxsize`` connections to the same host
+    :type pool_block: bool
+    :param timeout: Default timeout in seconds for every request, ``None`` to wait forever
+    :type timeout: float, tuple of float
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=10, pool_block=False, timeout=None):
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def request(self, req_type, url, **kwargs):
+        """
+        Perform an HTTP request reusing a pooled connection.
+
+        :param req_type: HTTP verb (``GET``, ``POST``, ``PUT`` or ``DELETE``)
+        :type req_type: str
+        :param url: Full URL
+        :type url: str
+        :param kwargs: Keyword arguments accepted by :func:`requests.request`
+        :rtype: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self._session.request(req_type, url, **kwargs)
+
+    def close(self):
+        """
+        Close every pooled connection.
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
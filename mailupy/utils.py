@@ -1,12 +0,0 @@
-import requests
-
-
-type_to_request_function = {
-    'GET': requests.get,
-    'POST': requests.post,
-    'PUT': requests.put,
-    'DELETE': requests.delete
-}
-"""
-Request type mapping
-"""
@@ -7,12 +7,21 @@ setup(
     install_requires=[
         "requests==2.26.0"
     ],
+    extras_require={
+        'async': ['httpx>=0.18'],
+        'parquet': ['pyarrow'],
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    },
     description="Yet another Mailup Python client",
     long_description=open('README.rst', 'r').read(),
     license="MIT",
     author="Lotrèk",
     author_email="dimmitutto@lotrek.it",
     packages=find_packages(),
+    entry_points={
+        'console_scripts': ['mailupy=mailupy.cli:main'],
+    },
     include_package_data=True,
     classifiers=[
         'Environment :: Web Environment',
@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import json
+import unittest
+
+import httpx
+
+from mailupy import AsyncMailupy, MailupyRequestException
+from mailupy.coalesce import AsyncRequestCoalescer
+from .tools import MockResponse, mock_request, mock_request_refresh_token
+
+
+def async_test(test):
+    # Runs a coroutine test on its own event loop, IsolatedAsyncioTestCase needs Python 3.8
+    @functools.wraps(test)
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(test(self))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+    return run
+
+
+def mock_transport(mock):
+    def handler(request):
+        headers = dict(request.headers)
+        if 'authorization' in headers:
+            headers['Authorization'] = headers['authorization']
+        response = mock(request.method, str(request.url), headers=headers, body=request.content.decode())
+        return httpx.Response(response.status_code, text=response.text)
+    return httpx.MockTransport(handler)
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def client(self, mock=mock_request):
+        return AsyncMailupy(
+            'username', 'password', 'client-id', 'client-secret',
+            client=httpx.AsyncClient(transport=mock_transport(mock))
+        )
+
+    @async_test
+    async def test_get_fields(self):
+        m = self.client()
+        fields = [field async for field in m.get_fields()]
+        assert fields[0]['Id'] == 27
+        assert m._token == ''
+
+    @async_test
+    async def test_page_size(self):
+        urls = []
+
+        def mock(method, url, *args, **kwargs):
+            urls.append(url)
+            return mock_request(method, url, *args, **kwargs)
+        m = self.client(mock)
+        recipients = [recipient async for recipient in m.get_recipients_from_list(1, page_size=100)]
+        assert recipients and 'pageSize=100' in urls[-1]
+
+    @async_test
+    async def test_get_recipient_from_list(self):
+        m = self.client()
+        recipient = await m.get_recipient_from_list(1, 'email@email.email')
+        assert recipient['idRecipient'] == 13
+
+    @async_test
+    async def test_subscribe_to_group(self):
+        m = self.client()
+        assert await m.subscribe_to_group(6, 'ASDFGHJKL', 'email@email.email', {'compleanno': '11/11'}) == 18
+        assert await m.subscribe_to_list(1, 'ASDFGHJKL', 'email@email.email', pending=True) == 16
+
+    @async_test
+    async def test_create_and_remove(self):
+        async with self.client() as m:
+            assert (await m.create_group(1, 'TEST'))['idGroup'] == 9
+            assert await m.remove_from_list(1, 18)
+            assert await m.unsubscribe_from_group(6, 18)
+
+    @async_test
+    async def test_refresh_token(self):
+        m = self.client(mock_request_refresh_token)
+        await m.login()
+        m._token = 'bad_token'
+        [field async for field in m.get_fields()]
+        assert m._token == 'good_token'
+
+    @async_test
+    async def test_login_when_refresh_fails(self):
+        def refresh_rejected(method, url, *args, **kwargs):
+            if AsyncMailupy.AUTH_URL in url and 'grant_type=refresh_token' in kwargs.get('body', ''):
+                return MockResponse(json.dumps({'error_description': 'invalid refresh token'}), status_code=401)
+            return mock_request_refresh_token(method, url, *args, **kwargs)
+        m = self.client(refresh_rejected)
+        m._token, m._refresh_token = 'bad_token', 'refresh'
+        [field async for field in m.get_fields()]
+        assert m._token == 'good_token'
+
+        def unauthorized(method, url, *args, **kwargs):
+            return MockResponse(json.dumps({'error_description': 'invalid client'}), status_code=401)
+        m = self.client(unauthorized)
+        m._token, m._refresh_token = 'bad_token', 'refresh'
+        with self.assertRaises(MailupyRequestException):
+            await m.login()
+        with self.assertRaises(MailupyRequestException):
+            [field async for field in m.get_fields()]
+
+    @async_test
+    async def test_single_flight_refresh(self):
+        auth_calls = []
+
+        async def handler(request):
+            if AsyncMailupy.AUTH_URL in str(request.url):
+                auth_calls.append(request)
+                await asyncio.sleep(0.05)
+            response = mock_request_refresh_token(
+                request.method, str(request.url), headers={'Authorization': request.headers.get('authorization')}
+            )
+            return httpx.Response(response.status_code, text=response.text)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with AsyncMailupy('username', 'password', 'client-id', 'client-secret', client=client) as m:
+            m._token, m._refresh_token = 'bad_token', 'refresh'
+            await asyncio.gather(*[m.get_recipient_from_list(1, f'email{i}@email.email') for i in range(8)])
+            assert len(auth_calls) == 1 and m._token == 'good_token'
+
+    @async_test
+    async def test_coalescer_cancelled_leader(self):
+        coalescer = AsyncRequestCoalescer()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return 42
+        leader = asyncio.ensure_future(coalescer.run('key', call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run('key', call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == 42
+        assert leader.cancelled() and not len(coalescer)
+
+    @async_test
+    async def test_get_or_create_group(self):
+        async with self.client() as m:
+            assert await m.get_or_create_group(1, 'TEST') == (6, False)
+            assert await m.get_or_create_group(1, 'New') == (9, True)
+            assert await m.get_or_create_group(1, 'New') == (9, False)
+            assert await m.index_groups(1) == 1
+
+    @async_test
+    async def test_get_recipients_by_emails(self):
+        async with self.client() as m:
+            found = await m.get_recipients_by_emails(['email@email.email', 'missing@email.email'], list_id=1)
+            assert found['email@email.email']['idRecipient'] == 13
+            assert found['missing@email.email'] is None
+
+    @async_test
+    async def test_coalesce_requests(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            response = mock_request_refresh_token(request.method, str(request.url), headers={'Authorization': ''})
+            return httpx.Response(response.status_code, text=response.text)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with AsyncMailupy('username', 'password', 'client-id', 'client-secret', client=client) as m:
+            await m.login()
+            found = await asyncio.gather(*[m.get_recipient_from_list(1, 'email@email.email') for i in range(5)])
+            assert [recipient['idRecipient'] for recipient in found] == [13] * 5
+            assert len(calls) == 2 and m.metrics.snapshot()['counters']['coalesced_requests'] == 4
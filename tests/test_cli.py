@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from mailupy.cli import Checkpoint, Progress, main
+from mailupy.exceptions import MailupyException
+from mailupy.testing import MailupStandIn
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_recipients(self, count):
+        path = self.path('recipients.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['email', 'name', 'field1'])
+            writer.writerows([f'user{i}@example.com', f'User {i}', f'value {i}'] for i in range(count))
+        return path
+
+    def test_export(self):
+        with MailupStandIn(recipients=230, fields=2, max_page_size=20) as server:
+            args = ['--quiet', 'export', '--list', '1', '--status', 'Subscribed', '--output', self.path('out'),
+                    '--page-size', '20', '--shard-pages', '3', '--checkpoint', self.path('export.ckpt')]
+            assert main(args, client=server.client()) == 0
+            parts = sorted(os.listdir(self.path('out')))
+            assert len(parts) == 4 and parts[-1] == 'part-000009.csv'
+            rows = []
+            for part in parts:
+                with open(os.path.join(self.path('out'), part), newline='') as file:
+                    rows += list(csv.DictReader(file))
+            assert len(rows) == 207 and rows[0]['field2'] == 'value 1-2'
+            requests = server.stats['requests']
+            assert main(args, client=server.client()) == 0
+            # Only the first page is read again, to know the size of the list
+            assert server.stats['requests'] == requests + 1
+            with self.assertRaises(SystemExit):
+                main(['export', '--list', '1'])
+        with patch('sys.stderr', io.StringIO()), self.assertRaises(SystemExit):
+            main([])
+
+    def test_import_and_send(self):
+        path = self.write_recipients(25)
+        with MailupStandIn(import_polls=0) as server:
+            args = ['--quiet', 'import', path, '--list', '1', '--chunk-size', '10',
+                    '--checkpoint', self.path('import.ckpt')]
+            assert main(args, client=server.client()) == 0
+            assert server.stats['imported'] == 25
+            assert main(args, client=server.client()) == 0
+            assert server.stats['imported'] == 25
+            checkpoint = self.path('send.ckpt')
+            job = {'command': 'send', 'file': os.path.abspath(path), 'message': 12}
+            with open(checkpoint, 'w') as file:
+                file.write(json.dumps({'job': job}) + '\n')
+                file.write(json.dumps({'shard': 0}) + '\n{"shard": 1')
+            args = ['--quiet', 'send', path, '--message', '12', '--workers', '3', '--checkpoint', checkpoint]
+            assert main(args, client=server.client()) == 0
+            assert server.stats['sent'] == 24
+            with open(checkpoint) as file:
+                assert len(file.read().splitlines()) == 26
+            stderr = io.StringIO()
+            with patch('sys.stderr', stderr):
+                assert main(['--quiet', 'send', path, '--message', '13', '--checkpoint', checkpoint],
+                            client=server.client()) == 1
+            assert 'checkpoint of another job' in stderr.getvalue()
+
+    def test_sync(self):
+        with MailupStandIn(recipients=120, fields=2) as server:
+            args = ['--quiet', 'sync', self.path('list.sqlite'), '--list', '1', '--page-size', '50']
+            stdout = io.StringIO()
+            client = server.client()
+            with patch('sys.stdout', stdout):
+                assert main(args, client=client) == 0
+                assert main(args, client=client) == 0
+            assert client._hooks['after_request'] == []
+            assert stdout.getvalue().splitlines() == [
+                'full sync: 120 inserted, 0 updated, 0 removed, 0 unchanged',
+                'incremental sync: 0 inserted, 0 updated, 0 removed, 0 unchanged',
+            ]
+
+    def test_credentials(self):
+        stderr = io.StringIO()
+        with patch.dict(os.environ, {}, clear=True), patch('sys.stderr', stderr):
+            assert main(['sync', self.path('list.sqlite'), '--list', '1']) == 1
+        assert 'credentials are required' in stderr.getvalue()
+        env = {'MAILUP_USERNAME': 'u', 'MAILUP_PASSWORD': 'p', 'MAILUP_CLIENT_ID': 'i', 'MAILUP_CLIENT_SECRET': 's'}
+        with patch.dict(os.environ, env), patch('mailupy.cli.Mailupy') as client, patch('sys.stderr', stderr):
+            client.return_value.get_recipients_from_source.side_effect = MailupyException('unreachable')
+            assert main(['export', '--list', '1', '--output', self.path('out')]) == 1
+            client.return_value.close.assert_called_once_with()
+
+    def test_progress(self):
+        stream = io.StringIO()
+        progress = Progress(total=10, unit='recipients', stream=stream, interval=0)
+        assert list(progress.counting(range(4))) == [0, 1, 2, 3]
+        progress.close()
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 5 and lines[-1].startswith('4/10 recipients') and 'ETA' in lines[-1]
+        checkpoint = Checkpoint(self.path('job.ckpt'), {'command': 'test'})
+        checkpoint.mark(3)
+        checkpoint.close()
+        assert Checkpoint(self.path('job.ckpt'), {'command': 'test'}).done == {3}
+        with self.assertRaises(MailupyException):
+            Checkpoint(self.path('job.ckpt'), {'command': 'other'})
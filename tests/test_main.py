@@ -1,8 +1,30 @@
+import json
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch
 
-from mailupy import Mailupy, MailupyException, MailupyRequestException
-from .tools import mock_request, mock_request_refresh_token, mock_request_400, mock_requests_error
+import requests
+
+from mailupy import Mailupy, MailupyException, MailupyRequestException, HTTPTransport
+from mailupy.cache import ResponseCache
+from mailupy.coalesce import RequestCoalescer
+from mailupy.codec import JSONCodec, get_codec, orjson, ujson
+from mailupy.pagination import AdaptivePageSize, PageCursor
+from mailupy.ratelimit import TokenBucket, parse_retry_after
+from mailupy.records import FieldSchema, Group, Message, Recipient, iter_batches
+from mailupy.retry import NO_RETRY, RetryPolicy, is_connect_error
+from mailupy.streaming import iter_page_items
+from mailupy.tokens import FileTokenStore, MemoryTokenStore, SharedTokenStore
+from .tools import (
+    MockResponse,
+    mock_request, mock_request_refresh_token, mock_request_400, mock_requests_error, mock_paginated_request,
+    mock_request_throttled, mock_request_failing_sends, mock_request_expiring_token
+)
 
 
 class TestClient(unittest.TestCase):
@@ -87,14 +109,14 @@ class TestClient(unittest.TestCase):
         m = Mailupy('username', 'password', 'client-id', 'client-secret')
         assert m.remove_from_list(1, 18)
 
-    @patch('requests.api.request', side_effect=mock_request_refresh_token)
+    @patch('requests.Session.request', side_effect=mock_request_refresh_token)
     def test_refresh_token(self, func):
         m = Mailupy('username', 'password', 'client-id', 'client-secret')
         m._token = 'bad_token'
         list(m.get_fields())
         assert m._token == 'good_token'
 
-    @patch('requests.api.request', side_effect=mock_request)
+    @patch('requests.Session.request', side_effect=mock_request)
     def test_build_query_params(self, func):
         m = Mailupy('username', 'password', 'client-id', 'client-secret')
         query = m._parse_filter_ordering(
@@ -111,14 +133,659 @@ class TestClient(unittest.TestCase):
         )
         assert query == 'orderby=Name+asc%3BidGroup+desc'
 
-    @patch('requests.api.request', side_effect=mock_request_400)
+    @patch('requests.Session.request', side_effect=mock_request_400)
     def test_raise_exception_on_401(self, func):
         m = Mailupy('username', 'password', 'client-id', 'client-secret')
         with self.assertRaises(MailupyException) as ex:
             assert m.remove_from_list(1, 18)
 
-    @patch('requests.api.request', side_effect=mock_requests_error)
+    @patch('requests.Session.request', side_effect=mock_requests_error)
     def test_raise_exception_on_requests_exception(self, func):
         with self.assertRaises(MailupyException) as ex:
             m = Mailupy('username', 'password', 'client-id', 'client-secret')
             assert m.remove_from_list(1, 18)
+
+    @patch('requests.Session.request', side_effect=mock_request)
+    def test_shared_transport(self, func):
+        with HTTPTransport(pool_maxsize=2) as transport:
+            m = Mailupy('username', 'password', 'client-id', 'client-secret', transport=transport)
+            assert list(m.get_fields())[0]['Id'] == 27
+            m.close()
+            assert m._transport is transport
+        assert func.call_count == 3
+
+    @patch('requests.Session.close')
+    @patch('requests.Session.request', side_effect=mock_request)
+    def test_close_owned_transport(self, func, close):
+        with Mailupy('username', 'password', 'client-id', 'client-secret') as m:
+            m.get_recipient_from_list(1, 'email@email.email')
+        assert close.call_count == 1
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_fields_cache(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        for i in range(3):
+            m.subscribe_to_group(6, 'ASDFGHJKL', 'email@email.email', {'compleanno': '11/11'})
+        # login, two pages of fields and three subscriptions
+        assert func.call_count == 6
+        m.invalidate_fields()
+        assert m._build_mailup_fields({'compleanno': '11/11', 'missing': 1}) == [
+            {'Description': 'compleanno', 'Id': 27, 'Value': '11/11'}
+        ]
+        assert func.call_count == 8
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_fields_cache_ttl(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', fields_ttl=0)
+        m._build_mailup_fields({'compleanno': '11/11'})
+        m._build_mailup_fields({'compleanno': '11/11'})
+        assert func.call_count == 5
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(205))
+    def test_parallel_pages(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', page_workers=4)
+        ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_list(1)]
+        assert ids == list(range(205))
+        assert func.call_count == 12
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(2000))
+    def test_parallel_pages_stop(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', page_workers=2, page_read_ahead=3)
+        recipients = m.get_recipients_from_list(1)
+        assert next(recipients)['idRecipient'] == 0
+        assert [next(recipients)['idRecipient'] for i in range(30)] == list(range(1, 31))
+        recipients.close()
+        # login, first page and at most three pages ahead of the consumer
+        assert func.call_count <= 6
+
+    @patch('requests.Session.request', side_effect=mock_request_throttled(2))
+    def test_retry_after_429(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        assert m.remove_from_list(1, 18)
+        assert func.call_count == 4
+
+    @patch('requests.Session.request', side_effect=mock_request_throttled(10, retry_after='0.01'))
+    def test_raise_after_429_retries(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', max_throttle_retries=2)
+        with self.assertRaises(MailupyRequestException):
+            m.remove_from_list(1, 18)
+        assert func.call_count == 4
+        assert 0 <= m.rate_limit_wait <= 0.01
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, burst=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert 0 < bucket.reserve() <= 0.01
+        bucket.pause(5)
+        assert 4 < bucket.wait_time <= 5
+        start = time.monotonic()
+        TokenBucket(rate=50, burst=1).acquire()
+        assert time.monotonic() - start < 0.01
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('3', 1) == 3
+        assert parse_retry_after(None, 1) == 1
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', 1) == 0
+        assert parse_retry_after('soon', 1) == 1
+
+    @patch('requests.Session.request', side_effect=mock_request_failing_sends)
+    def test_send_message_bulk(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        recipients = [f'email+{i}@email.email' for i in range(50)]
+        recipients += [('bad@email.email', {'compleanno': '11/11'})]
+        results = list(m.send_message_bulk(iter(recipients), 1, workers=4))
+        assert len(results) == 51
+        failures = [result for result in results if not result.ok]
+        assert len(failures) == 1
+        assert failures[0].recipient == ('bad@email.email', {'compleanno': '11/11'})
+        assert isinstance(failures[0].error, MailupyRequestException)
+        # login, two pages of fields and a call for each recipient
+        assert func.call_count == 54
+
+    @patch('requests.Session.request', side_effect=mock_request_failing_sends)
+    def test_send_message_bulk_keyed(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        recipients = [(i, f'email+{i}@email.email') for i in range(10)]
+        recipients += [(10, ('bad@email.email', {'compleanno': '11/11'}))]
+        completed = []
+        results = list(m.send_message_bulk(iter(recipients), 1, workers=4, keyed=True, on_result=completed.append))
+        assert sorted(result.key for result in results) == list(range(11))
+        assert sorted(result.key for result in completed) == list(range(11))
+        assert [result.key for result in results if not result.ok] == [10]
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_send_sms_bulk(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        results = list(m.send_sms_bulk([('+39', '0000000000'), ('+39', '1111111111', {'compleanno': '11/11'})], 1))
+        assert all(result.ok and result.result for result in results)
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_import_recipients(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        recipients = (
+            (f'Name {i}', f'email+{i}@email.email', {'compleanno': '11/11'}) for i in range(2500)
+        )
+        progress = list(m.import_recipients(recipients, list_id=1, chunk_size=1000, poll_interval=0))
+        assert [p.size for p in progress] == [1000, 1000, 500]
+        assert progress[-1].imported == 2500
+        assert progress[-1].import_id == 42
+        assert progress[-1].status['Completed']
+        posts = [c for c in func.call_args_list if c[0][0] == 'POST' and 'ConsoleService' in c[0][1]]
+        assert len(posts) == 3
+        first = json.loads(posts[0][1]['data'])
+        assert first[0] == {
+            'Name': 'Name 0', 'Email': 'email+0@email.email',
+            'Fields': [{'Description': 'compleanno', 'Id': 27, 'Value': '11/11'}]
+        }
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_import_recipients_to_group(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        progress = list(m.import_recipients(
+            [{'Name': 'A', 'Email': 'a@email.email'}, ('B', 'b@email.email')], group_id=6, poll_interval=0
+        ))
+        assert len(progress) == 1 and progress[0].size == 2
+        with self.assertRaises(MailupyException):
+            m.import_recipients([], list_id=1, group_id=6)
+
+    @patch('mailupy.Mailupy.get_import_status', return_value={'Completed': False})
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_import_recipients_timeout(self, func, status):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        with self.assertRaises(MailupyException):
+            list(m.import_recipients([('A', 'a@email.email')], list_id=1, poll_interval=0.01, timeout=0.05))
+        assert status.call_count > 1
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(205))
+    def test_page_size(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        ids = [recipient['idRecipient'] for recipient in m.get_subscribed_recipients_from_list(1, page_size=100)]
+        assert ids == list(range(205))
+        assert func.call_count == 4
+        assert 'pageNumber=2&pageSize=100' in func.call_args[0][1]
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(5000))
+    def test_adaptive_page_size(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        adaptive = AdaptivePageSize(size=30, max_size=700)
+        ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_group(6, page_size=adaptive)]
+        assert ids == list(range(5000))
+        assert adaptive.size == 700
+        assert func.call_count < 15
+
+    def test_adaptive_page_size_update(self):
+        adaptive = AdaptivePageSize(size=100, min_size=25, target_latency=1)
+        assert adaptive.update(0.1, 1000) == 200
+        assert adaptive.update(0.8, 1000) == 200
+        assert adaptive.update(2, 1000) == 100
+        assert adaptive.update(0.1, 10 * 1024 * 1024) == 50
+        assert adaptive.update(0.1, 1000, served_size=20) == 20
+        assert adaptive.update(0.1, 1000) == 20
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(205))
+    def test_stream_pages(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', stream_pages=True)
+        m.STREAM_CHUNK_SIZE = 7
+        ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_list(1, page_size=50)]
+        assert ids == list(range(205))
+        assert func.call_args[1]['stream']
+
+    def test_iter_page_items(self):
+        with open('tests/resources/Recipient/DynamicFields/GET.json', 'rb') as f:
+            body = f.read()
+        for chunk_size in (1, 3, 1024):
+            page = {}
+            chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+            items = list(iter_page_items(chunks, page))
+            assert items == json.loads(body)['Items']
+            assert page['TotalElementsCount'] == 27 and page['IsPaginated'] and 'Items' not in page
+        page = {}
+        assert list(iter_page_items([b'{"Items": [], "TotalElementsCount": 1', b'0}'], page)) == []
+        assert page == {'TotalElementsCount': 10}
+        with self.assertRaises(MailupyException):
+            list(iter_page_items([b'{"Items": [{"a": 1}'], {}))
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_lazy_login(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        assert func.call_count == 0
+        m.unsubscribe_from_list(1, 18)
+        m.unsubscribe_from_list(1, 18)
+        assert func.call_count == 3
+
+    def test_file_token_store(self):
+        mock = mock_request_expiring_token(3600)
+        with tempfile.TemporaryDirectory() as directory, patch('mailupy.Mailupy._requests_wrapper', side_effect=mock):
+            path = os.path.join(directory, 'token.json')
+            Mailupy('username', 'password', 'client-id', 'client-secret', token_store=FileTokenStore(path)) \
+                .unsubscribe_from_list(1, 18)
+            m = Mailupy('username', 'password', 'client-id', 'client-secret', token_store=FileTokenStore(path))
+            m.unsubscribe_from_list(1, 18)
+            assert mock.grants == ['password']
+            assert m._token == 'token-1'
+            assert FileTokenStore(path).load()['refresh_token'] == 'refresh-1'
+
+    def test_refresh_ahead_of_expiry(self):
+        mock = mock_request_expiring_token(30)
+        with patch('mailupy.Mailupy._requests_wrapper', side_effect=mock):
+            store = MemoryTokenStore()
+            m = Mailupy('username', 'password', 'client-id', 'client-secret', token_store=store, refresh_margin=60)
+            m.unsubscribe_from_list(1, 18)
+            m.unsubscribe_from_list(1, 18)
+            assert mock.grants == ['password', 'refresh_token']
+            assert store.load()['access_token'] == m._token == 'token-2'
+
+    def test_shared_token_store(self):
+        store = SharedTokenStore()
+        store.save({'access_token': 'shared', 'refresh_token': 'refresh', 'expires_at': time.time() + 3600})
+        copy = pickle.loads(pickle.dumps(store))
+        assert copy.load()['access_token'] == 'shared'
+        with copy.lock():
+            copy.save({'access_token': 'new', 'refresh_token': 'refresh', 'expires_at': None})
+        assert store.load()['access_token'] == 'new'
+
+    @patch('requests.Session.request')
+    def test_single_flight_refresh(self, func):
+        def request(method, url, *args, **kwargs):
+            if Mailupy.AUTH_URL in url:
+                time.sleep(0.05)
+            return mock_request_refresh_token(method, url, *args, **kwargs)
+        func.side_effect = request
+        # Identical lookups would be coalesced before reaching the refresh
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', coalesce_requests=False)
+        m._token, m._refresh_token = 'bad_token', 'refresh'
+        barrier = threading.Barrier(8)
+
+        def unsubscribe():
+            barrier.wait()
+            assert m.get_recipient_from_list(1, 'email@email.email')
+        threads = [threading.Thread(target=unsubscribe) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert func.call_count == 8 * 2 + 1
+        auth_calls = [c for c in func.call_args_list if Mailupy.AUTH_URL in c[0][1]]
+        assert len(auth_calls) == 1
+        stats = m.token_stats
+        assert stats['refreshes'] == 1 and stats['coalesced'] == 7
+        assert stats['max_wait_time'] > 0
+
+    @patch('requests.Session.request')
+    def test_coalesce_requests(self, func):
+        def request(method, url, *args, **kwargs):
+            time.sleep(0.1)
+            return mock_request(method, url, *args, **kwargs)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        m.login()
+        barrier = threading.Barrier(8)
+        found = []
+
+        def lookup():
+            barrier.wait()
+            found.append(m.get_recipient_from_list(1, 'email@email.email')['idRecipient'])
+        threads = [threading.Thread(target=lookup) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert found == [13] * 8 and func.call_count == 2
+        assert m.metrics.snapshot()['counters']['coalesced_requests'] == 7 and not len(m._in_flight)
+        m.get_recipient_from_list(1, 'email@email.email')
+        assert func.call_count == 3
+
+    def test_coalescer_errors(self):
+        coalescer = RequestCoalescer()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait()
+            raise MailupyException('Unavailable')
+
+        def call():
+            try:
+                coalescer.run('key', fail)
+            except MailupyException as ex:
+                errors.append(ex)
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+        assert len(errors) == 2 and errors[0] is errors[1]
+        assert coalescer.run('key', lambda: 1) == 1
+
+    @patch('requests.Session.request')
+    def test_unauthorized_after_renewal(self, func):
+        def request(method, url, *args, **kwargs):
+            if Mailupy.AUTH_URL in url:
+                return mock_request_refresh_token(method, url, *args, **kwargs)
+            return MockResponse(json.dumps({'ErrorDescription': 'Unauthorized'}), status_code=401)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        m._token, m._refresh_token = 'stale_token', 'refresh'
+        with self.assertRaises(MailupyRequestException):
+            m.get_recipient_from_list(1, 'email@email.email')
+        # The request, a refresh and the request again
+        assert func.call_count == 3 and m._token == 'good_token'
+
+    @patch('requests.Session.request')
+    def test_retried_responses_closed(self, func):
+        retried = [MockResponse('', status_code=429, headers={'Retry-After': '0'}), MockResponse('', status_code=401)]
+        answers = iter(retried)
+
+        def request(method, url, *args, **kwargs):
+            if Mailupy.AUTH_URL in url:
+                return mock_request_refresh_token(method, url, *args, **kwargs)
+            return next(answers, None) or mock_request(method, url, *args, **kwargs)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', stream_pages=True)
+        m._token, m._refresh_token = 'stale_token', 'refresh'
+        assert len(list(m.get_recipients_from_list(1))) > 0
+        assert all(resp.closed for resp in retried)
+
+    @patch('requests.Session.request')
+    def test_login_when_refresh_fails(self, func):
+        def request(method, url, *args, **kwargs):
+            if Mailupy.AUTH_URL in url and kwargs['data']['grant_type'] == 'refresh_token':
+                return MockResponse(json.dumps({'error_description': 'invalid refresh token'}), status_code=400)
+            return mock_request_refresh_token(method, url, *args, **kwargs)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        m._token, m._refresh_token = 'bad_token', 'expired'
+        assert m.get_recipient_from_list(1, 'email@email.email')
+        assert m._token == 'good_token'
+        assert m.token_stats['logins'] == 1
+
+    @patch('requests.Session.request', side_effect=mock_request_throttled(2))
+    def test_request_hooks(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        before, after = [], []
+        m.add_hook('before_request', lambda event: before.append((event.method, event.endpoint, event.retry)))
+        m.add_hook('after_request', after.append)
+        m.remove_from_list(1, 18)
+        assert before == [
+            ('POST', '/Authorization/OAuth/Token', 0),
+            ('DELETE', '/List/{list_id}/Recipient/{recipient_id}', 0),
+            ('DELETE', '/List/{list_id}/Recipient/{recipient_id}', 1),
+            ('DELETE', '/List/{list_id}/Recipient/{recipient_id}', 2),
+        ]
+        assert [event.status for event in after] == [200, 429, 429, 200]
+        assert all(event.duration >= 0 and event.bytes is not None for event in after)
+        with self.assertRaises(MailupyException):
+            m.add_hook('on_error', print)
+
+    @patch('requests.Session.request', side_effect=mock_paginated_request(45))
+    def test_metrics(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        pages = []
+        m.add_hook('after_request', lambda event: pages.append(event.page_number))
+        assert len(list(m.get_subscribed_recipients_from_list(1))) == 45
+        assert pages == [None, 0, 1, 2]
+        snapshot = m.metrics.snapshot()
+        assert snapshot['counters']['requests'] == 4
+        endpoint = snapshot['endpoints']['GET /List/{list_id}/Recipients/Subscribed']
+        assert endpoint['requests'] == 3 and endpoint['bytes'] > 0
+        assert endpoint['latency']['count'] == 3
+        exported = m.metrics.export_prometheus()
+        assert ('mailupy_request_duration_seconds_count{method="GET",'
+                'endpoint="/List/{list_id}/Recipients/Subscribed"} 3') in exported
+        m.metrics.reset()
+        assert m.metrics.snapshot() == {'counters': {}, 'endpoints': {}}
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_fields_cache_metrics(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        for i in range(3):
+            m._build_mailup_fields({'compleanno': '11/11'})
+        counters = m.metrics.snapshot()['counters']
+        assert counters['fields_cache_misses'] == 1 and counters['fields_cache_hits'] == 2
+
+    @patch('requests.Session.request', side_effect=mock_request)
+    def test_response_cache(self, func):
+        cache = ResponseCache()
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', response_cache=cache)
+        groups = list(m.get_groups_from_list(1))
+        calls = func.call_count
+        groups[0]['Name'] = 'changed'
+        assert list(m.get_groups_from_list(1)) != groups
+        assert func.call_count == calls
+        list(m.get_recipients_from_list(1))
+        assert func.call_count == calls + 1
+        m.create_group(1, 'New group')
+        list(m.get_groups_from_list(1))
+        assert func.call_count == calls + 3
+        stats = cache.stats
+        assert stats['hits'] == 1 and stats['misses'] == 2 and stats['invalidations'] == 1
+        assert stats['entries'] == 1 and stats['bytes'] > 0
+
+    def test_response_cache_eviction(self):
+        cache = ResponseCache(ttls={'/List/{list_id}/Groups': 60}, max_entries=2, max_bytes=10)
+        cache.set('GET', '/List/1/Groups', '', b'1234')
+        cache.set('GET', '/List/2/Groups', '', b'1234')
+        assert cache.get('GET', '/List/1/Groups', '') == b'1234'
+        cache.set('GET', '/List/3/Groups', '', b'1234')
+        assert cache.get('GET', '/List/2/Groups', '') is None
+        cache.set('GET', '/List/4/Groups', '', b'12345678901')
+        cache.set('GET', '/Recipient/DynamicFields', '', b'1')
+        assert cache.stats['entries'] == 2 and cache.stats['evictions'] == 1
+        expiring = ResponseCache(ttls={'/List/{list_id}/Groups': 0})
+        expiring.set('GET', '/List/1/Groups', '', b'1')
+        assert expiring.get('GET', '/List/1/Groups', '') is None
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_get_or_create_group(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        assert m.get_or_create_group(1, 'TEST') == (6, False)
+        assert "filterby=Name%3D%3D%27TEST%27" in func.call_args[0][1]
+        calls = func.call_count
+        assert m.get_or_create_group(1, 'TEST') == (6, False)
+        assert func.call_count == calls
+        assert m.get_or_create_group(1, 'New') == (9, True)
+        assert m.get_or_create_group(1, 'New') == (9, False)
+        assert func.call_count == calls + 2
+        m.invalidate_groups(1)
+        assert m.index_groups(1) == 1
+        assert m.get_or_create_group(1, 'Other') == (9, True)
+        assert func.call_args[0][0] == 'POST'
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_get_or_create_group_concurrently(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(m.get_or_create_group(1, 'New'))) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [(9, False)] * 7 + [(9, True)]
+        assert [call[0][0] for call in func.call_args_list].count('POST') == 2
+
+    def test_email_filters(self):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        url = m._recipients_url('Subscribed', 1)
+        emails = [f'user{i}@example.com' for i in range(100)]
+        chunks = list(m._email_filters(emails, url, 1000))
+        assert len(chunks) > 1 and sum(chunks, []) == emails
+        for chunk in chunks:
+            query = m._parse_filter_ordering(filter_by=' || '.join(map(m._email_condition, chunk)))
+            assert len(m._page_url(f'{url}?{query}', 0, len(chunk))) <= 1000
+        with self.assertRaises(MailupyException):
+            list(m._email_filters(['a' * 1000], url, 1000))
+        with self.assertRaises(MailupyException):
+            m.get_recipients_by_emails(['a@example.com'], group_id=6, status='Subscribed')
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_paginated_request(45))
+    def test_page_cursor(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret')
+        recipients = m.get_recipients_from_list(1, page_size=10, filter_by="Email.Contains('email')")
+        ids = [next(recipients)['idRecipient'] for i in range(23)]
+        assert recipients.cursor.page == 2 and recipients.cursor.skip == 3 and recipients.cursor.offset == 23
+        saved = recipients.cursor.to_json()
+        recipients.close()
+        cursor = PageCursor.from_json(saved)
+        assert cursor.query == 'filterby=Email.Contains%28%27email%27%29' and cursor.page_size == 10
+        for options in ({}, {'page_workers': 3}, {'stream_pages': True}):
+            resumed = Mailupy('username', 'password', 'client-id', 'client-secret', **options).resume_pages(saved)
+            assert ids + [recipient['idRecipient'] for recipient in resumed] == list(range(45))
+        adaptive = m.get_recipients_from_list(1, page_size='auto')
+        ids = [next(adaptive)['idRecipient'] for i in range(7)]
+        resumed = m.resume_pages(adaptive.cursor.to_dict())
+        assert ids + [recipient['idRecipient'] for recipient in resumed] == list(range(45))
+
+    @patch('requests.Session.request')
+    def test_retry_page_in_place(self, func):
+        serve = mock_paginated_request(45, page_size=10)
+        failures = []
+
+        def request(method, url, *args, **kwargs):
+            if 'pageNumber=2' in url and len(failures) < 2:
+                failures.append(url)
+                if len(failures) == 1:
+                    raise Exception('Connection reset')
+                return MockResponse(json.dumps({'ErrorDescription': 'Unavailable'}), status_code=503)
+            return serve(method, url, *args, **kwargs)
+        func.side_effect = request
+        options = {'page_retry_delay': 0, 'retry_policy': NO_RETRY}
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', **options)
+        assert [r['idRecipient'] for r in m.get_recipients_from_list(1, page_size=10)] == list(range(45))
+        assert len(failures) == 2
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', page_retries=1, **options)
+        failures.clear()
+        with self.assertRaises(MailupyRequestException):
+            list(m.get_recipients_from_list(1, page_size=10))
+
+    @patch('requests.Session.request')
+    def test_page_retries_respect_policy(self, func):
+        serve = mock_paginated_request(45, page_size=10)
+        failures = []
+
+        def request(method, url, *args, **kwargs):
+            if 'pageNumber=2' in url:
+                failures.append(url)
+                return MockResponse(json.dumps({'ErrorDescription': 'Unavailable'}), status_code=503)
+            return serve(method, url, *args, **kwargs)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', page_retry_delay=0,
+                    retry_policy=RetryPolicy(max_attempts=3, backoff=0))
+        with self.assertRaises(MailupyRequestException) as ex:
+            list(m.get_recipients_from_list(1, page_size=10))
+        assert len(failures) == 3 and ex.exception.retried
+
+    @patch('requests.Session.request')
+    def test_retry_policy(self, func):
+        calls = []
+
+        def request(method, url, *args, **kwargs):
+            calls.append((method, url))
+            if Mailupy.AUTH_URL in url:
+                return mock_request(method, url, *args, **kwargs)
+            if len(calls) == 2:
+                return MockResponse(json.dumps({'ErrorDescription': 'Unavailable'}), status_code=503)
+            if 'Send' in url or method == 'DELETE':
+                raise requests.exceptions.ReadTimeout('Read timed out')
+            return mock_request(method, url, *args, **kwargs)
+        func.side_effect = request
+        m = Mailupy('username', 'password', 'client-id', 'client-secret',
+                    retry_policy=RetryPolicy(backoff=0.01, jitter=False))
+        assert list(m.get_fields())[0]['Id'] == 27
+        assert len(calls) == 4 and m.metrics.snapshot()['counters']['retries'] == 1
+        calls.clear()
+        with self.assertRaises(MailupyException):
+            m.send_message('email@email.email', 1)
+        assert len(calls) == 1
+        with self.assertRaises(MailupyException):
+            m.remove_from_list(1, 18)
+        assert len(calls) == 4
+
+    def test_retry_policy_classification(self):
+        policy = RetryPolicy(max_attempts=3, deadline=1)
+        assert policy.should_retry('GET', '/List/{list_id}/Recipients/Subscribed', 1, status=503)
+        assert not policy.should_retry('GET', '/List/{list_id}/Recipients/Subscribed', 3, status=503)
+        assert not policy.should_retry('GET', '/List/{list_id}/Recipients/Subscribed', 1, status=501)
+        assert policy.should_retry('POST', '/List/{list_id}/Recipient', 1, status=502)
+        assert not policy.should_retry('POST', '/Email/Send', 1, status=502)
+        assert not policy.should_retry('POST', '/Email/Send', 1, error=requests.exceptions.ReadTimeout())
+        assert policy.should_retry('POST', '/Email/Send', 1, error=requests.exceptions.ConnectTimeout())
+        assert 0 <= policy.delay(2) <= 1 and RetryPolicy(backoff=1, max_backoff=3, jitter=False).delay(5) == 3
+        assert policy.within_deadline(0.5, 0.4) and not policy.within_deadline(0.5, 0.6)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        with self.assertRaises(requests.exceptions.ConnectionError) as ex:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+        assert is_connect_error(ex.exception) and not is_connect_error(Exception('Connection reset'))
+
+    @patch('requests.Session.request', side_effect=mock_request)
+    def test_json_codec(self, func):
+        for name in ('json', 'orjson', 'ujson'):
+            try:
+                codec = get_codec(name)
+            except MailupyException:
+                continue
+            payload = {'Email': 'à@email.email', 'Fields': [{'Id': 1, 'Value': None}]}
+            assert codec.name == name and codec.loads(codec.dumps(payload)) == payload
+        assert get_codec().name == ('orjson' if orjson else 'ujson' if ujson else 'json')
+        with self.assertRaises(MailupyException):
+            get_codec('yaml')
+
+        class CountingCodec(JSONCodec):
+            decoded = 0
+
+            def loads(self, data):
+                CountingCodec.decoded += 1
+                return super().loads(data)
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', json_codec=CountingCodec())
+        m.login()
+        assert m.get_recipient_from_list(1, 'email@email.email')['idRecipient'] == 13
+        m.get_recipient_from_group(6, 'email@email.email')
+        assert CountingCodec.decoded == 3
+        func.side_effect = mock_request_400
+        with self.assertRaises(MailupyRequestException):
+            m.get_recipient_from_group(6, 'email@email.email')
+        assert CountingCodec.decoded == 4
+
+    @patch('mailupy.Mailupy._requests_wrapper', side_effect=mock_request)
+    def test_records(self, func):
+        m = Mailupy('username', 'password', 'client-id', 'client-secret', records=True)
+        group = next(iter(m.get_groups_from_list(1)))
+        assert isinstance(group, Group) and (group.id, group.name) == (6, 'TEST')
+        assert group.to_dict()['Notes'] == 'Gruppo per invii di test'
+        message = next(iter(m.get_messages_from_list(1)))
+        assert isinstance(message, Message) and message.subject == 'QWERTYUIOP' and message.extra == {'ServiceType': 0}
+        recipient = next(iter(m.get_recipients_from_list(1)))
+        assert isinstance(recipient, Recipient) and recipient.email == 'email@email.email'
+        assert recipient.extra['Status'] == 'OPTIN' and not hasattr(recipient, '__dict__')
+        assert recipient.schema is m.field_schema() and len(recipient.values) == len(m.field_schema())
+        assert m.get_or_create_group(1, 'TEST') == (6, False)
+        assert isinstance(m.get_recipients_by_emails(['email@email.email'], list_id=1)['email@email.email'], Recipient)
+
+    def test_record_batches(self):
+        schema = FieldSchema([{'Description': 'city', 'Id': 3}, {'Description': 'age', 'Id': 7}])
+        item = {'idRecipient': 1, 'Email': 'a@example.com', 'Name': 'A', 'MobilePrefix': None, 'MobileNumber': None,
+                'Fields': [{'Description': 'age', 'Id': 7, 'Value': '30'}, {'Description': 'x', 'Id': 9, 'Value': 1}]}
+        recipient = Recipient.from_item(item, schema)
+        assert recipient.values == (None, '30') and recipient.field('age') == '30'
+        assert recipient.fields == {'city': None, 'age': '30'}
+        assert Recipient.from_item(recipient.to_dict(), schema) == recipient
+        items = [dict(item, idRecipient=i) for i in range(5)]
+        batches = list(iter_batches(items, schema, batch_size=2))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        columns = batches[0].columns()
+        assert list(columns['idRecipient']) == [0, 1] and columns['age'] == ['30', '30']
+        assert [r.id for r in batches[1].records()] == [2, 3] and next(batches[2].records()).values == (None, '30')
+        schema = FieldSchema([{'Description': 'city', 'Id': 3}, {'Description': 'city', 'Id': 7}])
+        batch = next(iter_batches([item], schema))
+        assert batch.fields == {3: [None], 7: ['30']}
+        with self.assertRaises(MailupyException):
+            batch.columns()
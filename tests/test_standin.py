@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from mailupy import MailupyException, MailupyRequestException
+from mailupy.export import pyarrow
+from mailupy.pagination import AdaptivePageSize
+from mailupy.sync import RecipientSync
+from mailupy.testing import MailupStandIn
+
+
+class TestStandIn(unittest.TestCase):
+
+    def test_paginated_reads(self):
+        with MailupStandIn(recipients=1005) as server:
+            m = server.client()
+            ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_list(1, page_size=100)]
+            assert ids == list(range(1, 1006))
+            subscribed = list(m.get_subscribed_recipients_from_list(1, page_size=100))
+            unsubscribed = list(m.get_unsubscribed_recipients_from_list(1))
+            assert len(subscribed) == 904 and len(unsubscribed) == 101
+            assert not {r['idRecipient'] for r in subscribed} & {r['idRecipient'] for r in unsubscribed}
+            assert m.get_subscribed_recipient_from_list(1, 'user10@example.com') is None
+            assert m.get_recipient_from_group(6, 'user10@example.com')['idRecipient'] == 11
+            m.close()
+
+    def test_adaptive_reads_capped(self):
+        with MailupStandIn(recipients=1000, max_page_size=150) as server:
+            adaptive = AdaptivePageSize(size=75, target_latency=10)
+            ids = [recipient['idRecipient'] for recipient in server.client().get_recipients_from_list(1, adaptive)]
+            assert sorted(ids) == list(range(1, 1001))
+            assert adaptive.size == 150
+
+    def test_parallel_and_streamed_reads(self):
+        with MailupStandIn(recipients=777, max_page_size=50) as server:
+            for options in ({'page_workers': 4}, {'stream_pages': True}):
+                m = server.client(**options)
+                ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_group(6, page_size=100)]
+                assert ids == list(range(1, 778))
+            ids = [recipient['idRecipient'] for recipient in m.get_recipients_from_group(6, page_size='auto')]
+            assert ids == list(range(1, 778))
+
+    def test_throttling_and_expired_tokens(self):
+        with MailupStandIn(recipients=300, throttle_every=4, expire_token_every=3) as server:
+            m = server.client()
+            assert len(list(m.get_recipients_from_list(1))) == 300
+            assert server.stats['throttled'] > 0 and server.stats['unauthorized'] > 0
+            assert m.token_stats['refreshes'] == server.stats['refreshes']
+
+    def test_recipients_by_emails(self):
+        with MailupStandIn(recipients=500) as server:
+            m = server.client()
+            emails = [f'user{i}@example.com' for i in range(0, 600, 3)] + ['USER1@example.com']
+            found = m.get_recipients_by_emails(emails, list_id=1, status='Subscribed', max_url_length=600)
+            assert list(found) == emails
+            assert found['user3@example.com']['idRecipient'] == 4
+            assert found['user0@example.com'] is None and found['user501@example.com'] is None
+            assert found['USER1@example.com']['idRecipient'] == 2
+            assert len([r for r in found.values() if r]) == 151
+            assert server.stats['requests'] < 30
+            found = m.get_recipients_by_emails(['user10@example.com'], group_id=6)
+            assert found['user10@example.com']['idRecipient'] == 11
+
+    def test_recipients_from_sources(self):
+        with MailupStandIn(recipients=300, max_page_size=50) as server:
+            m = server.client()
+            options = {'statuses': ('Subscribed', 'Unsubscribed'), 'page_size': 50, 'workers': 3}
+            ids = [r['idRecipient'] for r in m.get_recipients_from_sources([1, 2], group_ids=[6], **options)]
+            assert sorted(ids) == list(range(1, 301))
+            assert len(list(m.get_recipients_from_sources([1, 2], group_ids=[6], dedupe=None, **options))) == 900
+            merged = list(m.get_recipients_from_sources([1, 2], group_ids=[6], dedupe='email', provenance=True,
+                                                        **options))
+            assert len(merged) == 300
+            recipient, sources = merged[0]
+            assert len(sources) == 3 and ('Group', 6, None) in sources
+            assert {source.status for source in sources if source.kind == 'List'} in ({'Subscribed'}, {'Unsubscribed'})
+            with self.assertRaises(MailupyException):
+                m.get_recipients_from_sources([1], dedupe='name')
+
+    def test_sync(self):
+        with MailupStandIn(recipients=1200, fields=3) as server, tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'list.sqlite')
+            with RecipientSync(server.client(), path, list_id=1, page_size=100, batch_size=250) as sync:
+                # Digests of each batch are looked up with several queries
+                sync.MAX_VARIABLES = 100
+                report = sync.run()
+                assert report.full and report.inserted == 1200
+                requests = server.stats['requests']
+                server.recipients = 1250
+                report = sync.run()
+                assert not report.full and (report.inserted, report.updated, report.removed) == (50, 0, 0)
+                # a page for each status
+                assert server.stats['requests'] - requests == 3
+                statuses = dict(sync.connection.execute('SELECT status, COUNT(*) FROM recipients GROUP BY status'))
+                assert statuses == {'Subscribed': 1125, 'Unsubscribed': 125}
+                server.recipients, server.fields = 1240, 4
+                report = sync.run(full=True)
+                assert (report.inserted, report.updated, report.removed) == (0, 1240, 10)
+            with self.assertRaises(Exception):
+                RecipientSync(server.client(), path, group_id=6)
+
+    def test_sync_resume(self):
+        with MailupStandIn(recipients=1000, throttle_every=5) as server, tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'group.sqlite')
+            with RecipientSync(server.client(max_throttle_retries=0), path, group_id=6, page_size=100,
+                               batch_size=100) as sync:
+                with self.assertRaises(MailupyRequestException):
+                    sync.run()
+                synced = sync.connection.execute('SELECT COUNT(*) FROM recipients').fetchone()[0]
+                assert 0 < synced < 1000
+            with RecipientSync(server.client(), path, group_id=6, page_size=100) as sync:
+                report = sync.run()
+                assert report.full and report.inserted == 1000 - synced and report.removed == 0
+                ids = [row[0] for row in sync.connection.execute('SELECT id FROM recipients ORDER BY id')]
+                assert ids == list(range(1, 1001))
+
+    def test_sends_and_imports(self):
+        with MailupStandIn(import_polls=2) as server:
+            m = server.client()
+            results = list(m.send_message_bulk((f'user{i}@example.com' for i in range(30)), 1, workers=4))
+            assert all(result.ok for result in results)
+            assert server.stats['sent'] == 30
+            progress = list(m.import_recipients(
+                ((f'User {i}', f'user{i}@example.com', {'field1': 'x'}) for i in range(250)),
+                list_id=1, chunk_size=100, poll_interval=0
+            ))
+            assert [p.size for p in progress] == [100, 100, 50]
+            assert server.stats['imported'] == 250
+
+    def test_non_ascii_payloads(self):
+        sent = []
+        session_send = requests.Session.send
+
+        def send(session, request, **kwargs):
+            sent.append(request.body)
+            return session_send(session, request, **kwargs)
+        with MailupStandIn() as server, patch('requests.Session.send', send):
+            for codec in ('json', 'orjson', 'ujson'):
+                try:
+                    m = server.client(json_codec=codec)
+                except MailupyException:
+                    continue
+                assert m.create_group(1, 'Gruppo € 日本 é', notes=codec)['Name'] == 'Gruppo € 日本 é'
+                body = sent[-1] if isinstance(sent[-1], bytes) else sent[-1].encode('ascii')
+                assert json.loads(body.decode('utf-8'))['Notes'] == codec
+
+    def test_errors(self):
+        with MailupStandIn(throttle_every=1) as server:
+            m = server.client(max_throttle_retries=1)
+            with self.assertRaises(MailupyRequestException):
+                m.unsubscribe_from_list(1, 18)
+
+    def test_export(self):
+        with MailupStandIn(recipients=250, fields=3) as server, tempfile.TemporaryDirectory() as directory:
+            m = server.client()
+            path = os.path.join(directory, 'recipients.csv')
+            assert m.export(m.get_recipients_from_list(1, page_size=100), path, batch_size=64) == 250
+            with open(path) as f:
+                rows = list(csv.reader(f))
+            assert rows[0] == ['idRecipient', 'Email', 'Name', 'MobilePrefix', 'MobileNumber',
+                               'field1', 'field2', 'field3']
+            assert rows[2] == ['2', 'user1@example.com', 'User 1', '', '', 'value 1-1', 'value 1-2', 'value 1-3']
+            path = os.path.join(directory, 'groups.ndjson')
+            assert server.client(records=True).export(m.get_groups_from_list(1), path) == 5
+            with open(path) as f:
+                assert json.loads(f.readline())['Name'] == 'Group 0'
+            with self.assertRaises(MailupyException):
+                m.export([], os.path.join(directory, 'recipients.xlsx'))
+            with self.assertRaises(MailupyException):
+                m.export([], io.StringIO())
+            stream = io.StringIO()
+            assert m.export(m.get_groups_from_list(1), stream, output_format='ndjson') == 5
+            assert json.loads(stream.getvalue().splitlines()[0])['Name'] == 'Group 0'
+            with open(os.path.join(directory, 'groups.csv'), 'w', newline='') as f:
+                assert m.export(m.get_groups_from_list(1), f) == 5
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_export_parquet(self):
+        with MailupStandIn(recipients=250, fields=3) as server, tempfile.TemporaryDirectory() as directory:
+            m = server.client(records=True)
+            path = os.path.join(directory, 'recipients.parquet')
+            assert m.export(m.get_recipients_from_list(1, page_size=100), path, batch_size=64) == 250
+            table = pyarrow.parquet.read_table(path)
+            assert table.num_rows == 250 and table.column('field2')[1].as_py() == 'value 1-2'
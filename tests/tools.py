@@ -1,13 +1,20 @@
 import json
 from os import path
+from urllib.parse import parse_qs, urlparse
 
 from mailupy import Mailupy
 
 
 class MockResponse:
-    def __init__(self, text, status_code=200):
+    def __init__(self, text, status_code=200, headers=None):
         self.text = text
         self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    @property
+    def content(self):
+        return self.text.encode()
 
     @property
     def ok(self):
@@ -16,6 +23,14 @@ class MockResponse:
     def json(self):
         return json.loads(self.text)
 
+    def iter_content(self, chunk_size=1):
+        content = self.content
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
 
 def mock_request(res_type, url, *args, **kwargs):
     if Mailupy.AUTH_URL in url:
@@ -57,3 +72,70 @@ def mock_request_400(method, url, *args, **kwargs):
 
 def mock_requests_error(method, url, *args, **kwargs):
     raise Exception('Connection Error')
+
+
+def mock_paginated_request(total_elements, page_size=20):
+    """
+    Build a mock serving ``total_elements`` recipients split in pages of ``page_size``.
+    """
+    def request(method, url, *args, **kwargs):
+        if Mailupy.AUTH_URL in url:
+            return mock_request(method, url, *args, **kwargs)
+        query = parse_qs(urlparse(url).query)
+        page_number = int(query.get('pageNumber', ['0'])[0])
+        size = int(query.get('pageSize', [page_size])[0])
+        first = page_number * size
+        return MockResponse(json.dumps({
+            'IsPaginated': True,
+            'Items': [
+                {'idRecipient': i, 'Email': f'email+{i}@email.email', 'Fields': []}
+                for i in range(first, min(first + size, total_elements))
+            ],
+            'PageNumber': page_number,
+            'PageSize': size,
+            'Skipped': first,
+            'TotalElementsCount': total_elements
+        }))
+    return request
+
+
+def mock_request_throttled(times, retry_after='0'):
+    """
+    Build a mock answering 429 to the first ``times`` API calls.
+    """
+    calls = []
+
+    def request(method, url, *args, **kwargs):
+        if Mailupy.BASE_URL in url and len(calls) < times:
+            calls.append(url)
+            return MockResponse('', status_code=429, headers={'Retry-After': retry_after})
+        return mock_request(method, url, *args, **kwargs)
+    return request
+
+
+def mock_request_failing_sends(method, url, *args, **kwargs):
+    data = kwargs.get('data', '')
+    if isinstance(data, bytes):
+        data = data.decode()
+    if url.endswith('/Send') and 'bad' in data:
+        return MockResponse(json.dumps({'ErrorDescription': 'Invalid recipient'}), status_code=400)
+    return mock_request(method, url, *args, **kwargs)
+
+
+def mock_request_expiring_token(expires_in):
+    """
+    Build a mock issuing tokens valid for ``expires_in`` seconds, numbered by grant.
+    """
+    grants = []
+
+    def request(method, url, *args, **kwargs):
+        if Mailupy.AUTH_URL in url:
+            grants.append(kwargs['data']['grant_type'])
+            return MockResponse(json.dumps({
+                'access_token': f'token-{len(grants)}',
+                'refresh_token': f'refresh-{len(grants)}',
+                'expires_in': expires_in
+            }))
+        return mock_request(method, url, *args, **kwargs)
+    request.grants = grants
+    return request